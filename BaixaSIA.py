@@ -2,6 +2,7 @@ import sys
 import time
 import json
 import re
+import os
 import logging
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -11,6 +12,10 @@ from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+from extracao_tabela import extrair_tabela_driver
+from tabnet import TabNetClient, cabecalhos_tabela, consultar_uf_por_municipio, montar_linhas_municipio, selecionar_arquivos
+from serie_mensal import COLUNA_MENSAL, JANELA_REVISAO_MESES, SerieMensal, formatar_br, ler_tabela_mensal
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -30,11 +35,13 @@ class SIA:
         self.end_month = end_month
         self.municipio_ibge = municipio_ibge
         self.uf = municipio_ibge[:2]  # Código UF a partir do código IBGE
+        self.driver = None
+        self.vars = {}
 
+    def iniciar_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         self.driver = webdriver.Chrome(options=chrome_options)
-        self.vars = {}
 
     def wait_for_window(self, timeout=2):
         time.sleep(timeout)
@@ -54,31 +61,35 @@ class SIA:
             return []
 
         logger.info("Capturando dados da tabela...")
-        table_body = self.driver.find_element(By.XPATH, table_xpath + "/tbody")
-        headers = self.driver.find_elements(By.XPATH, table_xpath + "/thead/tr/th")
-        rows = table_body.find_elements(By.TAG_NAME, "tr")
+        tabela = extrair_tabela_driver(self.driver, table_xpath)
+        logger.debug(f"Headers: {cabecalhos_tabela(tabela)}")
+        logger.debug(f"Número de linhas encontradas: {len(tabela['linhas'])}")
 
-        logger.debug(f"Headers: {[header.text for header in headers]}")
-        logger.debug(f"Número de linhas encontradas: {len(rows)}")
+        all_cells_data = self.processar_tabela(tabela)
+        logger.info("Dados da tabela capturados.")
+        return all_cells_data
 
-        headers_text = [header.text.strip() for header in headers]
+    def processar_tabela(self, tabela):
+        """Mapeia os cabeçalhos e mantém apenas as linhas de Média/Alta complexidade."""
+        headers_text = cabecalhos_tabela(tabela)
         all_cells_data = []
-        for row in rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            cells_text = [cell.text.strip() if cell.text.strip() else '' for cell in cells]
-            row_data = dict(zip(headers_text, cells_text))
-
-            # FILTRAGEM PARA "Média complexidade" e "Alta complexidade" (Exatamente como escrito)
-            complexidade = row_data.get("Complexidade", "").strip()  # Pega o valor, sem modificar
+        for linha in tabela["linhas"]:
+            if linha["secao"] != "tbody":
+                continue
+            row_data = dict(zip(headers_text, linha["celulas"]))
+            complexidade = row_data.get("Complexidade", "").strip()
             if complexidade == "Média complexidade" or complexidade == "Alta complexidade":
                 all_cells_data.append(row_data)
                 logger.debug(f"Dados da linha (Média/Alta Complexidade): {row_data}")
             else:
                 logger.debug(f"Dados da linha (Ignorada): {row_data}")
-
-        logger.info("Dados da tabela capturados.")
         return all_cells_data
 
+    def salvar_json(self, table_data, caminho='SIA.json'):
+        logger.info("Salvando os dados em arquivo JSON...")
+        with open(caminho, 'w') as json_file:
+            json.dump(table_data, json_file, ensure_ascii=False, indent=4)
+
     def parse_value(self, value):
         value = re.sub(r'[^\d,.-]', '', value)
         value = value.replace('.', '')
@@ -122,9 +133,95 @@ class SIA:
         # Agora todos os estados usam arquivos que começam com 'qa'
         return base_url + uf_map.get(uf, "qape.def")  # Mantém qape.def como padrão
 
+    def run_http(self):
+        """Executa a mesma consulta do run() enviando o formulário direto ao tabcgi.exe, sem navegador."""
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Baixando SIA da UF {self.uf} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        logger.info(f"{len(arquivos)} arquivos selecionados.")
+
+        municipio = formulario.opcao_municipio(self.municipio_ibge)
+        if municipio is None:
+            raise RuntimeError(f"Município com IBGE {self.municipio_ibge} não encontrado no formulário do TabNet.")
+
+        tabela = client.consultar("Complexidade", "Ano processamento", arquivos, selecoes={"Município": [municipio]})
+        if tabela is None:
+            raise RuntimeError("Tabela não encontrada na resposta do TabNet.")
+
+        table_data = self.processar_tabela(tabela)
+        if table_data:
+            logger.info("Dados da tabela capturados (apenas Média e Alta Complexidade):")
+            logger.info(table_data)
+            self.salvar_json(table_data)
+
+        logger.info("Processo concluído.")
+
+    def run_sync(self, caminho='SIA_mensal.json', janela_revisao=JANELA_REVISAO_MESES):
+        """
+        Sincroniza a série mensal do município e regenera o SIA.json a partir dela.
+
+        Só consulta no TabNet os meses que ainda não estão em SIA_mensal.json e os
+        últimos `janela_revisao` meses disponíveis, que o DATASUS ainda pode revisar.
+        """
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Sincronizando SIA mensal do município {self.municipio_ibge} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+        serie = SerieMensal(caminho, "SIA", self.municipio_ibge)
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        pendentes = serie.arquivos_pendentes(arquivos, janela_revisao)
+        logger.info(f"{len(pendentes)} de {len(arquivos)} arquivos precisam ser consultados.")
+
+        if pendentes:
+            municipio = formulario.opcao_municipio(self.municipio_ibge)
+            if municipio is None:
+                raise RuntimeError(f"Município com IBGE {self.municipio_ibge} não encontrado no formulário do TabNet.")
+            tabela = client.consultar("Complexidade", COLUNA_MENSAL, pendentes, selecoes={"Município": [municipio]})
+            if tabela is None:
+                # Sem tabela os meses não são marcados como sincronizados e a série fica como estava
+                raise RuntimeError("Tabela não encontrada na resposta do TabNet; série mensal não atualizada.")
+            serie.mesclar(ler_tabela_mensal(tabela), pendentes)
+            serie.salvar()
+
+        table_data = serie.linhas_anuais("Complexidade", self.start_year, self.start_month, self.end_year, self.end_month, ["Média complexidade", "Alta complexidade"], formatar_br)
+        logger.info(f"{len(table_data)} linhas regeneradas a partir da série mensal.")
+        self.salvar_json(table_data)
+        logger.info("Processo concluído.")
+
+    def run_uf(self, diretorio_saida='municipios'):
+        """
+        Baixa a UF inteira com Município na Linha e grava um SIA.json por município.
+
+        Faz uma consulta por complexidade em vez de uma por município; os arquivos
+        ficam em <diretorio_saida>/<ibge>/SIA.json, no mesmo formato da consulta individual.
+        """
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Baixando SIA de todos os municípios da UF {self.uf} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        logger.info(f"{len(arquivos)} arquivos selecionados.")
+
+        por_municipio = consultar_uf_por_municipio(client, "Complexidade", ["Média complexidade", "Alta complexidade"], "Ano processamento", arquivos)
+        if not por_municipio:
+            raise RuntimeError(f"Nenhum município da UF {self.uf} encontrado nas respostas do TabNet.")
+        for codigo, categorias in por_municipio.items():
+            table_data = montar_linhas_municipio(categorias, "Complexidade", None)
+            diretorio = os.path.join(diretorio_saida, codigo)
+            os.makedirs(diretorio, exist_ok=True)
+            self.salvar_json(table_data, os.path.join(diretorio, 'SIA.json'))
+
+        logger.info(f"{len(por_municipio)} arquivos SIA.json gravados em {diretorio_saida}/.")
+
     def run(self):
         url = self.get_url_by_uf(self.uf)
         logger.info(f"Baixando SIA da UF {self.uf}...")
+        self.iniciar_driver()
         self.driver.get(url)
         self.driver.set_window_size(1366, 736)
 
@@ -233,10 +330,7 @@ class SIA:
         if table_data:
             logger.info("Dados da tabela capturados (apenas Média e Alta Complexidade):")
             logger.info(table_data)
-
-            logger.info("Salvando os dados em arquivo JSON...")
-            with open('SIA.json', 'w') as json_file:  # Corrigido para SIA.json
-                json.dump(table_data, json_file, ensure_ascii=False, indent=4)
+            self.salvar_json(table_data)
 
         self.driver.close()
         self.driver.switch_to.window(self.driver.window_handles[0])
@@ -253,7 +347,26 @@ if __name__ == "__main__":
     start_month = int(sys.argv[2])
     end_year = int(sys.argv[3])
     end_month = int(sys.argv[4])
-    municipio_ibge = sys.argv[5]
+    municipio_ibge = sys.argv[5]  # Código IBGE do município ou código da UF (2 dígitos) para baixar a UF inteira
     if len(municipio_ibge) == 7: municipio_ibge = municipio_ibge[:-1]
     script = SIA(start_year, start_month, end_year, end_month, municipio_ibge)
-    script.run()
\ No newline at end of file
+    if len(municipio_ibge) == 2:
+        script.run_uf()
+    elif "--selenium" in sys.argv:
+        script.run()
+    elif "--sync" in sys.argv:
+        try:
+            script.run_sync()
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+    else:
+        # Padrão: sincroniza só os meses novos ou revisáveis; --completo baixa o período inteiro de novo
+        try:
+            if "--completo" in sys.argv:
+                script.run_http()
+            else:
+                script.run_sync()
+        except Exception as e:
+            logger.error(f"Falha na consulta HTTP ao TabNet ({e}). Usando o navegador...")
+            script.run()
\ No newline at end of file
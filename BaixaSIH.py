@@ -2,6 +2,7 @@ import sys
 import time
 import json
 import re
+import os
 import logging
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -10,6 +11,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.chrome.options import Options
 
+from extracao_tabela import extrair_tabela_driver
+from tabnet import TabNetClient, cabecalhos_tabela, consultar_uf_por_municipio, montar_linhas_municipio, selecionar_arquivos
+from serie_mensal import COLUNA_MENSAL, JANELA_REVISAO_MESES, SerieMensal, ler_tabela_mensal
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -29,11 +34,13 @@ class Sih:
         self.end_month = end_month
         self.municipio_ibge = municipio_ibge
         self.uf = municipio_ibge[:2]  # Código UF a partir do código IBGE
+        self.driver = None
+        self.vars = {}
 
+    def iniciar_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         self.driver = webdriver.Chrome(options=chrome_options)
-        self.vars = {}
 
     def capture_table_data(self, table_xpath):
         # Esperar a tabela carregar explicitamente usando Selenium
@@ -43,63 +50,36 @@ class Sih:
         )
 
         logger.info("Capturando dados da tabela com Selenium...")
+        tabela = extrair_tabela_driver(self.driver, table_xpath)
+        table_data = self.processar_tabela(tabela)
 
-        # Encontrar a tabela usando o XPATH
-        table = self.driver.find_element(By.XPATH, table_xpath)
+        logger.info("Dados da tabela capturados.")
+        return table_data
 
-        # Extrair cabeçalhos
-        headers = []
-        header_row = table.find_element(By.XPATH, "./thead/tr[2]")  # Seleciona a segunda linha do thead
-        header_cells = header_row.find_elements(By.XPATH, "./th")
-        for cell in header_cells:
-            headers.append(cell.text.strip())
+    def processar_tabela(self, tabela):
+        """Ignora as linhas TOTAL, separador e rodapé e converte os valores numéricos."""
+        headers = cabecalhos_tabela(tabela)
         logger.info(f"Headers: {headers}")
-
-        # Extrair dados do corpo da tabela
         table_data = []
-
-        # Iterar pelas linhas da tabela, incluindo tbody e tfoot
-        for row in table.find_elements(By.XPATH, "./tbody/tr | ./tfoot/tr"):
-            logger.debug(f"--- Processando linha: {row.get_attribute('outerHTML')}")
-
-            cells = row.find_elements(By.XPATH, "./td")
-            logger.debug(f"  Celulas encontradas: {len(cells)}")
-
-            row_data = {}
-
-            # Verificar se a linha é a linha TOTAL (contém "TOTAL" na primeira célula)
-            if cells and "TOTAL" in cells[0].text.upper():
-                logger.debug("  Processando linha TOTAL. Esta linha será ignorada.")
-                continue  # Pula para a próxima iteração do loop, ignorando a linha TOTAL
-
-            # Ignorar linhas 'separador' e 'rodape'
-            elif 'separador' in row.get_attribute('class') or 'rodape' in row.get_attribute('class'):
-                logger.debug("  Linha 'separador' ou 'rodape' encontrada. Ignorando.")
+        for linha in tabela["linhas"]:
+            cells = linha["celulas"]
+            if cells and "TOTAL" in cells[0].upper():
                 continue
-
-            elif len(cells) == len(headers):
-                logger.debug("  Processando linha de dados normal.")
-                # Primeira célula: Grupo procedimento
-                row_data[headers[0]] = cells[0].text.strip()
-                logger.debug(f"    Grupo procedimento: {row_data[headers[0]]}")
-
-                # Iterar pelas outras células, começando da segunda (índice 1)
-                for i, cell in enumerate(cells[1:]):
-                    # Verificar se o índice é válido
-                    if i + 1 < len(headers):
-                        # Extrair valor numérico
-                        valor = self.parse_value(cell.text.strip())
-                        row_data[headers[i + 1]] = valor
-                        logger.debug(f"    Valor {headers[i + 1]}: {valor}")
-
-            # Adicionar a linha aos dados da tabela apenas se row_data não estiver vazio
-            if row_data:
-                logger.debug(f"  Dados da linha: {row_data}")
-                table_data.append(row_data)
-
-        logger.info("Dados da tabela capturados.")
+            if 'separador' in linha["classe"] or 'rodape' in linha["classe"]:
+                continue
+            if len(cells) != len(headers):
+                continue
+            row_data = {headers[0]: cells[0]}
+            for i, cell in enumerate(cells[1:]):
+                row_data[headers[i + 1]] = self.parse_value(cell)
+            table_data.append(row_data)
         return table_data
 
+    def salvar_json(self, table_data, caminho='SIH.json'):
+        logger.info("Salvando os dados em arquivo JSON...")
+        with open(caminho, 'w') as json_file:
+            json.dump(table_data, json_file, ensure_ascii=False, indent=4)
+
     def parse_value(self, value):
         value = re.sub(r'[^\d,.-]', '', value)  # Remove caracteres não numéricos
         value = value.replace('.', '')  # Remove pontos
@@ -142,10 +122,95 @@ class Sih:
         }
         return base_url + uf_map.get(uf, "qipe.def")
 
+    def run_http(self):
+        """Executa a mesma consulta do run() enviando o formulário direto ao tabcgi.exe, sem navegador."""
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Baixando SIH da UF {self.uf} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        logger.info(f"{len(arquivos)} arquivos selecionados.")
+
+        municipio = formulario.opcao_municipio(self.municipio_ibge)
+        if municipio is None:
+            raise RuntimeError(f"Município com IBGE {self.municipio_ibge} não encontrado no formulário do TabNet.")
+
+        tabela = client.consultar("Grupo procedimento", "Ano processamento", arquivos, selecoes={"Município": [municipio]})
+        if tabela is None:
+            raise RuntimeError("Tabela não encontrada na resposta do TabNet.")
+
+        table_data = self.processar_tabela(tabela)
+        logger.info("Dados da tabela capturados:")
+        logger.info(table_data)
+        self.salvar_json(table_data)
+
+        logger.info("Processo concluído.")
+
+    def run_sync(self, caminho='SIH_mensal.json', janela_revisao=JANELA_REVISAO_MESES):
+        """
+        Sincroniza a série mensal do município e regenera o SIH.json a partir dela.
+
+        Só consulta no TabNet os meses que ainda não estão em SIH_mensal.json e os
+        últimos `janela_revisao` meses disponíveis, que o DATASUS ainda pode revisar.
+        """
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Sincronizando SIH mensal do município {self.municipio_ibge} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+        serie = SerieMensal(caminho, "SIH", self.municipio_ibge)
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        pendentes = serie.arquivos_pendentes(arquivos, janela_revisao)
+        logger.info(f"{len(pendentes)} de {len(arquivos)} arquivos precisam ser consultados.")
+
+        if pendentes:
+            municipio = formulario.opcao_municipio(self.municipio_ibge)
+            if municipio is None:
+                raise RuntimeError(f"Município com IBGE {self.municipio_ibge} não encontrado no formulário do TabNet.")
+            tabela = client.consultar("Grupo procedimento", COLUNA_MENSAL, pendentes, selecoes={"Município": [municipio]})
+            if tabela is None:
+                # Sem tabela os meses não são marcados como sincronizados e a série fica como estava
+                raise RuntimeError("Tabela não encontrada na resposta do TabNet; série mensal não atualizada.")
+            serie.mesclar(ler_tabela_mensal(tabela), pendentes)
+            serie.salvar()
+
+        table_data = serie.linhas_anuais("Grupo procedimento", self.start_year, self.start_month, self.end_year, self.end_month, None, float)
+        logger.info(f"{len(table_data)} linhas regeneradas a partir da série mensal.")
+        self.salvar_json(table_data)
+        logger.info("Processo concluído.")
+
+    def run_uf(self, diretorio_saida='municipios'):
+        """
+        Baixa a UF inteira com Município na Linha e grava um SIH.json por município.
+
+        Faz uma consulta por grupo procedimento em vez de uma por município; os arquivos
+        ficam em <diretorio_saida>/<ibge>/SIH.json, no mesmo formato da consulta individual.
+        """
+        url = self.get_url_by_uf(self.uf)
+        logger.info(f"Baixando SIH de todos os municípios da UF {self.uf} via HTTP...")
+        client = TabNetClient(url)
+        formulario = client.formulario()
+
+        arquivos = selecionar_arquivos(formulario.arquivos_disponiveis(), self.start_year, self.start_month, self.end_year, self.end_month)
+        logger.info(f"{len(arquivos)} arquivos selecionados.")
+
+        por_municipio = consultar_uf_por_municipio(client, "Grupo procedimento", None, "Ano processamento", arquivos)
+        if not por_municipio:
+            raise RuntimeError(f"Nenhum município da UF {self.uf} encontrado nas respostas do TabNet.")
+        for codigo, categorias in por_municipio.items():
+            table_data = montar_linhas_municipio(categorias, "Grupo procedimento", self.parse_value)
+            diretorio = os.path.join(diretorio_saida, codigo)
+            os.makedirs(diretorio, exist_ok=True)
+            self.salvar_json(table_data, os.path.join(diretorio, 'SIH.json'))
+
+        logger.info(f"{len(por_municipio)} arquivos SIH.json gravados em {diretorio_saida}/.")
+
     def run(self):
         url = self.get_url_by_uf(self.uf)
         prefix = url.split('/')[-1].split('.')[0]
         logger.info(f"Baixando SIH da UF {self.uf}...")
+        self.iniciar_driver()
         self.driver.get(url)
         self.driver.set_window_size(1366, 736)
 
@@ -226,10 +291,7 @@ class Sih:
         table_data = self.capture_table_data(table_xpath)
         logger.info("Dados da tabela capturados:")
         logger.info(table_data)
-
-        logger.info("Salvando os dados em arquivo JSON...")
-        with open('SIH.json', 'w') as json_file:
-            json.dump(table_data, json_file, ensure_ascii=False, indent=4)
+        self.salvar_json(table_data)
 
         self.driver.close()
         self.driver.switch_to.window(self.driver.window_handles[0])
@@ -247,7 +309,26 @@ if __name__ == "__main__":
     start_month = int(sys.argv[2])
     end_year = int(sys.argv[3])
     end_month = int(sys.argv[4])
-    municipio_ibge = sys.argv[5]
+    municipio_ibge = sys.argv[5]  # Código IBGE do município ou código da UF (2 dígitos) para baixar a UF inteira
     if len(municipio_ibge) == 7: municipio_ibge = municipio_ibge[:-1]
     script = Sih(start_year, start_month, end_year, end_month, municipio_ibge)
-    script.run()
\ No newline at end of file
+    if len(municipio_ibge) == 2:
+        script.run_uf()
+    elif "--selenium" in sys.argv:
+        script.run()
+    elif "--sync" in sys.argv:
+        try:
+            script.run_sync()
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+    else:
+        # Padrão: sincroniza só os meses novos ou revisáveis; --completo baixa o período inteiro de novo
+        try:
+            if "--completo" in sys.argv:
+                script.run_http()
+            else:
+                script.run_sync()
+        except Exception as e:
+            logger.error(f"Falha na consulta HTTP ao TabNet ({e}). Usando o navegador...")
+            script.run()
\ No newline at end of file
@@ -5,7 +5,13 @@ import google.generativeai as genai
 import os
 import pandas as pd
 import logging
-import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Módulos compartilhados (cache_http, executor_llm, indice_frases) ficam na raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cache_http
+from executor_llm import executor_padrao, gerar_varios
+from indice_frases import IndiceFrases
 
 # Configuração do logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,6 +33,88 @@ model = genai.GenerativeModel(
     generation_config=generation_config,
 )
 
+URL_SIDRA_TABELA = "https://apisidra.ibge.gov.br/values/t/{tabela}/n6/{municipio}/v/{variaveis}/p/last%201?header=y"
+
+# Tabelas do SIDRA usadas em dados_economicos.json, na ordem em que aparecem no arquivo.
+# "dimensao" é a coluna que identifica a linha; "campos" liga o texto exato dessa coluna
+# ao nome do campo e "campos_contendo" faz o mesmo por trecho do texto. Sem dimensão,
+# o valor da tabela vai para o campo de chave None.
+TABELAS_SIDRA = {
+    # População residente, Variação absoluta e Taxa de crescimento
+    "4709": {
+        "variaveis": "93,5936,10605",
+        "chave": "populacao_variacao",
+        "dimensao": "D2N",
+        "campos": {
+            "População residente": "populacao_residente",
+            "Taxa de crescimento geométrico": "taxa_de_crescimento_geometrico",
+        },
+        "campos_contendo": {
+            "Variação absoluta da população": "variacao_absoluta_da_populacao_residente_2010_2022",
+        },
+    },
+    # População Residente, Área territorial e Densidade demográfica
+    "4714": {
+        "variaveis": "93,6318,614",
+        "chave": "populacao_area_densidade",
+        "dimensao": "D2N",
+        "campos": {
+            "População residente": "populacao_residente",
+            "Área da unidade territorial": "area_da_unidade_territorial",
+            "Densidade demográfica": "densidade_demografica",
+        },
+    },
+    # Domicílios recenseados, por espécie
+    "4711": {
+        "variaveis": "617",
+        "chave": "domicilios_especie",
+        "dimensao": "D4N",
+        "campos": {"Total": "total"},
+    },
+    # Domicílios particulares permanentes ocupados, Moradores e Média de moradores
+    "4712": {
+        "variaveis": "381,382,5930",
+        "chave": "domicilios_moradores",
+        "dimensao": "D2N",
+        "campos": {
+            "Domicílios particulares permanentes ocupados": "domicilios_particulares_permanentes_ocupados",
+            "Moradores em domicílios particulares permanentes ocupados": "moradores_em_domicilios_particulares_permanentes_ocupados",
+            "Média de moradores em domicílios particulares permanentes ocupados": "media_de_moradores_em_domicilios_particulares_permanentes_ocupados",
+        },
+    },
+    # Taxa de alfabetização
+    "9543": {
+        "variaveis": "2513",
+        "chave": "taxa_alfabetizacao",
+        "dimensao": None,
+        "campos": {None: "taxa_alfabetizacao_15_anos_ou_mais"},
+    },
+    # Rendimento médio mensal
+    "4660": {
+        "variaveis": "5933",
+        "chave": "rendimento_medio",
+        "dimensao": None,
+        "campos": {None: "rendimento_medio_mensal_real"},
+    },
+}
+
+def ler_tabela_sidra(dados, spec):
+    """Converte a resposta do SIDRA (com cabeçalho) nos campos definidos em TABELAS_SIDRA."""
+    df = pd.DataFrame(dados[1:], columns=list(dados[0].keys()))
+    df["V"] = pd.to_numeric(df["V"], errors="coerce")  # '...', '-' e vazios viram NaN
+    df = df.dropna(subset=["V"])
+
+    if spec["dimensao"] is None:
+        campo = pd.Series(spec["campos"][None], index=df.index)
+    else:
+        rotulos = df[spec["dimensao"]]
+        campo = rotulos.map(spec["campos"])
+        for trecho, nome in spec.get("campos_contendo", {}).items():
+            campo = campo.mask(campo.isna() & rotulos.str.contains(trecho, regex=False), nome)
+
+    valores = df.loc[campo.notna(), "V"].groupby(campo[campo.notna()], sort=False).last()
+    return {nome: float(valor) for nome, valor in valores.items()}
+
 def obter_uf_por_ibge(codigo_ibge):
     """Retorna a UF com base nos dois primeiros dígitos do código IBGE."""
     uf_codigo = str(codigo_ibge)[:2]
@@ -55,55 +143,53 @@ def gerar_analise_demografica(df_populacao, dados_economicos, codigo_ibge, nome_
         logger.error(f"Dados econômicos não encontrados para o código IBGE {codigo_ibge}.")
         return {"erro": "Dados econômicos não encontrados para o código IBGE fornecido."}
 
-    info_mencionadas = set()  # Conjunto para armazenar informações já mencionadas
-
-    def gerar_texto(secao, prompt, info_mencionadas):
-        """Gera o texto para uma seção específica, evitando redundâncias e títulos repetidos."""
+    info_mencionadas = IndiceFrases()  # Frases das seções anteriores (iguais ou quase iguais são removidas)
+    titulo_municipio = f"{nome_municipio} (IBGE: {codigo_ibge}, {uf}):"
+
+    def limpar_texto(secao, texto_gerado, info_mencionadas):
+        """Remove do texto as frases já mencionadas, as repetidas na própria seção e os títulos repetidos."""
+        frases_secao = IndiceFrases()
+        frases = []
+        for frase in texto_gerado.split(". "):
+            frase_limpa = frase
+
+            # Remover títulos repetidos (heurística simples)
+            if secao != "introducao" and frase_limpa.strip().startswith(titulo_municipio):
+                frase_limpa = frase_limpa.replace(titulo_municipio, "").strip()
+            elif secao != "introducao" and frase_limpa.strip().startswith("##"):
+                frase_limpa = frase_limpa.replace("##", "").strip()
+
+            if not info_mencionadas.repetida(frase_limpa) and frases_secao.adicionar(frase_limpa):
+                frases.append(frase_limpa)
+        return "".join(frase + ". " for frase in frases)
+
+    def gerar_texto(secao, prompt, info_mencionadas, response):
+        """
+        Limpa a resposta de uma seção, evitando redundâncias com as seções anteriores.
+
+        As respostas chegam todas juntas (ver executor_llm); se a limpeza esvaziar
+        o texto, a seção é gerada de novo, sem o cache.
+        """
         tentativas = 0
         while tentativas < 3:
-            try:
-                logger.info(f"Gerando análise para a seção: {secao}")
-                response = model.generate_content(prompt)
-                texto_gerado = response.text
-
-                # Remover informações já mencionadas e títulos repetidos
-                texto_limpo = ""
-                for frase in texto_gerado.split(". "):
-                    frase_limpa = frase
-                    for info in info_mencionadas:
-                        frase_limpa = frase_limpa.replace(info, "")
-                    
-                    # Remover títulos repetidos (heurística simples)
-                    if secao != "introducao" and frase_limpa.strip().startswith(f"{nome_municipio} (IBGE: {codigo_ibge}, {uf}):"):
-                        frase_limpa = frase_limpa.replace(f"{nome_municipio} (IBGE: {codigo_ibge}, {uf}):", "").strip()
-                    elif secao != "introducao" and frase_limpa.strip().startswith("##"):
-                        frase_limpa = frase_limpa.replace("##", "").strip()
-                    
-                    if frase_limpa.strip() != "" and frase_limpa not in texto_limpo:
-                        texto_limpo += frase_limpa + ". "
-                
-                if texto_limpo == "":
-                    logger.warning(f"Texto gerado para a seção '{secao}' está vazio após a limpeza. Tentando novamente...")
-                    tentativas += 1
-                    time.sleep(5)
-                    continue
-
-                # Adicionar novas informações ao conjunto (exceto títulos)
-                for frase in texto_limpo.split(". "):
-                    if not frase.strip().startswith(f"{nome_municipio} (IBGE: {codigo_ibge}, {uf}):") and not frase.strip().startswith("##"):
-                        info_mencionadas.add(frase)
-
-                logger.info(f"Resposta do Gemini para a seção {secao}: {texto_limpo[:200]}...")
-                return texto_limpo.strip()
-
-            except Exception as e:
-                if "429" in str(e):
-                    logger.warning(f"Limite de taxa atingido para a seção '{secao}'. Tentando novamente em 60 segundos...")
-                    time.sleep(60)
-                    tentativas += 1
-                else:
-                    logger.error(f"Erro ao gerar análise (seção: {secao}): {e}")
-                    return f"Não foi possível gerar a análise para esta seção ({secao})."
+            if isinstance(response, Exception):
+                logger.error(f"Erro ao gerar análise (seção: {secao}): {response}")
+                return f"Não foi possível gerar a análise para esta seção ({secao})."
+
+            texto_limpo = limpar_texto(secao, response.text, info_mencionadas)
+            if texto_limpo == "":
+                logger.warning(f"Texto gerado para a seção '{secao}' está vazio após a limpeza. Tentando novamente...")
+                tentativas += 1
+                response, = executor_padrao().executar([(model, prompt, {"forcar": True})])
+                continue
+
+            # Adicionar novas informações ao conjunto (exceto títulos)
+            for frase in texto_limpo.split(". "):
+                if not frase.strip().startswith(titulo_municipio) and not frase.strip().startswith("##"):
+                    info_mencionadas.adicionar(frase)
+
+            logger.info(f"Resposta do Gemini para a seção {secao}: {texto_limpo[:200]}...")
+            return texto_limpo.strip()
         return f"Não foi possível gerar a análise para esta seção ({secao}) após várias tentativas."
 
     # Verifica se o campo 'rendimento_medio_mensal_real' está disponível
@@ -140,9 +226,13 @@ def gerar_analise_demografica(df_populacao, dados_economicos, codigo_ibge, nome_
         "conclusao": prompt_base + "Faça uma conclusão geral, relacionando os dados demográficos e econômicos e destacando possíveis tendências ou desafios para o município."
     }
 
+    # As seções são geradas ao mesmo tempo e limpas depois, na ordem do texto
+    logger.info(f"Gerando análise para as seções: {', '.join(prompts)}")
+    respostas = gerar_varios(model, list(prompts.values()))
+
     analise_completa = {}
-    for secao, prompt in prompts.items():
-        analise_completa[secao] = gerar_texto(secao, prompt, info_mencionadas)
+    for (secao, prompt), response in zip(prompts.items(), respostas):
+        analise_completa[secao] = gerar_texto(secao, prompt, info_mencionadas, response)
 
     logger.info(f"Análise completa gerada: {analise_completa}")
     return analise_completa
@@ -158,10 +248,10 @@ class Econo:
         }
 
     def obter_dados_sidra(self, url):
-        """Obtém os dados da API do SIDRA usando requests."""
+        """Obtém os dados da API do SIDRA, reaproveitando o cache HTTP em disco."""
         logger.info(f"Obtendo dados da URL: {url}...")
         try:
-            response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
+            response = cache_http.get(url, fonte="sidra", headers={"User-Agent": "Mozilla/5.0"})
             response.raise_for_status()
             data = response.json()
             logger.debug(f"Dados brutos:\n{data}")
@@ -175,111 +265,26 @@ class Econo:
             logger.error(f"Erro ao obter dados da URL: {e}")
             return None
 
+    def obter_tabelas(self):
+        """Baixa todas as tabelas de TABELAS_SIDRA em paralelo; retorna {tabela: dados ou None}."""
+        urls = {
+            tabela: URL_SIDRA_TABELA.format(tabela=tabela, municipio=self.MUNICIPIO, variaveis=spec["variaveis"])
+            for tabela, spec in TABELAS_SIDRA.items()
+        }
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            return dict(zip(urls, executor.map(self.obter_dados_sidra, urls.values())))
+
     def run(self):
         """Obtém os dados das tabelas, adiciona a análise do Gemini e salva em um arquivo JSON."""
 
         # Obter a UF do município
         uf = obter_uf_por_ibge(self.MUNICIPIO)
 
-        # --- URLs da API do SIDRA ---
-        url_4709 = f"https://apisidra.ibge.gov.br/values/t/4709/n6/{self.MUNICIPIO}/v/93,5936,10605/p/last%201?header=y"
-        url_4714 = f"https://apisidra.ibge.gov.br/values/t/4714/n6/{self.MUNICIPIO}/v/93,6318,614/p/last%201?header=y"
-        url_4711 = f"https://apisidra.ibge.gov.br/values/t/4711/n6/{self.MUNICIPIO}/v/617/p/last%201?header=y"
-        url_4712 = f"https://apisidra.ibge.gov.br/values/t/4712/n6/{self.MUNICIPIO}/v/381,382,5930/p/last%201?header=y"
-        url_9543 = f"https://apisidra.ibge.gov.br/values/t/9543/n6/{self.MUNICIPIO}/v/2513/p/last%201?header=y"
-        url_4660 = f"https://apisidra.ibge.gov.br/values/t/4660/n6/{self.MUNICIPIO}/v/5933/p/last%201?header=y"
-
-        # --- Obter Dados das Tabelas ---
-
-        # Tabela 4709: População residente, Variação absoluta e Taxa de crescimento
-        tabela_4709 = self.obter_dados_sidra(url_4709)
-        if tabela_4709 is not None:
-            self.dados_municipio[self.MUNICIPIO]["populacao_variacao"] = {}
-            header = tabela_4709[0]
-            variavel_index = list(header.keys()).index("D2N")
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_4709[1:]:
-                variavel = row[list(header.keys())[variavel_index]]
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    if variavel == "População residente":
-                        self.dados_municipio[self.MUNICIPIO]["populacao_variacao"]["populacao_residente"] = float(valor)
-                    elif "Variação absoluta da população" in variavel:
-                        self.dados_municipio[self.MUNICIPIO]["populacao_variacao"]["variacao_absoluta_da_populacao_residente_2010_2022"] = float(valor)
-                    elif variavel == "Taxa de crescimento geométrico":
-                        self.dados_municipio[self.MUNICIPIO]["populacao_variacao"]["taxa_de_crescimento_geometrico"] = float(valor)
-
-        # Tabela 4714: População Residente, Área territorial e Densidade demográfica
-        tabela_4714 = self.obter_dados_sidra(url_4714)
-        if tabela_4714 is not None:
-            self.dados_municipio[self.MUNICIPIO]["populacao_area_densidade"] = {}
-            header = tabela_4714[0]
-            variavel_index = list(header.keys()).index("D2N")
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_4714[1:]:
-                variavel = row[list(header.keys())[variavel_index]]
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    if variavel == "População residente":
-                        self.dados_municipio[self.MUNICIPIO]["populacao_area_densidade"]["populacao_residente"] = float(valor)
-                    elif variavel == "Área da unidade territorial":
-                        self.dados_municipio[self.MUNICIPIO]["populacao_area_densidade"]["area_da_unidade_territorial"] = float(valor)
-                    elif variavel == "Densidade demográfica":
-                        self.dados_municipio[self.MUNICIPIO]["populacao_area_densidade"]["densidade_demografica"] = float(valor)
-
-        # Tabela 4711: Domicílios recenseados, por espécie
-        tabela_4711 = self.obter_dados_sidra(url_4711)
-        if tabela_4711 is not None:
-            self.dados_municipio[self.MUNICIPIO]["domicilios_especie"] = {}
-            header = tabela_4711[0]
-            variavel_index = list(header.keys()).index("D4N")
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_4711[1:]:
-                variavel = row[list(header.keys())[variavel_index]]
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    if variavel == "Total":
-                        self.dados_municipio[self.MUNICIPIO]["domicilios_especie"]["total"] = float(valor)
-
-        # Tabela 4712: Domicílios particulares permanentes ocupados, Moradores e Média de moradores
-        tabela_4712 = self.obter_dados_sidra(url_4712)
-        if tabela_4712 is not None:
-            self.dados_municipio[self.MUNICIPIO]["domicilios_moradores"] = {}
-            header = tabela_4712[0]
-            variavel_index = list(header.keys()).index("D2N")
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_4712[1:]:
-                variavel = row[list(header.keys())[variavel_index]]
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    if variavel == "Domicílios particulares permanentes ocupados":
-                        self.dados_municipio[self.MUNICIPIO]["domicilios_moradores"]["domicilios_particulares_permanentes_ocupados"] = float(valor)
-                    elif variavel == "Moradores em domicílios particulares permanentes ocupados":
-                        self.dados_municipio[self.MUNICIPIO]["domicilios_moradores"]["moradores_em_domicilios_particulares_permanentes_ocupados"] = float(valor)
-                    elif variavel == "Média de moradores em domicílios particulares permanentes ocupados":
-                        self.dados_municipio[self.MUNICIPIO]["domicilios_moradores"]["media_de_moradores_em_domicilios_particulares_permanentes_ocupados"] = float(valor)
-
-        # Tabela 9543: Taxa de alfabetização
-        tabela_9543 = self.obter_dados_sidra(url_9543)
-        if tabela_9543 is not None:
-            self.dados_municipio[self.MUNICIPIO]["taxa_alfabetizacao"] = {}
-            header = tabela_9543[0]
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_9543[1:]:
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    self.dados_municipio[self.MUNICIPIO]["taxa_alfabetizacao"]["taxa_alfabetizacao_15_anos_ou_mais"] = float(valor)
-
-        # Tabela 4660: Rendimento médio mensal
-        tabela_4660 = self.obter_dados_sidra(url_4660)
-        if tabela_4660 is not None:
-            self.dados_municipio[self.MUNICIPIO]["rendimento_medio"] = {}
-            header = tabela_4660[0]
-            valor_index = list(header.keys()).index("V")
-            for row in tabela_4660[1:]:
-                valor = row[list(header.keys())[valor_index]]
-                if valor and valor != "...":
-                    self.dados_municipio[self.MUNICIPIO]["rendimento_medio"]["rendimento_medio_mensal_real"] = float(valor)
+        # --- Obter Dados das Tabelas (todas ao mesmo tempo) ---
+        for tabela, dados in self.obter_tabelas().items():
+            if dados is not None:
+                spec = TABELAS_SIDRA[tabela]
+                self.dados_municipio[self.MUNICIPIO][spec["chave"]] = ler_tabela_sidra(dados, spec)
 
         # --- Gerar Análise com Gemini e Adicionar aos Dados ---
         # Carregar dados populacionais do arquivo local
@@ -1,8 +1,32 @@
-import sidrapy
+import numpy as np
 import pandas as pd
 import json
+import os
 import sys
 
+# Módulos compartilhados (cache_http) ficam na raiz do projeto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cache_http
+
+URL_SIDRA = "https://apisidra.ibge.gov.br/values"
+DIRETORIO_PIRAMIDES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "piramides")
+
+CODIGOS_UF = {
+    "RO": "11", "AC": "12", "AM": "13", "RR": "14", "PA": "15", "AP": "16", "TO": "17",
+    "MA": "21", "PI": "22", "CE": "23", "RN": "24", "PB": "25", "PE": "26", "AL": "27",
+    "SE": "28", "BA": "29", "MG": "31", "ES": "32", "RJ": "33", "SP": "35", "PR": "41",
+    "SC": "42", "RS": "43", "MS": "50", "MT": "51", "GO": "52", "DF": "53",
+}
+
+def obter_tabela_sidra(caminho):
+    """
+    Mesmo resultado do sidrapy.get_table (primeira linha com os nomes das colunas),
+    mas passando pelo cache HTTP em disco.
+    """
+    response = cache_http.get(f"{URL_SIDRA}{caminho}", fonte="sidra")
+    response.raise_for_status()
+    return pd.DataFrame(response.json())
+
 class Faixa:
     def __init__(self, municipio_ibge):
         self.MUNICIPIO = municipio_ibge  # Código IBGE do município como atributo da classe
@@ -49,76 +73,165 @@ class Faixa:
     tabela_completa = pd.DataFrame()
 
     def run(self):
-        # Fazer a requisição para cada faixa etária
-        for faixa_etaria in self.faixas_etarias:
-            codigo = self.codigos_faixas_etarias[faixa_etaria]
-            print(f"Requisitando dados para: {faixa_etaria} (código {codigo})...")
-
-            try:
-                data = sidrapy.get_table(
-                    table_code="9514",
-                    territorial_level="6",
-                    ibge_territorial_code=self.MUNICIPIO,  # Código do município
-                    period="2022",
-                    variable="93",
-                    classifications={
-                        "2": "4,5",  # Homens e Mulheres
-                        "287": codigo,  # Código da faixa etária
-                    },
-                )
-
-                # Remover a primeira linha (cabeçalho)
-                data = data.drop(0)
-
-                # Converter a coluna 'V' para numérico
-                data["V"] = pd.to_numeric(data["V"], errors="coerce")
+        # Pirâmides baixadas em lote (--uf/--brasil) dispensam a consulta ao SIDRA
+        piramides = Piramides.localizar(self.MUNICIPIO)
+        if piramides is not None:
+            self.tabela_completa = piramides.piramide(self.MUNICIPIO)
+            self.tabela_completa.to_json("tabela_populacao_completa.json", orient="index", indent=4)
+            print("Tabela completa salva em tabela_populacao_completa.json (pirâmides locais)")
+            return
 
-                # Verificar os dados extraídos
-                print(data.head())
+        # Uma única requisição com todas as faixas etárias (classificação 287)
+        codigos = ",".join(self.codigos_faixas_etarias[faixa_etaria] for faixa_etaria in self.faixas_etarias)
+        print(f"Requisitando dados das {len(self.faixas_etarias)} faixas etárias...")
 
-                # Criar uma tabela pivô para reorganizar os dados
-                tabela_pivot = data.pivot_table(
-                    values="V", index="D3N", columns="D4N", aggfunc="sum"
-                )
+        # Tabela 9514, variável 93, 2022; c2 = Homens e Mulheres, c287 = faixas etárias
+        data = obter_tabela_sidra(f"/t/9514/n6/{self.MUNICIPIO}/v/93/p/2022/c2/4,5/c287/{codigos}")
 
-                # Preencher NaN com 0 e lidar com o FutureWarning
-                tabela_pivot = tabela_pivot.fillna(0).infer_objects(copy=False)
+        # Remover a primeira linha (cabeçalho)
+        data = data.drop(0)
 
-                # Converter valores para inteiros
-                tabela_pivot = tabela_pivot.astype("Int64")
+        # Converter a coluna 'V' para numérico
+        data["V"] = pd.to_numeric(data["V"], errors="coerce")
 
-                # Adicionar uma coluna de total
-                tabela_pivot["Total"] = tabela_pivot.sum(axis=1)
+        # As dimensões seguem a ordem das classificações na URL: D4 = sexo, D5 = faixa etária
+        faixa_por_codigo = {codigo: faixa_etaria for faixa_etaria, codigo in self.codigos_faixas_etarias.items()}
+        data["Faixa Etária"] = data["D5C"].map(faixa_por_codigo)
 
-                # Adicionar a coluna 'Faixa Etária'
-                tabela_pivot['Faixa Etária'] = faixa_etaria
+        # Uma única tabela pivô com todas as faixas (linhas) e sexos (colunas)
+        tabela_pivot = data.pivot_table(
+            values="V", index="Faixa Etária", columns="D4N", aggfunc="sum"
+        )
 
-                # Concatenar a tabela da faixa etária atual com a tabela completa
-                self.tabela_completa = pd.concat([self.tabela_completa, tabela_pivot])
+        # Preencher NaN com 0 e converter valores para inteiros
+        tabela_pivot = tabela_pivot.fillna(0).infer_objects(copy=False).astype("Int64")
 
-                print(f"Dados para {faixa_etaria} adicionados à tabela completa.")
-
-            except Exception as e:
-                print(f"Erro ao requisitar dados para {faixa_etaria}: {e}")
-
-        # Redefinir o índice da tabela completa
-        self.tabela_completa = self.tabela_completa.reset_index(drop=True)
-
-        # Definir a coluna 'Faixa Etária' como o novo índice
-        self.tabela_completa = self.tabela_completa.set_index('Faixa Etária')
+        # Adicionar uma coluna de total
+        tabela_pivot["Total"] = tabela_pivot.sum(axis=1)
+        tabela_pivot.columns.name = None
 
         # Reordenar as linhas para a ordem correta das faixas etárias
-        self.tabela_completa = self.tabela_completa.reindex(self.faixas_etarias)
+        self.tabela_completa = tabela_pivot.reindex(self.faixas_etarias)
 
         # Salvar a tabela completa em formato JSON
         self.tabela_completa.to_json("tabela_populacao_completa.json", orient="index", indent=4)
 
         print("Tabela completa salva em tabela_populacao_completa.json")
 
+class Piramides:
+    """
+    População de 2022 (tabela 9514) por município, faixa etária e sexo em um array denso.
+
+    `populacao[i, j, k]` é a população do município `ibge[i]` na faixa
+    `Faixa.faixas_etarias[j]` e no sexo `SEXOS[k]`; o array fica em um .npz,
+    de onde qualquer pirâmide ou indicador é obtido sem acessar o SIDRA.
+    """
+
+    SEXOS = ["Homens", "Mulheres"]
+    CODIGOS_SEXO = {"4": 0, "5": 1}
+
+    # "Menos de 1 ano" está contida em "0 a 4 anos" e fica fora das somas
+    FAIXAS_JOVENS = slice(1, 4)     # 0 a 14 anos
+    FAIXAS_ATIVAS = slice(4, 14)    # 15 a 64 anos
+    FAIXAS_IDOSAS = slice(14, 22)   # 65 anos ou mais
+
+    def __init__(self, ibge, populacao):
+        ordem = np.argsort(ibge, kind="stable")
+        self.ibge = np.asarray(ibge, dtype=np.int64)[ordem]
+        self.populacao = np.asarray(populacao, dtype=np.int64)[ordem]
+
+    @classmethod
+    def de_tabela(cls, data):
+        """Monta o array a partir da resposta do SIDRA (com a linha de cabeçalho)."""
+        data = data.drop(0)
+        indice_faixa = {codigo: j for j, codigo in enumerate(Faixa.codigos_faixas_etarias[f] for f in Faixa.faixas_etarias)}
+        ibge, linhas = np.unique(data["D1C"].astype(np.int64).to_numpy(), return_inverse=True)
+        faixas = data["D5C"].map(indice_faixa).to_numpy()
+        sexos = data["D4C"].map(cls.CODIGOS_SEXO).to_numpy()
+        valores = pd.to_numeric(data["V"], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+
+        populacao = np.zeros((len(ibge), len(Faixa.faixas_etarias), len(cls.SEXOS)), dtype=np.int64)
+        populacao[linhas, faixas, sexos] = valores
+        return cls(ibge, populacao)
+
+    @classmethod
+    def baixar_uf(cls, uf):
+        """Todos os municípios da UF (sigla ou código) em uma requisição (n6 dentro de n3)."""
+        codigo_uf = CODIGOS_UF.get(str(uf).upper(), str(uf))
+        codigos = ",".join(Faixa.codigos_faixas_etarias[f] for f in Faixa.faixas_etarias)
+        print(f"Requisitando pirâmides dos municípios da UF {codigo_uf}...")
+        data = obter_tabela_sidra(f"/t/9514/n6/in%20n3%20{codigo_uf}/v/93/p/2022/c2/4,5/c287/{codigos}")
+        return cls.de_tabela(data)
+
+    @classmethod
+    def baixar_brasil(cls):
+        """Todos os municípios do país, uma requisição por UF (limite de valores por consulta do SIDRA)."""
+        partes = [cls.baixar_uf(codigo_uf) for codigo_uf in CODIGOS_UF.values()]
+        return cls(np.concatenate([p.ibge for p in partes]), np.concatenate([p.populacao for p in partes]))
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as arquivo:
+            return cls(arquivo["ibge"], arquivo["populacao"])
+
+    @classmethod
+    def localizar(cls, municipio_ibge):
+        """Pirâmides locais que contêm o município (do Brasil ou da UF), ou None."""
+        for nome in ("brasil.npz", f"uf_{str(municipio_ibge)[:2]}.npz"):
+            caminho = os.path.join(DIRETORIO_PIRAMIDES, nome)
+            if os.path.exists(caminho):
+                piramides = cls.carregar(caminho)
+                if piramides.indice(municipio_ibge) is not None:
+                    return piramides
+        return None
+
+    def salvar(self, caminho):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        np.savez_compressed(caminho, ibge=self.ibge, populacao=self.populacao,
+                            faixas=np.array(Faixa.faixas_etarias), sexos=np.array(self.SEXOS))
+        print(f"{len(self.ibge)} municípios salvos em {caminho}")
+
+    def indice(self, municipio_ibge):
+        """Posição do município no array; aceita o código IBGE com 6 ou 7 dígitos."""
+        codigo = int(municipio_ibge)
+        chaves = self.ibge // 10 if len(str(municipio_ibge)) == 6 else self.ibge
+        i = np.searchsorted(chaves, codigo)
+        return int(i) if i < len(chaves) and chaves[i] == codigo else None
+
+    def piramide(self, municipio_ibge):
+        """Mesma tabela do Faixa.run (faixas x Homens/Mulheres/Total) para um município."""
+        i = self.indice(municipio_ibge)
+        if i is None:
+            raise KeyError(f"Município {municipio_ibge} não está nas pirâmides.")
+        tabela = pd.DataFrame(self.populacao[i], index=Faixa.faixas_etarias, columns=self.SEXOS).astype("Int64")
+        tabela["Total"] = tabela.sum(axis=1)
+        return tabela
+
+    def _totais(self, faixas):
+        return self.populacao[:, faixas, :].sum(axis=(1, 2))
+
+    def razao_dependencia(self):
+        """(0-14 + 65 ou mais) / 15-64 x 100, para todos os municípios."""
+        ativos = self._totais(self.FAIXAS_ATIVAS)
+        dependentes = self._totais(self.FAIXAS_JOVENS) + self._totais(self.FAIXAS_IDOSAS)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.Series(np.where(ativos > 0, dependentes * 100 / ativos, np.nan), index=self.ibge)
+
+    def proporcao_idosos(self):
+        """Percentual da população com 65 anos ou mais, para todos os municípios."""
+        total = self._totais(slice(1, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.Series(np.where(total > 0, self._totais(self.FAIXAS_IDOSAS) * 100 / total, np.nan), index=self.ibge)
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2 and sys.argv[1] == "--uf":
+        uf = CODIGOS_UF.get(sys.argv[2].upper(), sys.argv[2])
+        Piramides.baixar_uf(uf).salvar(os.path.join(DIRETORIO_PIRAMIDES, f"uf_{uf}.npz"))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--brasil":
+        Piramides.baixar_brasil().salvar(os.path.join(DIRETORIO_PIRAMIDES, "brasil.npz"))
+    elif len(sys.argv) > 1:
         municipio_ibge = sys.argv[1]
         script = Faixa(municipio_ibge)
         script.run()
     else:
-        print("Uso: python faixa_etaria.py <codigo_ibge_municipio>")
+        print("Uso: python faixa_etaria.py <codigo_ibge_municipio> | --uf <UF> | --brasil")
@@ -1,3 +1,4 @@
+import os
 import sys
 import time
 import pandas as pd
@@ -10,6 +11,9 @@ from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 
+from extracao_tabela import celulas_das_linhas, extrair_tabela_driver
+from sismac import SismacClient, valor_brl
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -43,13 +47,8 @@ def extract_table_data(driver, wait, headers):
         time.sleep(5)  # Espera adicional antes de tentar novamente
         wait.until(EC.presence_of_all_elements_located((By.XPATH, "//tbody[@id='tetoFinanceiroBrasil_data']/tr")))
     
-    rows = driver.find_elements(By.XPATH, "//tbody[@id='tetoFinanceiroBrasil_data']/tr")
-    logger.info(f"{len(rows)} linhas encontradas na tabela.")
-    data = []
-    for row in rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
-        if len(cols) == len(headers):  # Match header length
-            data.append([col.text for col in cols])
+    tabela = extrair_tabela_driver(driver, "//tbody[@id='tetoFinanceiroBrasil_data']")
+    data = celulas_das_linhas(tabela, num_colunas=len(headers))  # Match header length
     logger.info("Dados da tabela extraídos.")
     return data
 
@@ -80,6 +79,18 @@ uf_mapping = {
     "52": "GO", "53": "DF"
 }
 
+URL_TETO_BRASIL = "https://sismac.saude.gov.br/teto_financeiro_brasil_por_estado_municipio"
+
+HEADERS = [
+    'Região',
+    'Sigla UF',
+    'Código IBGE',
+    'Estado / Município',
+    'Código Gestão',
+    'Descrição Gestão',
+    'Teto Financeiro MAC - Valores Anuais (R$)'
+]
+
 def get_uf_from_ibge(municipio_ibge):
     state_code = municipio_ibge[:2]
     return uf_mapping.get(state_code, "Código IBGE não encontrado")
@@ -94,7 +105,7 @@ def main(municipio_ibge):
     try:
         # Navigate to the URL
         logger.info(f"Baixando Teto MAC do {uf}...")
-        driver.get("https://sismac.saude.gov.br/teto_financeiro_brasil_por_estado_municipio")
+        driver.get(URL_TETO_BRASIL)
         driver.set_window_size(1366, 736)
         
         # Explicit wait for the element to be present
@@ -136,15 +147,7 @@ def main(municipio_ibge):
             logger.info(f"{len(rows)} linhas encontradas na tabela.")
 
         # Adjust headers to match desired data
-        headers = [
-            'Região', 
-            'Sigla UF', 
-            'Código IBGE', 
-            'Estado / Município', 
-            'Código Gestão', 
-            'Descrição Gestão', 
-            'Teto Financeiro MAC - Valores Anuais (R$)'
-        ]
+        headers = HEADERS
         logger.info("Cabeçalhos ajustados para corresponder aos dados desejados.")
         
         # Extract table data
@@ -167,6 +170,97 @@ def main(municipio_ibge):
         driver.quit()
         logger.info("Driver encerrado.")
 
+# Snapshot nacional: todas as UFs em um único arquivo colunar, com valores já numéricos
+SNAPSHOT_BRASIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teto_mac_brasil.parquet")
+SNAPSHOT_VALIDADE_DIAS = 7
+COLUNA_TETO = 'Teto Financeiro MAC - Valores Anuais (R$)'
+
+def baixar_brasil(caminho=SNAPSHOT_BRASIL):
+    """Baixa a tabela de todas as UFs (~5.600 linhas) em uma única paginação e grava o snapshot."""
+    logger.info("Baixando Teto MAC de todas as UFs via HTTP...")
+    client = SismacClient(URL_TETO_BRASIL).carregar()
+    data = client.linhas("tetoFinanceiroBrasil", tamanho_pagina=6000, num_colunas=len(HEADERS))
+    if not data:
+        raise RuntimeError("Nenhuma linha retornada para o Brasil.")
+
+    df = pd.DataFrame(data, columns=HEADERS)
+    df['Ordem'] = range(len(df))
+    df['Código IBGE'] = pd.to_numeric(df['Código IBGE'], errors='coerce').astype('Int64')
+    df = df.dropna(subset=['Código IBGE'])
+    df[COLUNA_TETO] = df[COLUNA_TETO].map(valor_brl).astype('float64')
+    for coluna in ('Região', 'Sigla UF', 'Código Gestão', 'Descrição Gestão'):
+        df[coluna] = df[coluna].astype('category')
+    df = df.set_index('Código IBGE').sort_index(kind='stable')
+
+    df.to_parquet(caminho)
+    logger.info(f"{len(df)} linhas de {df['Sigla UF'].nunique()} UFs salvas em {caminho}.")
+    return df
+
+def carregar_snapshot(caminho=SNAPSHOT_BRASIL, validade_dias=SNAPSHOT_VALIDADE_DIAS):
+    """Lê o snapshot nacional se existir e não estiver vencido; caso contrário retorna None."""
+    if not os.path.exists(caminho):
+        return None
+    idade_dias = (time.time() - os.path.getmtime(caminho)) / 86400
+    if validade_dias is not None and idade_dias > validade_dias:
+        logger.info(f"Snapshot {caminho} tem {idade_dias:.0f} dias; será ignorado.")
+        return None
+    return pd.read_parquet(caminho)
+
+def teto_municipio(df, municipio_ibge):
+    """Linhas do snapshot de um município (código IBGE de 6 ou 7 dígitos)."""
+    codigo = int(str(municipio_ibge)[:6])
+    return df.loc[[codigo]] if codigo in df.index else df.iloc[0:0]
+
+def teto_por_uf(df):
+    """Soma do teto dos municípios (códigos de 6 dígitos) de cada UF."""
+    # As linhas da própria UF (Total UF e Gestão Estadual) têm código XX0000
+    municipios = df[(df.index >= 100000) & (df.index % 10000 != 0)]
+    return municipios.groupby('Sigla UF', observed=True)[COLUNA_TETO].sum().sort_values(ascending=False)
+
+def save_from_snapshot(df, uf):
+    """Grava o MAC_UF.json da UF a partir do snapshot, no mesmo formato do save_to_json."""
+    df_uf = df[df['Sigla UF'] == uf].reset_index().sort_values('Ordem')
+    reformatted_data = [
+        {
+            "Região": row['Região'],
+            "Sigla UF": row['Sigla UF'],
+            "Código IBGE": str(row['Código IBGE']),
+            "Estado / Município": row['Estado / Município'],
+            "Código Gestão": row['Código Gestão'],
+            "Descrição Gestão": row['Descrição Gestão'],
+            COLUNA_TETO: "" if pd.isna(row[COLUNA_TETO]) else f"{row[COLUNA_TETO]:.2f}"
+        }
+        for row in df_uf.to_dict('records')
+    ]
+    with open('MAC_UF.json', 'w', encoding='utf-8') as file:
+        json.dump(reformatted_data, file, ensure_ascii=False, indent=4)
+    logger.info(f"MAC_UF.json gravado a partir do snapshot nacional ({len(reformatted_data)} linhas).")
+
+def main_http(municipio_ibge):
+    """Mesmo resultado do main(), paginando a datatable direto pelo AJAX do PrimeFaces."""
+    uf = get_uf_from_ibge(municipio_ibge)
+    logger.info(f"Baixando Teto MAC do {uf} via HTTP...")
+    client = SismacClient(URL_TETO_BRASIL).carregar()
+    data = client.linhas("tetoFinanceiroBrasil", tamanho_pagina=6000, filtros={"siglaUF": uf}, num_colunas=len(HEADERS))
+    if not data:
+        raise RuntimeError(f"Nenhuma linha retornada para a UF {uf}.")
+    logger.info(f"{len(data)} linhas encontradas na tabela.")
+    save_to_json(data, HEADERS)
+
 if __name__ == "__main__":
     municipio_ibge = sys.argv[1]
-    main(municipio_ibge)
\ No newline at end of file
+    if municipio_ibge == "--brasil":
+        baixar_brasil()
+        sys.exit(0)
+
+    snapshot = None if "--selenium" in sys.argv else carregar_snapshot()
+    if snapshot is not None:
+        save_from_snapshot(snapshot, get_uf_from_ibge(municipio_ibge))
+    elif "--selenium" in sys.argv:
+        main(municipio_ibge)
+    else:
+        try:
+            main_http(municipio_ibge)
+        except Exception as e:
+            logger.error(f"Falha no acesso HTTP ao SISMAC ({e}). Usando o navegador...")
+            main(municipio_ibge)
\ No newline at end of file
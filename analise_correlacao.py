@@ -1,14 +1,21 @@
+import argparse
+import io
 import json
 import logging
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
 import os
 import google.generativeai as genai
-import time
 from dotenv import load_dotenv
 from google.api_core.exceptions import GoogleAPIError
 import requests
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from executor_llm import executor_padrao, gerar_varios
+from ipca import SerieIPCA
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -28,7 +35,7 @@ genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
 
 def get_inflation_data(start_year, end_year):
     """
-    Obtém dados de inflação (IPCA) do Banco Central do Brasil.
+    Obtém dados de inflação (IPCA) da série local, buscando no Banco Central apenas os meses que faltam.
 
     Args:
         start_year: Ano inicial da série.
@@ -38,31 +45,25 @@ def get_inflation_data(start_year, end_year):
         Um DataFrame do pandas com os dados de inflação acumulada anual.
         Retorna None em caso de erro.
     """
+    serie = SerieIPCA()
     try:
-        url = f"http://api.bcb.gov.br/dados/serie/bcdata.sgs.433/dados?formato=json&dataInicial=01/01/{start_year}&dataFinal=31/12/{end_year}"
-        response = requests.get(url)
-        response.raise_for_status()  # Lança exceção para erros HTTP
-        data = response.json()
-        df = pd.DataFrame(data)
-        df['data'] = pd.to_datetime(df['data'], dayfirst=True)
-        df['valor'] = pd.to_numeric(df['valor'])
-        df.set_index('data', inplace=True)
-
-        # Acumula a inflação anual
-        df_annual = df.resample('YE').sum()
-        df_annual['valor_acumulado'] = (1 + df_annual['valor'] / 100).cumprod()
-
-        # Converte o índice para anos (strings)
-        df_annual.index = df_annual.index.year.astype(str)
-
-        return df_annual
+        serie.sincronizar()
     except requests.exceptions.RequestException as e:
-        logging.error(f"Erro ao obter dados de inflação: {e}")
-        return None
-    except (KeyError, ValueError) as e:
-        logging.error(f"Erro ao processar dados de inflação: {e}")
+        if serie.ultimo_mes is None:
+            logging.error(f"Erro ao obter dados de inflação: {e}")
+            return None
+        logging.warning(f"Erro ao atualizar o IPCA ({e}); usando a série local até {serie.ultimo_mes}.")
+
+    acumulado = serie.acumulado_anual(start_year, end_year)
+    if not acumulado:
+        logging.error(f"IPCA sem dados entre {start_year} e {end_year}.")
         return None
 
+    # Acumula a inflação anual
+    df_annual = pd.DataFrame({'valor': pd.Series(acumulado)})
+    df_annual['valor_acumulado'] = (1 + df_annual['valor'] / 100).cumprod()
+    return df_annual
+
 def load_sia_data(file_path):
     logging.info(f"Carregando dados do SIA do arquivo: {file_path}")
     try:
@@ -330,23 +331,14 @@ def calculate_correlations(teto_total, sia_data, sih_data, common_years):
 
     return correlations
 
-def generate_correlation_graph(teto_total_real, data, variable, common_years, output_dir="graphs"):
+def build_correlation_figure(teto_total_real, data, variable, common_years):
     """
-    Gera um gráfico de dispersão com linha de tendência usando matplotlib.
-
-    Args:
-        teto_total_real (list): Valores reais do Teto Financeiro MAC.
-        data (dict): Dados da variável específica.
-        variable (str): Nome da variável.
-        common_years (list): Lista de anos comuns.
-        output_dir (str): Diretório para salvar o gráfico.
+    Monta o gráfico de dispersão com linha de tendência (matplotlib.figure.Figure).
 
-    Returns:
-        str: Caminho do arquivo do gráfico salvo.
+    Usa a API orientada a objetos, sem o estado global do pyplot, para que os
+    gráficos possam ser gerados em outra thread enquanto o Gemini responde.
+    Retorna None se não houver dados.
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
     # Extrai os valores da variável para os anos comuns
     valores_variavel = [data.get(str(ano), 0) for ano in common_years]
 
@@ -359,35 +351,107 @@ def generate_correlation_graph(teto_total_real, data, variable, common_years, ou
         logging.warning(f"Dados insuficientes para gerar o gráfico de {variable}.")
         return None
 
-    # Cria o gráfico de dispersão
-    plt.figure(figsize=(12, 6))
-    plt.scatter(teto_total_real, valores_variavel, label=variable, color='blue', alpha=0.6)
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.scatter(teto_total_real, valores_variavel, label=variable, color='blue', alpha=0.6)
 
     # Adiciona uma linha de tendência
     try:
         z = np.polyfit(teto_total_real, valores_variavel, 1)  # Ajuste linear
         p = np.poly1d(z)
-        plt.plot(teto_total_real, p(teto_total_real), "r--", label="Linha de Tendência")
+        ax.plot(teto_total_real, p(teto_total_real), "r--", label="Linha de Tendência")
     except Exception as e:
         logging.error(f"Erro ao calcular a linha de tendência para {variable}: {e}")
 
     # Configurações do gráfico
-    plt.xlabel("Teto Financeiro MAC (Valores Nominais)")
-    plt.ylabel(variable)
-    plt.title(f"Correlação entre Teto Financeiro MAC e {variable}")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
+    ax.set_xlabel("Teto Financeiro MAC (Valores Nominais)")
+    ax.set_ylabel(variable)
+    ax.set_title(f"Correlação entre Teto Financeiro MAC e {variable}")
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout()
+    return fig
+
+def generate_correlation_graph(teto_total_real, data, variable, common_years, output_dir="graphs"):
+    """
+    Gera um gráfico de dispersão com linha de tendência usando matplotlib.
+
+    Args:
+        teto_total_real (list): Valores reais do Teto Financeiro MAC.
+        data (dict): Dados da variável específica.
+        variable (str): Nome da variável.
+        common_years (list): Lista de anos comuns.
+        output_dir (str): Diretório para salvar o gráfico.
+
+    Returns:
+        str: Caminho do arquivo do gráfico salvo.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    fig = build_correlation_figure(teto_total_real, data, variable, common_years)
+    if fig is None:
+        return None
 
     # Salva o gráfico
     graph_path = os.path.join(output_dir, f"{variable}_correlation.png")
-    plt.savefig(graph_path)
-    plt.close()
+    fig.savefig(graph_path)
 
     return graph_path
 
+def generate_thumbnail(teto_total_real, data, variable, common_years, dpi=40, colors=16):
+    """
+    Miniatura do gráfico (480x240 com o dpi padrão) em PNG de paleta, para envio ao Gemini.
+
+    Returns:
+        bytes do PNG, ou None se não houver dados.
+    """
+    fig = build_correlation_figure(teto_total_real, data, variable, common_years)
+    if fig is None:
+        return None
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi)
+    buffer.seek(0)
+    imagem = Image.open(buffer).convert("RGB").quantize(colors=colors)
+    saida = io.BytesIO()
+    imagem.save(saida, format="PNG", optimize=True)
+    return saida.getvalue()
+
+def build_inflation_context(inflation_data):
+    """Trecho do prompt sobre a inflação (IPCA) acumulada no período."""
+    inflation_context = "Considerando a inflação acumulada (IPCA) no período analisado, "
+    inflation_context += "é importante destacar que os valores nominais do Teto Financeiro MAC e dos gastos em saúde "
+    inflation_context += "não foram ajustados pela inflação. Isso significa que o aumento real dos recursos pode ter sido "
+    inflation_context += "menor do que o observado nominalmente, impactando a capacidade de financiamento do SUS."
+    if inflation_data is not None and not inflation_data.empty:
+        ipca_periodo = (inflation_data['valor_acumulado'].iloc[-1] - 1) * 100
+        inflation_context += f" O IPCA acumulado entre {inflation_data.index[0]} e {inflation_data.index[-1]} foi de {ipca_periodo:.2f}%."
+    return inflation_context
+
+def build_variable_prompt(var, corr, inflation_context, tabela=None):
+    """Prompt da análise de uma variável, acompanhado do gráfico (imagem) ou da tabela anual."""
+    fonte = "o gráfico correspondente" if tabela is None else "a série anual correspondente"
+    onde = "no gráfico" if tabela is None else "na tabela"
+    dados = "" if tabela is None else f"\n    {tabela}\n"
+    return f"""
+    Você é um especialista em análise de dados do sistema de saúde brasileiro.
+    Analise a seguinte correlação e {fonte}, considerando o contexto do SUS (Sistema Único de Saúde) e a **inflação (IPCA) acumulada no período**:
+    **Use destaques de forma elegante**
+    Variável: {var}
+    Correlação com o Teto Financeiro MAC (valores nominais): {corr:.4f}
+{dados}
+    {inflation_context}
+
+    1. **Interprete o valor da correlação** (forte, moderada, fraca, positiva, negativa, ou **inexistente/espúria se a correlação for nula devido a dados constantes ou ausentes**).
+    2. **Descreva brevemente a tendência geral** observada {onde} para ambas as variáveis, **mencionando se há dados ausentes, zerados ou constantes que invalidem a análise de correlação**.
+    3. **Em não mais que 3 linhas**, foque em **como a baixa correlação ou a ausência de correlação, considerando a inflação, pode indicar subfinanciamento ou ineficiência na alocação de recursos para {var}**, considerando o contexto do SUS.
+    4. **Em não mais que 3 linhas**, indique **implicações práticas** para o planejamento e gestão do SUS, **sugerindo ações para melhorar o acesso e a qualidade dos serviços relacionados a {var}**.
+
+    **Faça texto corrido. Seja objetivo e conciso, adote o formato de análise crítica, e foque em insights acionáveis que evidenciem a necessidade de atenção para a variável {var} no contexto do financiamento do SUS, considerando a defasagem causada pela inflação.**
+    """
+
 def generate_analysis_with_gemini_vision(corr_values, graph_paths, inflation_data):
     analysis = {}
+    pendentes = {}
     model = genai.GenerativeModel('gemini-1.5-flash')
 
     for var, corr in corr_values.items():
@@ -404,59 +468,171 @@ def generate_analysis_with_gemini_vision(corr_values, graph_paths, inflation_dat
             continue
 
         # --- Prepara a parte do prompt sobre inflação ---
-        inflation_context = "Considerando a inflação acumulada (IPCA) no período analisado, "
-        inflation_context += "é importante destacar que os valores nominais do Teto Financeiro MAC e dos gastos em saúde "
-        inflation_context += "não foram ajustados pela inflação. Isso significa que o aumento real dos recursos pode ter sido "
-        inflation_context += "menor do que o observado nominalmente, impactando a capacidade de financiamento do SUS."
+        inflation_context = build_inflation_context(inflation_data)
+
+        prompt = build_variable_prompt(var, corr, inflation_context)
+        # Carrega a imagem do gráfico
+        image_path = graph_paths.get(var)
+        if not image_path:
+            logging.warning(f"Gráfico não encontrado para {var}. A análise será feita sem a imagem.")
+            analysis[var] = f"Não foi possível gerar a análise com o Gemini devido à falta do gráfico correspondente. A correlação foi calculada como: {corr}"
+            continue
+        try:
+            with open(image_path, "rb") as image_file:
+                image_parts = {
+                    "mime_type": "image/png",
+                    "data": image_file.read()
+                }
+        except OSError as e:
+            logging.error(f"Erro ao ler o gráfico de {var}: {e}")
+            analysis[var] = "Não foi possível gerar a análise com o Gemini devido a um erro."
+            continue
+        pendentes[var] = [prompt, image_parts]
+
+    # Todas as chamadas de uma vez, dentro da cota do Gemini (ver executor_llm)
+    respostas = gerar_varios(model, list(pendentes.values()))
+    for var, response in zip(pendentes, respostas):
+        if isinstance(response, GoogleAPIError):
+            logging.error(f"Erro de API ao chamar o Gemini para {var}: {response}")
+            analysis[var] = f"Erro de API ao chamar o Gemini: {response}"
+        elif isinstance(response, Exception):
+            logging.error(f"Erro desconhecido ao chamar o Gemini para {var}: {response}")
+            analysis[var] = f"Erro desconhecido ao chamar o Gemini: {response}"
+        else:
+            analysis[var] = response.text
+
+    # Mantém a ordem das variáveis em corr_values
+    return {var: analysis[var] for var in corr_values if var in analysis}
+
+def build_series_table(teto_series, serie):
+    """Tabela Markdown com os pares (Teto MAC, valor da variável) por ano."""
+    linhas = ["| Ano | Teto MAC (R$) | Valor |", "|---|---|---|"]
+    for ano, teto in teto_series.items():
+        linhas.append(f"| {ano} | {teto:.2f} | {serie.get(ano, 0):g} |")
+    return "\n    ".join(linhas)
 
+def generate_analysis_with_data(corr_values, series, teto_series, inflation_data, thumbnails=None):
+    """
+    Mesma análise de generate_analysis_with_gemini_vision, enviando a série anual em tabela.
+
+    O prompt leva os pares (Teto MAC, valor) de cada ano no lugar do PNG do gráfico;
+    opcionalmente, uma miniatura do gráfico (ver generate_thumbnail) acompanha a tabela.
+
+    Args:
+        thumbnails: {variável: bytes do PNG} (opcional).
+    """
+    analysis = {}
+    pendentes = {}
+    thumbnails = thumbnails or {}
+    model = genai.GenerativeModel('gemini-1.5-flash')
+    inflation_context = build_inflation_context(inflation_data)
+
+    for var, corr in corr_values.items():
+        logging.info(f"Correlação para {var}: {corr}")
+
+        if corr is None:
+            logging.warning(f"Correlação não calculada para {var}. Análise não será gerada.")
+            analysis[var] = "Não foi possível calcular a correlação devido a dados insuficientes ou constantes."
+            continue
+
+        prompt = build_variable_prompt(var, corr, inflation_context, build_series_table(teto_series, series.get(var, {})))
+        if thumbnails.get(var):
+            pendentes[var] = [prompt, {"mime_type": "image/png", "data": thumbnails[var]}]
+        else:
+            pendentes[var] = prompt
+
+    respostas = gerar_varios(model, list(pendentes.values()))
+    for var, response in zip(pendentes, respostas):
+        if isinstance(response, GoogleAPIError):
+            logging.error(f"Erro de API ao chamar o Gemini para {var}: {response}")
+            analysis[var] = f"Erro de API ao chamar o Gemini: {response}"
+        elif isinstance(response, Exception):
+            logging.error(f"Erro desconhecido ao chamar o Gemini para {var}: {response}")
+            analysis[var] = f"Erro desconhecido ao chamar o Gemini: {response}"
+        else:
+            analysis[var] = response.text
+
+    # Mantém a ordem das variáveis em corr_values
+    return {var: analysis[var] for var in corr_values}
+
+def generate_analysis_batch(corr_values, series, teto_series, inflation_data):
+    """
+    Gera a análise de todas as variáveis em uma única chamada ao Gemini.
+
+    Envia a correlação e as séries numéricas de cada variável (no lugar dos
+    gráficos) e pede uma resposta JSON com um texto por variável, no formato
+    de analise_correlacao.json.
+
+    Args:
+        corr_values: {variável: correlação ou None}.
+        series: {variável: {ano: valor}} com os anos comuns.
+        teto_series: {ano: valor} do Teto Financeiro MAC nos anos comuns.
+        inflation_data: DataFrame de get_inflation_data.
+    """
+    analysis = {}
+    variaveis = []
+    for var, corr in corr_values.items():
+        logging.info(f"Correlação para {var}: {corr}")
+        if corr is None:
+            logging.warning(f"Correlação não calculada para {var}. Análise não será gerada.")
+            analysis[var] = "Não foi possível calcular a correlação devido a dados insuficientes ou constantes."
+        else:
+            variaveis.append(var)
+
+    if variaveis:
+        dados = {
+            "teto_financeiro_mac": teto_series,
+            "variaveis": {var: {"correlacao": round(corr_values[var], 4), "serie": series.get(var, {})} for var in variaveis},
+        }
         prompt = f"""
         Você é um especialista em análise de dados do sistema de saúde brasileiro.
-        Analise a seguinte correlação e o gráfico correspondente, considerando o contexto do SUS (Sistema Único de Saúde) e a **inflação (IPCA) acumulada no período**:
+        Para cada variável abaixo, analise a correlação com o Teto Financeiro MAC (valores nominais) e as séries anuais, considerando o contexto do SUS (Sistema Único de Saúde) e a **inflação (IPCA) acumulada no período**:
         **Use destaques de forma elegante**
-        Variável: {var}
-        Correlação com o Teto Financeiro MAC (valores nominais): {corr:.4f}
 
-        {inflation_context}
+        {build_inflation_context(inflation_data)}
 
+        Para cada variável:
         1. **Interprete o valor da correlação** (forte, moderada, fraca, positiva, negativa, ou **inexistente/espúria se a correlação for nula devido a dados constantes ou ausentes**).
-        2. **Descreva brevemente a tendência geral** observada no gráfico para ambas as variáveis, **mencionando se há dados ausentes, zerados ou constantes que invalidem a análise de correlação**.
-        3. **Em não mais que 3 linhas**, foque em **como a baixa correlação ou a ausência de correlação, considerando a inflação, pode indicar subfinanciamento ou ineficiência na alocação de recursos para {var}**, considerando o contexto do SUS.
-        4. **Em não mais que 3 linhas**, indique **implicações práticas** para o planejamento e gestão do SUS, **sugerindo ações para melhorar o acesso e a qualidade dos serviços relacionados a {var}**.
+        2. **Descreva brevemente a tendência geral** das duas séries, **mencionando se há dados ausentes, zerados ou constantes que invalidem a análise de correlação**.
+        3. **Em não mais que 3 linhas**, foque em **como a baixa correlação ou a ausência de correlação, considerando a inflação, pode indicar subfinanciamento ou ineficiência na alocação de recursos para a variável**, considerando o contexto do SUS.
+        4. **Em não mais que 3 linhas**, indique **implicações práticas** para o planejamento e gestão do SUS, **sugerindo ações para melhorar o acesso e a qualidade dos serviços relacionados à variável**.
 
-        **Faça texto corrido. Seja objetivo e conciso, adote o formato de análise crítica, e foque em insights acionáveis que evidenciem a necessidade de atenção para a variável {var} no contexto do financiamento do SUS, considerando a defasagem causada pela inflação.**
+        **Faça texto corrido para cada variável. Seja objetivo e conciso, adote o formato de análise crítica, e foque em insights acionáveis, considerando a defasagem causada pela inflação.**
+        Responda com um objeto JSON cujas chaves são exatamente os nomes das variáveis e cujos valores são as análises.
+
+        Dados (JSON):
+        {json.dumps(dados, ensure_ascii=False)}
         """
+        generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema={
+                "type": "object",
+                "properties": {var: {"type": "string"} for var in variaveis},
+                "required": variaveis,
+            },
+        )
+        model = genai.GenerativeModel('gemini-1.5-flash', generation_config=generation_config)
+        response, = executor_padrao().executar([(model, prompt)])
         try:
-            # Carrega a imagem do gráfico
-            image_path = graph_paths.get(var)
-            if image_path:
-                image_parts = {
-                    "mime_type": "image/png",
-                    "data": open(image_path, "rb").read()
-                }
-                contents = [prompt, image_parts]
-
-                # Tenta fazer a chamada à API
-                try:
-                    response = model.generate_content(contents=contents)
-                    analysis[var] = response.text
-                except GoogleAPIError as e:
-                    logging.error(f"Erro de API ao chamar o Gemini para {var}: {e}")
-                    analysis[var] = f"Erro de API ao chamar o Gemini: {e}"
-                except Exception as e:
-                    logging.error(f"Erro desconhecido ao chamar o Gemini para {var}: {e}")
-                    analysis[var] = f"Erro desconhecido ao chamar o Gemini: {e}"
-
-                time.sleep(1)  # Adiciona um atraso de 1 segundo para evitar atingir o limite de taxa
-            else:
-                logging.warning(f"Gráfico não encontrado para {var}. A análise será feita sem a imagem.")
-                analysis[var] = f"Não foi possível gerar a análise com o Gemini devido à falta do gráfico correspondente. A correlação foi calculada como: {corr}"
+            if isinstance(response, Exception):
+                raise response
+            textos = json.loads(response.text)
+        except GoogleAPIError as e:
+            logging.error(f"Erro de API ao chamar o Gemini: {e}")
+            textos = {var: f"Erro de API ao chamar o Gemini: {e}" for var in variaveis}
+        except json.JSONDecodeError as e:
+            logging.error(f"Resposta do Gemini não é um JSON válido: {e}")
+            textos = {}
         except Exception as e:
-            logging.error(f"Erro ao chamar a API do Gemini para {var}: {e}")
-            analysis[var] = "Não foi possível gerar a análise com o Gemini devido a um erro."
+            logging.error(f"Erro desconhecido ao chamar o Gemini: {e}")
+            textos = {var: f"Erro desconhecido ao chamar o Gemini: {e}" for var in variaveis}
+        for var in variaveis:
+            analysis[var] = textos.get(var) or "Não foi possível gerar a análise com o Gemini devido a um erro."
 
-    return analysis
+    # Mantém a ordem das variáveis em corr_values
+    return {var: analysis[var] for var in corr_values}
 
-def main():
+def main(modo="imagem", miniatura=False):
     logging.info("Iniciando análise de correlação.")
     sia_data = load_sia_data('SIA.json')
     sih_data = load_sih_data('SIH.json')
@@ -493,22 +669,61 @@ def main():
     # --- Calcula correlações ---
     correlations = calculate_correlations(teto_total_nominal, sia_data, sih_data, common_years)
 
-    # --- Geração dos Gráficos ---
-    graph_paths = {}
+    # --- Variáveis analisadas ---
+    variable_data = {}
     if sia_data:
-        graph_paths["Média Complexidade"] = generate_correlation_graph(teto_total_nominal, sia_data['media_complexidade'], "Média Complexidade", common_years)
-        graph_paths["Alta Complexidade"] = generate_correlation_graph(teto_total_nominal, sia_data['alta_complexidade'], "Alta Complexidade", common_years)
-        graph_paths["Total Ambulatorial"] = generate_correlation_graph(teto_total_nominal, sia_data['total_ambulatorial'], "Total Ambulatorial", common_years)
+        variable_data["Média Complexidade"] = sia_data['media_complexidade']
+        variable_data["Alta Complexidade"] = sia_data['alta_complexidade']
+        variable_data["Total Ambulatorial"] = sia_data['total_ambulatorial']
     if sih_data:
-        for grupo in sih_data:
-            graph_paths[grupo] = generate_correlation_graph(teto_total_nominal, sih_data[grupo], grupo, common_years)
+        variable_data.update(sih_data)
 
-    # --- Análise com Gemini ---
-    analysis = generate_analysis_with_gemini_vision(correlations, graph_paths, inflation_data)
+    def render_graphs():
+        return {
+            var: generate_correlation_graph(teto_total_nominal, data, var, common_years)
+            for var, data in variable_data.items()
+        }
+
+    def salvar_analise(analysis):
+        with open('analise_correlacao.json', 'w', encoding='utf-8') as f:
+            json.dump(analysis, f, ensure_ascii=False, indent=4)
+        logging.info("Análise salva em 'analise_correlacao.json'.")
 
-    with open('analise_correlacao.json', 'w', encoding='utf-8') as f:
-        json.dump(analysis, f, ensure_ascii=False, indent=4)
-    logging.info("Análise salva em 'analise_correlacao.json'.")
+    # --- Análise com Gemini ---
+    if modo == "imagem":
+        graph_paths = render_graphs()
+        analysis = generate_analysis_with_gemini_vision(correlations, graph_paths, inflation_data)
+        salvar_analise(analysis)
+    else:
+        # Os gráficos são gerados em outra thread; o Gemini recebe os números e não espera por eles
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            graficos = executor.submit(render_graphs)
+            series = {var: {ano: data.get(ano, 0) for ano in common_years} for var, data in variable_data.items()}
+            teto_series = dict(zip(common_years, teto_total_nominal))
+            if modo == "lote":
+                analysis = generate_analysis_batch(correlations, series, teto_series, inflation_data)
+            else:
+                thumbnails = {}
+                if miniatura:
+                    thumbnails = {
+                        var: generate_thumbnail(teto_total_nominal, data, var, common_years)
+                        for var, data in variable_data.items() if correlations.get(var) is not None
+                    }
+                analysis = generate_analysis_with_data(correlations, series, teto_series, inflation_data, thumbnails)
+            # A análise já paga é gravada antes de esperar pelos gráficos; uma falha neles não a descarta
+            salvar_analise(analysis)
+            try:
+                graficos.result()
+            except Exception as e:
+                logging.error(f"Erro ao gerar os gráficos de correlação: {e}")
 
 if __name__ == "__main__":
-    main()  
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Análise de correlação entre o Teto MAC e a produção (SIA/SIH).")
+    parser.add_argument("--modo", choices=["imagem", "dados", "lote"], default="imagem",
+                        help="imagem: uma chamada ao Gemini por variável, com o gráfico; "
+                             "dados: uma chamada por variável, com a série anual em tabela; "
+                             "lote: todas as variáveis em uma única chamada com resposta JSON.")
+    parser.add_argument("--miniatura", action="store_true",
+                        help="No modo dados, envia também uma miniatura do gráfico (PNG de 16 cores).")
+    args = parser.parse_args()
+    main(args.modo, args.miniatura)  
\ No newline at end of file
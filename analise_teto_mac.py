@@ -10,6 +10,9 @@ from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 
+from extracao_tabela import celulas_das_linhas, extrair_tabela_driver
+from sismac import SismacClient
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -35,13 +38,20 @@ def setup_driver():
 
 def extract_table_data(driver, wait, headers):
     wait.until(EC.presence_of_all_elements_located((By.XPATH, "//tbody[@id='tabelaAnaliseTetoFinanceiroDetalhadoMunicipio_data']/tr[@data-ri]")))
-    rows = driver.find_elements(By.XPATH, "//tbody[@id='tabelaAnaliseTetoFinanceiroDetalhadoMunicipio_data']/tr[@data-ri]")
-    data = []
-    for row in rows:
-        cols = row.find_elements(By.TAG_NAME, "td")
-        if len(cols) == len(headers):
-            data.append([col.text for col in cols])
-    return data
+    tabela = extrair_tabela_driver(driver, "//tbody[@id='tabelaAnaliseTetoFinanceiroDetalhadoMunicipio_data']")
+    return celulas_das_linhas(tabela, num_colunas=len(headers), apenas_data_ri=True)
+
+URL_ANALISE_TETO = "https://sismac.saude.gov.br/analise_teto_financeiro"
+
+HEADERS = [
+    'Portaria',
+    'Data',
+    'Tipo',
+    'Incentivo',
+    'Área',
+    'Competência',
+    'Valor'
+]
 
 def save_to_json(data, headers):
     df = pd.DataFrame(data, columns=headers)
@@ -88,7 +98,7 @@ def main(municipio):
     wait = WebDriverWait(driver, 30)
 
     try:
-        driver.get("https://sismac.saude.gov.br/analise_teto_financeiro")
+        driver.get(URL_ANALISE_TETO)
         logger.info("Acessando SISMAC...")
         logger.info(f'Baixando Portarias de {municipio}...')
 
@@ -129,31 +139,11 @@ def main(municipio):
         else:
             logger.info(f"{len(rows)} linhas encontradas.")
 
-        headers = [
-            'Portaria', 
-            'Data', 
-            'Tipo', 
-            'Incentivo', 
-            'Área', 
-            'Competência', 
-            'Valor'
-        ]
+        headers = HEADERS
         logger.debug("Cabeçalhos ajustados: %s", headers)
 
-        data = []
         try:
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
-                row_data = [
-                    cols[0].text,
-                    cols[1].text,
-                    cols[2].text,
-                    cols[3].text,
-                    cols[4].text,
-                    cols[5].text,
-                    cols[6].text
-                ]
-                data.append(row_data)
+            data = extract_table_data(driver, wait, headers)
             logger.info("Dados da tabela extraídos.")
         except Exception as e:
             logger.error(f"Erro ao extrair dados da tabela: {e}")
@@ -189,7 +179,26 @@ def main(municipio):
     finally:
         driver.quit()
 
+def main_http(municipio):
+    """Mesmo resultado do main(), via requisições AJAX do PrimeFaces, sem navegador e sem esperas fixas."""
+    logger.info(f'Baixando análise do Teto MAC de {municipio} via HTTP...')
+    client = SismacClient(URL_ANALISE_TETO).carregar()
+    client.acionar_link("Município")
+    client.selecionar_autocomplete("filtroPesquisaMunicipio", municipio)
+    data = client.linhas("tabelaAnaliseTetoFinanceiroDetalhadoMunicipio", tamanho_pagina=100, num_colunas=len(HEADERS))
+    if not data:
+        raise RuntimeError(f"Nenhuma portaria retornada para {municipio}.")
+    logger.info(f"{len(data)} linhas encontradas.")
+    save_to_json(data, HEADERS)
+
 if __name__ == "__main__":
     municipio_ibge = sys.argv[1]
     if len(municipio_ibge) == 7: municipio_ibge = municipio_ibge[:-1]
-    main(municipio_ibge)
\ No newline at end of file
+    if "--selenium" in sys.argv:
+        main(municipio_ibge)
+    else:
+        try:
+            main_http(municipio_ibge)
+        except Exception as e:
+            logger.error(f"Falha no acesso HTTP ao SISMAC ({e}). Usando o navegador...")
+            main(municipio_ibge)
\ No newline at end of file
@@ -4,11 +4,12 @@ import threading
 import queue
 import subprocess
 import logging
-import requests
-import json
 import os
 import sys
 
+from catalogo_municipios import catalogo
+from pipeline import ETAPAS, Pipeline, criar_pool
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -23,78 +24,29 @@ logger = logging.getLogger(__name__)
 # Fila para enviar atualizações de status
 status_queue = queue.Queue()
 
-# Função para obter municípios por UF
-def obter_municipios_por_uf(uf):
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{uf}/municipios"
-    response = requests.get(url)
+# Processos com pandas, selenium e genai já importados; criados antes da janela Tk (ver criar_pool).
+# Com --subprocess cada script roda em um python novo, como antes.
+pool = None if "--subprocess" in sys.argv else criar_pool(2)
 
-    if response.status_code == 200:
-        dados = response.json()
-        municipios = [municipio['nome'] for municipio in dados]
-        return municipios
-    else:
-        logger.error(f"Erro ao obter municípios para a UF {uf}. Código de status: {response.status_code}")
+# Função para obter municípios por UF (catálogo local, sem acesso à rede)
+def obter_municipios_por_uf(uf):
+    try:
+        return [municipio['nome'] for municipio in catalogo().por_uf(uf)]
+    except RuntimeError as e:
+        logger.error(f"Erro ao obter municípios para a UF {uf}: {e}")
         return []
 
 # Função para obter o código IBGE de um município
 def obter_codigo_ibge(nome_municipio, uf):
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/estados/{uf}/municipios"
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        dados = response.json()
-        for municipio in dados:
-            if municipio['nome'].lower() == nome_municipio.lower():
-                return municipio['id']
-        logger.warning(f"Município {nome_municipio} não encontrado na UF {uf}.")
+    try:
+        municipio = catalogo().por_nome(nome_municipio, uf)
+    except RuntimeError as e:
+        logger.error(f"Erro ao obter código IBGE para o município {nome_municipio}: {e}")
         return None
-    else:
-        logger.error(f"Erro ao obter código IBGE para o município {nome_municipio}. Código de status: {response.status_code}")
+    if municipio is None:
+        logger.warning(f"Município {nome_municipio} não encontrado na UF {uf}.")
         return None
-
-# Função para executar um script
-def run_script(script_name, *params):
-    script_mapping = {
-        "analise_teto_mac": "analise_teto_mac.py",
-        "BaixaSIA": "BaixaSIA.py",
-        "BaixaSIH": "BaixaSIH.py",
-        "evolucao_mac": "evolucao_mac.py",
-        "evolucao_mac2": "evolucao_mac2.py",
-        "MacUF": "MacUF.py",
-        "Econo": "/home/davi/Python-Projetos/MAC/IBGE/economia.py",
-        "Faixa": "/home/davi/Python-Projetos/MAC/IBGE/faixa_etaria.py",
-        "Resumo_PT": "/home/davi/Python-Projetos/MAC/res_pt.py",
-        "Analise MAC": "/home/davi/Python-Projetos/MAC/txt_analise_mac.py",
-        "Analise MAC_SIH": "/home/davi/Python-Projetos/MAC/txt_analise_mac_sih.py",
-        "Analise MAC_SIA": "/home/davi/Python-Projetos/MAC/txt_analise_mac_sia.py",
-        "Analise Correlações": "/home/davi/Python-Projetos/MAC/analise_correlacao.py",
-        "Conclusão": "/home/davi/Python-Projetos/MAC/conclusao.py",
-    }
-    script_path = script_mapping.get(script_name)
-
-    if script_path:
-        try:
-            # Convert params to strings
-            params = [str(param) for param in params]
-            logger.info(f"Executando script {script_name} com parâmetros: {params}")
-            status_queue.put((script_name, "Executando..."))  # Envia atualização de status
-            # Executa o script
-            subprocess.run(["python", script_path, *params], check=True)
-            logger.info(f"Script {script_name} executado com sucesso!")
-            status_queue.put((script_name, "Concluído"))  # Envia atualização de status
-
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Erro ao executar o script {script_name}.")
-            logger.error(f"Código de retorno: {e.returncode}")
-            if e.output:
-                logger.error(f"Saída:\n{e.output.decode()}")
-            if e.stderr:
-                logger.error(f"Erro padrão:\n{e.stderr.decode()}")
-            status_queue.put((script_name, "Erro"))  # Envia atualização de status
-
-    else:
-        logger.error(f"Script {script_name} não encontrado.")
-        status_queue.put((script_name, "Erro"))  # Envia atualização de status
+    return int(municipio['ibge'])
 
 # Função principal para executar todos os scripts
 def executar_scripts(nome_municipio, uf, status_dict):
@@ -106,41 +58,21 @@ def executar_scripts(nome_municipio, uf, status_dict):
         status_queue.put(("Erro", f"Não foi possível encontrar o município {nome_municipio}/{uf}."))
         return
 
-    # Obtendo range de anos da evolução do MAC
-    with open('evolucao_mac.json', 'r', encoding='utf-8') as file:
-        evolucao_mac_json = json.load(file)
-
-    # Função para obter os parâmetros
-    def obter_params(json_data):
-        anos = set()
-        for item in json_data:
-            for key, value in item.items():
-                anos.update(value.keys())
-
-        start_year = min(anos)
-        end_year = str(int(max(anos)) + 1)
-        start_month = 1  # Janeiro
-        end_month = 12   # Dezembro
-
-        return [start_year, start_month, end_year, str(end_month)]
-
-    # Executa todos os scripts
-    # run_script("evolucao_mac", str(codigo_ibge))
-    # run_script("evolucao_mac2", str(codigo_ibge))
-    # params = [*obter_params(evolucao_mac_json), str(codigo_ibge)]
-    # logger.debug(f"Parâmetros obtidos: {params}")
-    # run_script("MacUF", str(codigo_ibge))
-    # run_script("analise_teto_mac", str(codigo_ibge))
-    # run_script("BaixaSIA", *params)
-    # run_script("BaixaSIH", *params)
-    # run_script("Faixa", str(codigo_ibge))
-    # run_script("Econo", str(codigo_ibge), nome_municipio)
-    # run_script("Resumo_PT")
-    # run_script("Analise MAC", nome_municipio)
-    # run_script("Analise MAC_SIH", nome_municipio)
-    # run_script("Analise MAC_SIA", nome_municipio)
-    # run_script("Analise Correlações")
-    run_script("Conclusão")
+    # Executa as etapas pelo grafo de dependências do pipeline, na pasta atual (lida pelo Streamlit);
+    # cada etapa informa "Executando...", "Concluído" ou "Erro" pela status_queue
+    global pool
+    execucao = Pipeline(ETAPAS, status_queue=status_queue, pool=pool)
+    try:
+        falhas = execucao.executar(str(codigo_ibge), nome_municipio, uf, diretorio=os.getcwd())
+        if falhas:
+            logger.error(f"Etapas com erro: {', '.join(falhas)}")
+    except Exception as e:
+        logger.error(f"Erro ao executar as etapas do município {nome_municipio}/{uf}: {e}")
+        for script_name, status in status_dict.items():
+            if status != "Concluído":
+                status_queue.put((script_name, "Erro"))
+    # Se o pool aquecido quebrou, as próximas execuções já começam em um python por etapa
+    pool = execucao.pool
 
     # Sinaliza o fim da execução de todos os scripts
     status_queue.put(("Fim", "Todos os scripts foram executados."))
@@ -215,9 +147,7 @@ status_dict = {
     "Econo": "Aguardando",
     "Faixa": "Aguardando",
     "Resumo_PT": "Aguardando",
-    "Analise MAC": "Aguardando",
-    "Analise MAC_SIH": "Aguardando",
-    "Analise MAC_SIA": "Aguardando",
+    "Analise Textos": "Aguardando",
     "Analise Correlações": "Aguardando",
     "Conclusão": "Aguardando",
 }
@@ -0,0 +1,261 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_CACHE = os.environ.get(
+    "CACHE_HTTP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_http")
+)
+TAMANHO_MAXIMO_CACHE = 500 * 1024 * 1024  # 500 MB
+# Gravações entre recontagens completas do tamanho (outros processos gravam na mesma pasta)
+RECONTAGEM_TAMANHO = 500
+# Ao passar do limite, a limpeza desce até esta fração dele, para não rodar a cada nova gravação
+FRACAO_APOS_LIMPEZA = 0.9
+
+# Tempo (em segundos) em que uma resposta é usada sem consultar a origem, por fonte
+TTL_FONTE = {
+    "ibge_localidades": 30 * 24 * 3600,  # servicodados.ibge.gov.br/api/v1/localidades
+    "sidra": 7 * 24 * 3600,              # apisidra.ibge.gov.br
+    "bcb": 24 * 3600,                    # api.bcb.gov.br (IPCA mensal)
+    "padrao": 3600,
+}
+
+
+def _gravar_atomico(caminho, conteudo):
+    diretorio = os.path.dirname(caminho)
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix=".tmp")
+    with os.fdopen(descritor, 'wb') as file:
+        file.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+class CacheDisco:
+    """
+    Cache em disco de respostas HTTP, compartilhado entre scripts e processos.
+
+    A chave é o hash do método, da URL (com os parâmetros) e do corpo da
+    requisição; o conteúdo é guardado pelo próprio hash (respostas iguais
+    ocupam um único arquivo). Cada fonte tem seu TTL; vencido o prazo, a
+    resposta é revalidada com If-None-Match/If-Modified-Since quando a origem
+    enviou ETag/Last-Modified. O tamanho total é limitado removendo as
+    entradas usadas há mais tempo (LRU).
+    """
+
+    def __init__(self, diretorio=DIRETORIO_CACHE, tamanho_maximo=TAMANHO_MAXIMO_CACHE, session=None):
+        self.diretorio = diretorio
+        self.tamanho_maximo = tamanho_maximo
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        # Tamanho estimado dos corpos (None até a primeira contagem), para não percorrer o cache a cada gravação
+        self._tamanho = None
+        self._gravacoes = 0
+
+    def _chave(self, preparada):
+        sha = hashlib.sha256()
+        sha.update(preparada.method.encode())
+        sha.update(b"\0" + preparada.url.encode())
+        corpo = preparada.body or b""
+        sha.update(b"\0" + (corpo.encode() if isinstance(corpo, str) else corpo))
+        return sha.hexdigest()
+
+    def _caminho_meta(self, chave):
+        return os.path.join(self.diretorio, "meta", chave[:2], f"{chave}.json")
+
+    def _caminho_corpo(self, hash_corpo):
+        return os.path.join(self.diretorio, "corpos", hash_corpo[:2], hash_corpo)
+
+    def _ler(self, chave):
+        try:
+            with open(self._caminho_meta(chave), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            with open(self._caminho_corpo(meta["corpo"]), 'rb') as file:
+                return meta, file.read()
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def _tamanhos_corpos(self):
+        """{hash do corpo: tamanho} de todos os corpos no disco."""
+        corpos = {}
+        for raiz, _, arquivos in os.walk(os.path.join(self.diretorio, "corpos")):
+            for nome in arquivos:
+                if not nome.startswith(".tmp"):
+                    with contextlib.suppress(FileNotFoundError):
+                        corpos[nome] = os.path.getsize(os.path.join(raiz, nome))
+        return corpos
+
+    def _gravar(self, chave, meta, corpo):
+        hash_corpo = hashlib.sha256(corpo).hexdigest()
+        novo = not os.path.exists(self._caminho_corpo(hash_corpo))
+        if novo:
+            _gravar_atomico(self._caminho_corpo(hash_corpo), corpo)
+        meta["corpo"] = hash_corpo
+        _gravar_atomico(self._caminho_meta(chave), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+        # O cache só é percorrido quando a estimativa passa do limite (ou na recontagem periódica)
+        with self._lock:
+            self._gravacoes += 1
+            if self._tamanho is None or self._gravacoes >= RECONTAGEM_TAMANHO:
+                self._tamanho = sum(self._tamanhos_corpos().values())
+                self._gravacoes = 0
+            elif novo:
+                self._tamanho += len(corpo)
+            excedeu = self._tamanho > self.tamanho_maximo
+        if excedeu:
+            self.limitar_tamanho()
+
+    def _resposta(self, meta, corpo):
+        resposta = requests.Response()
+        resposta.status_code = meta["status"]
+        resposta._content = corpo
+        resposta.headers = CaseInsensitiveDict(meta["headers"])
+        resposta.url = meta["url"]
+        resposta.encoding = meta.get("encoding")
+        resposta.reason = "OK"
+        resposta.from_cache = True
+        return resposta
+
+    def request(self, method, url, fonte="padrao", ttl=None, forcar=False, **kwargs):
+        """
+        Mesma assinatura de requests.request, com a resposta servida do cache quando possível.
+
+        Args:
+            fonte: Nome da fonte em TTL_FONTE (define o TTL padrão).
+            ttl: TTL em segundos, sobrescrevendo o da fonte.
+            forcar: Ignora o TTL e revalida na origem.
+
+        Returns:
+            Um requests.Response (com o atributo from_cache indicando a origem).
+        """
+        ttl = TTL_FONTE.get(fonte, TTL_FONTE["padrao"]) if ttl is None else ttl
+        kwargs.setdefault("timeout", 60)
+        headers = dict(kwargs.pop("headers", None) or {})
+        preparada = self.session.prepare_request(requests.Request(
+            method, url, headers=headers, params=kwargs.pop("params", None),
+            data=kwargs.pop("data", None), json=kwargs.pop("json", None),
+        ))
+        chave = self._chave(preparada)
+        meta, corpo = self._ler(chave)
+
+        if meta is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(self._caminho_meta(chave))  # marca o uso para o LRU
+            if not forcar and time.time() - meta["armazenado_em"] < ttl:
+                logger.debug(f"Cache HTTP: {url}")
+                return self._resposta(meta, corpo)
+            validadores = CaseInsensitiveDict(meta["headers"])
+            if validadores.get("ETag"):
+                preparada.headers["If-None-Match"] = validadores["ETag"]
+            if validadores.get("Last-Modified"):
+                preparada.headers["If-Modified-Since"] = validadores["Last-Modified"]
+
+        # Proxies e certificados do ambiente, como o session.request faria
+        configuracao = self.session.merge_environment_settings(
+            preparada.url, kwargs.pop("proxies", {}), kwargs.pop("stream", None),
+            kwargs.pop("verify", None), kwargs.pop("cert", None),
+        )
+        try:
+            resposta = self.session.send(preparada, **configuracao, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if meta is None:
+                raise
+            logger.warning(f"Falha ao revalidar {url} ({e}); usando a resposta do cache.")
+            return self._resposta(meta, corpo)
+
+        if resposta.status_code == 304 and meta is not None:
+            logger.debug(f"Cache HTTP revalidado: {url}")
+            meta["armazenado_em"] = time.time()
+            self._gravar(chave, meta, corpo)
+            return self._resposta(meta, corpo)
+
+        resposta.from_cache = False
+        if resposta.status_code == 200:
+            meta = {
+                "url": resposta.url,
+                "fonte": fonte,
+                "status": resposta.status_code,
+                "headers": {nome: valor for nome, valor in resposta.headers.items()
+                            if nome.lower() in ("content-type", "etag", "last-modified")},
+                "encoding": resposta.encoding,
+                "armazenado_em": time.time(),
+            }
+            self._gravar(chave, meta, resposta.content)
+        return resposta
+
+    def get(self, url, fonte="padrao", **kwargs):
+        return self.request("GET", url, fonte=fonte, **kwargs)
+
+    def post(self, url, fonte="padrao", **kwargs):
+        return self.request("POST", url, fonte=fonte, **kwargs)
+
+    def limitar_tamanho(self):
+        """Se o cache passou de tamanho_maximo, remove as entradas usadas há mais tempo até FRACAO_APOS_LIMPEZA dele."""
+        with self._lock:
+            entradas = []
+            for raiz, _, arquivos in os.walk(os.path.join(self.diretorio, "meta")):
+                for nome in arquivos:
+                    if nome.endswith(".json"):
+                        caminho = os.path.join(raiz, nome)
+                        entradas.append((os.path.getmtime(caminho), caminho))
+            corpos = self._tamanhos_corpos()
+            total = sum(corpos.values())
+            self._tamanho = total
+            if total <= self.tamanho_maximo:
+                return
+
+            corpo_de = {}
+            usos = {}
+            for _, caminho in entradas:
+                try:
+                    with open(caminho, 'r', encoding='utf-8') as file:
+                        hash_corpo = json.load(file)["corpo"]
+                except (OSError, ValueError, KeyError):
+                    continue
+                corpo_de[caminho] = hash_corpo
+                usos[hash_corpo] = usos.get(hash_corpo, 0) + 1
+
+            removidas = 0
+            alvo = self.tamanho_maximo * FRACAO_APOS_LIMPEZA
+            for _, caminho in sorted(entradas):
+                if total <= alvo:
+                    break
+                # Outro processo pode ter removido o mesmo arquivo
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(caminho)
+                removidas += 1
+                hash_corpo = corpo_de.get(caminho)
+                if hash_corpo is None:
+                    continue
+                usos[hash_corpo] -= 1
+                if not usos[hash_corpo] and hash_corpo in corpos:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self._caminho_corpo(hash_corpo))
+                    total -= corpos.pop(hash_corpo)
+            self._tamanho = total
+            self._gravacoes = 0
+            logger.info(f"Cache HTTP: {removidas} entradas removidas (LRU).")
+
+
+_cache_padrao = None
+
+
+def cache_padrao():
+    """Instância compartilhada do cache (criada no primeiro uso)."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheDisco()
+    return _cache_padrao
+
+
+def get(url, fonte="padrao", **kwargs):
+    """Atalho para cache_padrao().get, com a mesma assinatura de requests.get."""
+    return cache_padrao().get(url, fonte=fonte, **kwargs)
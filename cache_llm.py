@@ -0,0 +1,115 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+
+from cache_http import CacheDisco
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_CACHE_LLM = os.environ.get(
+    "CACHE_LLM_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_llm")
+)
+TAMANHO_MAXIMO_CACHE_LLM = 200 * 1024 * 1024  # 200 MB
+TTL_LLM = int(os.environ.get("CACHE_LLM_TTL", 30 * 24 * 3600))
+# CACHE_LLM_FORCAR=1 ignora as respostas guardadas (e as substitui pelas novas)
+FORCAR_LLM = os.environ.get("CACHE_LLM_FORCAR", "") not in ("", "0")
+
+
+def _normalizar(valor):
+    """Forma estável (serializável em JSON) do conteúdo enviado ao modelo; bytes entram pelo hash."""
+    if isinstance(valor, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(valor).hexdigest()}
+    if isinstance(valor, dict):
+        return {str(chave): _normalizar(item) for chave, item in sorted(valor.items(), key=lambda par: str(par[0]))}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(item) for item in valor]
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    if hasattr(valor, "to_dict"):
+        return _normalizar(valor.to_dict())
+    return repr(valor)
+
+
+class RespostaLLM:
+    """Resposta do modelo reduzida ao texto (o que os scripts usam), com a origem."""
+
+    def __init__(self, text, from_cache):
+        self.text = text
+        self.from_cache = from_cache
+
+
+class CacheLLM(CacheDisco):
+    """
+    Cache em disco das respostas do Gemini.
+
+    Usa o mesmo armazenamento do cache HTTP (metadados por chave, corpo pelo
+    hash e limite de tamanho por LRU). A chave é o hash do nome do modelo, do
+    generation_config e do conteúdo enviado, com as imagens entrando pelos
+    bytes; qualquer mudança no prompt ou na configuração gera uma nova consulta.
+    """
+
+    def __init__(self, diretorio=DIRETORIO_CACHE_LLM, tamanho_maximo=TAMANHO_MAXIMO_CACHE_LLM, ttl=TTL_LLM):
+        super().__init__(diretorio, tamanho_maximo)
+        self.ttl = ttl
+
+    def chave_llm(self, model, contents, **kwargs):
+        configuracao = kwargs.pop("generation_config", None) or getattr(model, "_generation_config", None)
+        chave = {
+            "modelo": getattr(model, "model_name", None) or repr(model),
+            "generation_config": _normalizar(configuracao),
+            "contents": _normalizar(contents),
+            "kwargs": _normalizar(kwargs),
+        }
+        return hashlib.sha256(json.dumps(chave, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def buscar(self, model, contents, ttl=None, **kwargs):
+        """Resposta guardada para a consulta, se ainda válida (None caso contrário)."""
+        if FORCAR_LLM:
+            return None
+        ttl = self.ttl if ttl is None else ttl
+        chave = self.chave_llm(model, contents, **kwargs)
+        meta, corpo = self._ler(chave)
+        if meta is None or time.time() - meta["armazenado_em"] >= ttl:
+            return None
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self._caminho_meta(chave))  # marca o uso para o LRU
+        logger.info(f"Resposta do {meta['modelo']} obtida do cache.")
+        return RespostaLLM(corpo.decode("utf-8"), from_cache=True)
+
+    def gerar(self, model, contents, forcar=False, ttl=None, **kwargs):
+        """
+        Equivalente a model.generate_content(contents, **kwargs), servido do cache quando possível.
+
+        Args:
+            forcar: Ignora a resposta guardada e consulta o modelo (também via CACHE_LLM_FORCAR).
+            ttl: Validade em segundos, sobrescrevendo a do cache.
+        """
+        if not forcar:
+            resposta = self.buscar(model, contents, ttl=ttl, **kwargs)
+            if resposta is not None:
+                return resposta
+
+        response = model.generate_content(contents, **kwargs)
+        texto = response.text
+        meta = {"modelo": getattr(model, "model_name", None), "armazenado_em": time.time()}
+        self._gravar(self.chave_llm(model, contents, **kwargs), meta, texto.encode("utf-8"))
+        return RespostaLLM(texto, from_cache=False)
+
+
+_cache_padrao = None
+
+
+def cache_padrao():
+    """Instância compartilhada do cache (criada no primeiro uso)."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheLLM()
+    return _cache_padrao
+
+
+def gerar(model, contents, **kwargs):
+    """Atalho para cache_padrao().gerar, no lugar de model.generate_content."""
+    return cache_padrao().gerar(model, contents, **kwargs)
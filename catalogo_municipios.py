@@ -0,0 +1,165 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import sys
+import tempfile
+import unicodedata
+from datetime import datetime
+
+import requests
+
+import cache_http
+
+logger = logging.getLogger(__name__)
+
+# O municipios_ibge.json não acompanha o repositório: sem ele, o primeiro uso do catálogo
+# consulta a API do IBGE (e falha sem rede). Gere-o com `python catalogo_municipios.py --atualizar`.
+ARQUIVO_CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "municipios_ibge.json")
+URL_MUNICIPIOS = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios"
+
+
+def normalizar(texto):
+    """Forma usada nas buscas: sem acentos, minúscula e com espaços simples ('São  Paulo' -> 'sao paulo')."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def _registro(municipio):
+    """Converte um item da API de localidades no registro do catálogo."""
+    microrregiao = municipio.get("microrregiao") or {}
+    mesorregiao = microrregiao.get("mesorregiao") or {}
+    uf = mesorregiao.get("UF") or ((municipio.get("regiao-imediata") or {}).get("regiao-intermediaria") or {}).get("UF") or {}
+    return {
+        "ibge": str(municipio["id"]),
+        "ibge6": str(municipio["id"])[:6],
+        "nome": municipio["nome"],
+        "uf": uf.get("sigla"),
+        "microrregiao": microrregiao.get("nome"),
+        "mesorregiao": mesorregiao.get("nome"),
+    }
+
+
+def baixar_catalogo(caminho=ARQUIVO_CATALOGO):
+    """Baixa todos os municípios em uma única consulta à API do IBGE e grava o catálogo."""
+    logger.info("Baixando o catálogo de municípios do IBGE...")
+    response = cache_http.get(URL_MUNICIPIOS, fonte="ibge_localidades", forcar=True)
+    response.raise_for_status()
+    municipios = sorted((_registro(m) for m in response.json()), key=lambda m: m["ibge"])
+    dados = {"atualizado_em": datetime.now().isoformat(timespec="seconds"), "municipios": municipios}
+
+    diretorio = os.path.dirname(caminho) or "."
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix=".tmp")
+    with os.fdopen(descritor, 'w', encoding='utf-8') as file:
+        json.dump(dados, file, ensure_ascii=False, indent=1)
+    os.replace(temporario, caminho)
+    logger.info(f"{len(municipios)} municípios gravados em {caminho}.")
+    return dados
+
+
+class CatalogoMunicipios:
+    """
+    Catálogo local dos municípios do IBGE (códigos de 7 e 6 dígitos, nome, UF, meso e microrregião).
+
+    Os nomes ficam em uma lista ordenada pela forma normalizada (sem acentos e
+    em minúsculas); a busca por prefixo é uma busca binária nessa lista, e as
+    consultas por código e por nome exato são dicionários. Com o arquivo gerado,
+    nenhuma consulta depende da rede; a API é usada para montá-lo (--atualizar)
+    ou, enquanto ele não existe, no primeiro uso.
+    """
+
+    def __init__(self, caminho=ARQUIVO_CATALOGO):
+        self.caminho = caminho
+        if not os.path.exists(caminho):
+            logger.warning(f"{caminho} não encontrado; montando o catálogo a partir da API do IBGE.")
+            try:
+                dados = baixar_catalogo(caminho)
+            except requests.RequestException as e:
+                raise RuntimeError(f"Catálogo de municípios indisponível: {caminho} não existe e a API do IBGE "
+                                   f"não respondeu ({e}). Gere o arquivo com `python catalogo_municipios.py --atualizar`.") from e
+        else:
+            with open(caminho, 'r', encoding='utf-8') as file:
+                dados = json.load(file)
+        self.atualizado_em = dados.get("atualizado_em")
+        self.municipios = dados["municipios"]
+        self._indexar()
+
+    def _indexar(self):
+        self._por_codigo = {}
+        self._por_uf = {}
+        self._por_nome = {}
+        for municipio in self.municipios:
+            self._por_codigo[municipio["ibge"]] = municipio
+            self._por_codigo[municipio["ibge6"]] = municipio
+            self._por_uf.setdefault(municipio["uf"], []).append(municipio)
+            self._por_nome.setdefault((municipio["uf"], normalizar(municipio["nome"])), municipio)
+        for lista in self._por_uf.values():
+            lista.sort(key=lambda m: (normalizar(m["nome"]), m["nome"]))
+        # Índice de prefixos: (nome normalizado, código) em ordem, para bisect
+        self._chaves = sorted((normalizar(m["nome"]), m["ibge"]) for m in self.municipios)
+
+    def __len__(self):
+        return len(self.municipios)
+
+    def por_codigo(self, codigo_ibge):
+        """Município pelo código IBGE com 7 ou 6 dígitos (None se não existir)."""
+        return self._por_codigo.get(str(codigo_ibge).strip())
+
+    def por_uf(self, uf):
+        """Municípios da UF em ordem alfabética."""
+        return list(self._por_uf.get(uf.upper(), []))
+
+    def por_nome(self, nome, uf):
+        """Município pelo nome exato na UF, ignorando acentos e maiúsculas (None se não existir)."""
+        return self._por_nome.get((uf.upper(), normalizar(nome)))
+
+    def buscar(self, prefixo, uf=None, limite=20):
+        """Municípios cujo nome começa com o prefixo (sem diferenciar acentos e maiúsculas)."""
+        prefixo = normalizar(prefixo)
+        inicio = bisect.bisect_left(self._chaves, (prefixo, ""))
+        resultado = []
+        for chave, codigo in self._chaves[inicio:]:
+            if not chave.startswith(prefixo):
+                break
+            municipio = self._por_codigo[codigo]
+            if uf is None or municipio["uf"] == uf.upper():
+                resultado.append(municipio)
+                if limite is not None and len(resultado) >= limite:
+                    break
+        return resultado
+
+
+_catalogo = None
+
+
+def catalogo():
+    """Instância compartilhada do catálogo (carregada no primeiro uso)."""
+    global _catalogo
+    if _catalogo is None:
+        _catalogo = CatalogoMunicipios()
+    return _catalogo
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Catálogo local de municípios do IBGE.")
+    parser.add_argument("busca", nargs="?", help="Início do nome ou código IBGE do município.")
+    parser.add_argument("--uf", help="Restringe a busca a uma UF.")
+    parser.add_argument("--atualizar", action="store_true", help="Baixa novamente o catálogo da API do IBGE.")
+    args = parser.parse_args()
+
+    if args.atualizar:
+        baixar_catalogo()
+    if args.busca:
+        cat = catalogo()
+        encontrados = [cat.por_codigo(args.busca)] if args.busca.isdigit() else cat.buscar(args.busca, uf=args.uf)
+        encontrados = [m for m in encontrados if m]
+        if not encontrados:
+            print("Nenhum município encontrado.")
+            sys.exit(1)
+        for municipio in encontrados:
+            print(f"{municipio['ibge']}  {municipio['nome']}/{municipio['uf']}  "
+                  f"({municipio['microrregiao']} - {municipio['mesorregiao']})")
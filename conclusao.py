@@ -3,6 +3,13 @@ import json
 import os
 from dotenv import load_dotenv
 import argparse
+import re
+import textwrap
+
+import cache_llm
+from catalogo_municipios import normalizar
+from executor_llm import executor_padrao
+from resumo_dados import ORCAMENTO_TOKENS, compactar_dados
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -10,17 +17,13 @@ load_dotenv()
 # Configura a chave da API do Google Generative AI
 genai.configure(api_key=os.getenv("API_KEY"))
 
-def gerar_conclusao(dados, modelo):
-    """
-    Gera a conclusão do relatório analítico do Teto MAC, de forma resumida e concisa, com base nos dados fornecidos.
+# Arquivos da pasta do município usados na conclusão
+ARQUIVOS = ['analise_mac_sia.txt', 'analise_mac_sih.txt', 'analise_mac_municipio.txt', 'analise_correlacao.json', 'dados_economicos.json']
+# Municípios procurados nos textos quando nenhum JSON informa o nome_municipio
+MUNICIPIOS_CONHECIDOS = ("Guarapari", "Ribeirão")
 
-    Args:
-        dados: Um dicionário contendo os dados para a análise.
-        modelo: O modelo de linguagem a ser utilizado (gemini-1.5-pro).
-
-    Returns:
-        Um dicionário contendo o nome do município e a conclusão gerada.
-    """
+def montar_prompt(dados, orcamento_tokens=ORCAMENTO_TOKENS):
+    """Prompt da conclusão de um município a partir dos seus dados (ver gerar_conclusao)."""
     nome_municipio = extrair_nome_municipio(dados)
 
     prompt_template = """
@@ -44,11 +47,51 @@ def gerar_conclusao(dados, modelo):
     Dados: {dados}
     """
 
-    prompt = prompt_template.format(nome_municipio=nome_municipio, dados=json.dumps(dados))
+    # Dados compactados: números arredondados e textos de análises anteriores resumidos
+    return prompt_template.format(nome_municipio=nome_municipio, dados=compactar_dados(dados, orcamento_tokens))
 
+def gerar_conclusao(dados, modelo):
+    """
+    Gera a conclusão do relatório analítico do Teto MAC, de forma resumida e concisa, com base nos dados fornecidos.
+
+    Args:
+        dados: Um dicionário contendo os dados para a análise.
+        modelo: O modelo de linguagem a ser utilizado (gemini-1.5-pro).
+
+    Returns:
+        Um dicionário contendo o nome do município e a conclusão gerada.
+    """
+    model = genai.GenerativeModel(modelo)
+    response = cache_llm.gerar(model, montar_prompt(dados))
+    return {"municipio": extrair_nome_municipio(dados), "conclusao": response.text}
+
+def gerar_conclusoes(artefatos_por_municipio, modelo):
+    """
+    Gera a conclusão de cada município com uma única chamada, todas em paralelo.
+
+    Args:
+        artefatos_por_municipio: {município: {arquivo: dados}} (ver carregar_artefatos).
+        modelo: Nome do modelo de linguagem.
+
+    Returns:
+        {município: conclusão}; municípios cuja chamada falhou ficam de fora.
+    """
     model = genai.GenerativeModel(modelo)
-    response = model.generate_content(prompt)
-    return {"municipio": nome_municipio, "conclusao": response.text}
+    municipios = list(artefatos_por_municipio)
+    chamadas = []
+    for municipio in municipios:
+        artefatos = artefatos_por_municipio[municipio]
+        dados = {"nome_municipio": municipio, **artefatos}
+        # Orçamento proporcional à quantidade de arquivos, para nenhum deles ser truncado por inteiro
+        chamadas.append((model, montar_prompt(dados, ORCAMENTO_TOKENS * max(1, len(artefatos)))))
+
+    conclusoes = {}
+    for municipio, resultado in zip(municipios, executor_padrao().executar(chamadas)):
+        if isinstance(resultado, Exception):
+            print(f"Erro ao gerar a conclusão do município {municipio}: {resultado}")
+            continue
+        conclusoes[municipio] = resultado.text
+    return conclusoes
 
 def extrair_nome_municipio(dados):
     """Extrai o nome do município dos dados fornecidos."""
@@ -64,56 +107,57 @@ def extrair_nome_municipio(dados):
         nome_municipio = "Município não identificado"
     return nome_municipio
 
-def extrair_municipios(arquivo):
+def ler_artefato(arquivo):
+    """Conteúdo do arquivo: JSON já interpretado ou {"texto": ...} para .txt (None se não existir)."""
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            if arquivo.endswith(".json"):
+                return json.load(f)
+            return {"texto": f.read()}
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Erro ao processar o arquivo {arquivo}: {e}")
+        return None
+
+def carregar_artefatos(arquivos):
     """
-    Extrai o nome do município a partir do nome do arquivo ou do seu conteúdo.
+    Lê cada arquivo uma única vez e agrupa o conteúdo por município.
 
-    Args:
-        arquivo: O caminho para o arquivo.
+    Os nomes dos municípios vêm do campo nome_municipio dos JSON (ou, sem ele,
+    de MUNICIPIOS_CONHECIDOS). Cada arquivo é normalizado uma vez (sem acentos e
+    em minúsculas) e atribuído aos municípios citados nele; nos JSON indexados
+    por código IBGE, cada município recebe apenas a própria entrada. Com um único
+    município (a pasta de um município no pipeline), os arquivos que não citam
+    nenhum nome, como o analise_correlacao.json, também são dele.
 
     Returns:
-        Uma lista de nomes de municípios encontrados.
+        {município: {arquivo: dados}}.
     """
-    municipios = []
-    nome_arquivo = os.path.basename(arquivo).lower()
-
-    # Tenta extrair o nome do município do nome do arquivo
-    if "guarapari" in nome_arquivo:
-        municipios.append("Guarapari")
-    elif "ribeirão" in nome_arquivo or "ribeirao" in nome_arquivo:
-        municipios.append("Ribeirão")
-
-    # Se não encontrar no nome do arquivo, tenta extrair do conteúdo
-    if not municipios:
-        try:
-            if arquivo.endswith(".json"):
-                with open(arquivo, 'r') as f:
-                    dados = json.load(f)
-                    for key in dados.keys():
-                        if isinstance(dados[key], dict) and 'nome_municipio' in dados[key]:
-                            municipios.append(dados[key]['nome_municipio'])
-            elif arquivo.endswith(".txt"):
-                with open(arquivo, 'r') as f:
-                    conteudo = f.read().lower()
-                    if "guarapari" in conteudo:
-                        municipios.append("Guarapari")
-                    elif "ribeirão" in conteudo or "ribeirao" in conteudo:
-                        municipios.append("Ribeirão")
-        except Exception as e:
-            print(f"Erro ao processar o arquivo {arquivo}: {e}")
-
-    return municipios
-
-def municipio_presente_nos_dados(municipio, dados):
-    """Verifica se o município está presente nos dados fornecidos."""
-    if isinstance(dados, dict):
-        return any(municipio.lower() in str(valor).lower() for valor in dados.values()) or \
-               any(municipio.lower() in str(valor).lower() for valor in dados.keys()) or \
-               (isinstance(dados, dict) and any(municipio.lower() in str(valor).lower() for valor in dados.get("texto", "").split()))
-    elif isinstance(dados, str):
-        return municipio.lower() in dados.lower()
-    else:
-        return False
+    conteudos = {arquivo: ler_artefato(arquivo) for arquivo in arquivos}
+    conteudos = {arquivo: dados for arquivo, dados in conteudos.items() if dados is not None}
+
+    # Entradas por município nos JSON indexados por código ({codigo: {"nome_municipio": ...}})
+    entradas = {}
+    for arquivo, dados in conteudos.items():
+        if isinstance(dados, dict):
+            for chave, valor in dados.items():
+                if isinstance(valor, dict) and valor.get('nome_municipio'):
+                    entradas.setdefault(arquivo, {})[valor['nome_municipio']] = {chave: valor}
+    nomes = {nome for por_nome in entradas.values() for nome in por_nome} or set(MUNICIPIOS_CONHECIDOS)
+    normalizados = {nome: normalizar(nome) for nome in nomes}
+
+    artefatos = {}
+    for arquivo, dados in conteudos.items():
+        if arquivo in entradas:
+            for nome, entrada in entradas[arquivo].items():
+                artefatos.setdefault(nome, {})[arquivo] = entrada
+            continue
+        texto = normalizar(os.path.basename(arquivo) + " " + json.dumps(dados, ensure_ascii=False))
+        citados = [nome for nome, normalizado in normalizados.items() if normalizado in texto]
+        if not citados and len(nomes) == 1:
+            citados = list(nomes)
+        for nome in citados:
+            artefatos.setdefault(nome, {})[arquivo] = dados
+    return artefatos
 
 def gerar_conclusao_final(conclusoes):
     """
@@ -125,7 +169,7 @@ def gerar_conclusao_final(conclusoes):
     Returns:
         Um texto consolidado e humanizado.
     """
-    texto_final = """
+    introducao = """
     ## Conclusão Final: A Necessidade de Revisão do Teto MAC
 
     As análises realizadas para os municípios demonstram, de forma clara e consistente, que o atual valor do Teto Financeiro da Média e Alta Complexidade (MAC) não atende às demandas do sistema de saúde. Os dados evidenciam que:
@@ -133,51 +177,34 @@ def gerar_conclusao_final(conclusoes):
     * O valor do Teto MAC não acompanhou a inflação ao longo dos anos, resultando em uma redução significativa do seu poder de compra. Isso impacta diretamente a capacidade de aquisição de insumos, medicamentos e a manutenção da infraestrutura necessária para o atendimento à população.
     * Há um aumento expressivo na demanda por procedimentos de média e alta complexidade, especialmente em municípios com crescimento populacional acelerado ou com perfil epidemiológico mais complexo. Essa demanda não é acompanhada por um reajuste proporcional no teto financeiro.
     * A sustentabilidade financeira dos serviços de saúde está comprometida. Sem um reajuste adequado, os municípios enfrentam dificuldades para manter a qualidade do atendimento, o que pode levar ao desabastecimento de medicamentos, à redução de leitos hospitalares e ao aumento das filas de espera.
+    """
 
+    consideracoes = """
     **Considerações Finais:**
     Diante dos fatos apresentados, é imperativo que o Teto MAC seja revisado. A manutenção do valor atual coloca em risco a capacidade dos municípios de oferecer serviços de saúde de qualidade à população. Uma revisão justa e adequada não apenas garantiria a sustentabilidade do sistema, mas também asseguraria que os recursos financeiros estejam alinhados com as reais necessidades da população.
 
     A saúde é um direito fundamental, e o Teto MAC é um instrumento essencial para garantir que esse direito seja efetivado. Portanto, a revisão do teto não é apenas uma necessidade técnica, mas uma obrigação ética e social.
     """
-    return texto_final
+
+    # Conclusões de cada município entre a introdução e as considerações finais
+    partes = [textwrap.dedent(introducao)]
+    for municipio, conclusao in conclusoes.items():
+        # O título da resposta do modelo ("# Conclusão") dá lugar ao nome do município
+        conclusao = re.sub(r"^#+ [^\n]*\n", "", conclusao.strip()).strip()
+        partes.append(f"### {municipio}\n\n{conclusao}\n")
+    partes.append(textwrap.dedent(consideracoes))
+    return "\n".join(partes)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Gera conclusões para relatórios do Teto MAC.")
     parser.add_argument("-o", "--output", default="conclusao_final.txt", help="Nome do arquivo de saída (padrão: conclusao_final.txt)")
     args = parser.parse_args()
 
-    # Lista de arquivos para processar
-    arquivos = ['analise_mac_sia.txt', 'analise_mac_sih.txt', 'analise_mac_municipio.txt', 'analise_correlacao.json', 'dados_economicos.json']
-
-    # Dicionário para armazenar as conclusões
-    conclusoes = {}
+    # Cada arquivo é lido uma vez e o conteúdo é agrupado por município
+    artefatos_por_municipio = carregar_artefatos(ARQUIVOS)
 
-    # Identificar os municípios
-    municipios_encontrados = set()
-    for arquivo in arquivos:
-        municipios_encontrados.update(extrair_municipios(arquivo))
-
-    # Gerar conclusões para cada município e arquivo
-    for municipio in municipios_encontrados:
-        for arquivo in arquivos:
-            try:
-                if arquivo.endswith(".json"):
-                    with open(arquivo, 'r') as f:
-                        dados = json.load(f)
-                elif arquivo.endswith(".txt"):
-                    with open(arquivo, 'r') as f:
-                        dados = {"texto": f.read(), "nome_municipio": municipio}
-                else:
-                    continue
-
-                # Verifica se o município está presente nos dados
-                if municipio_presente_nos_dados(municipio, dados):
-                    resultado = gerar_conclusao(dados, 'gemini-1.5-flash')
-                    if municipio not in conclusoes:
-                        conclusoes[municipio] = ""
-                    conclusoes[municipio] += f"\n\n---\n\n**Arquivo:** {arquivo}\n\n" + resultado["conclusao"]
-            except Exception as e:
-                print(f"Erro ao processar o arquivo {arquivo} para o município {municipio}: {e}")
+    # Uma conclusão por município, com todos os seus arquivos, geradas em paralelo
+    conclusoes = gerar_conclusoes(artefatos_por_municipio, 'gemini-1.5-flash')
 
     # Gera a conclusão final
     texto_final = gerar_conclusao_final(conclusoes)
@@ -1,4 +1,3 @@
-import requests
 import sys
 import time
 import pandas as pd
@@ -11,6 +10,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 
+from catalogo_municipios import catalogo
+from extracao_tabela import celulas_das_linhas, extrair_tabela_driver
+from sismac import SismacClient
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -23,18 +26,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def obter_nome_municipio(codigo_ibge):
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{codigo_ibge}"
-    response = requests.get(url)
-        
-    if response.status_code == 200:
-        dados = response.json()
-        nome_municipio = dados['nome']
-        uf = dados['microrregiao']['mesorregiao']['UF']['sigla']
-        return f"{nome_municipio}/{uf}"
+    municipio = catalogo().por_codigo(codigo_ibge)
+
+    if municipio is not None:
+        return f"{municipio['nome']}/{municipio['uf']}"
     else:
         logger.error("Código IBGE não encontrado.")
         return "Código IBGE não encontrado"
 
+URL_EVOLUCAO_TETO = "https://sismac.saude.gov.br/teto_financeiro_anual"
+
+HEADERS = [
+    'Referência',
+    'Sem Incentivos',
+    'Incentivos',
+    'Teto Financeiro MAC'
+]
+
+def save_to_json(data, headers):
+    df = pd.DataFrame(data, columns=headers)
+    logger.info("DataFrame created:")
+    logger.info(df)
+
+    # Reformatar os dados para o formato desejado
+    reformatted_data = []
+    for category in headers[1:]:
+        category_data = {category: {}}
+        for index, row in df.iterrows():
+            year = row['Referência']
+            value = row[category].replace(".", "").replace(",", ".")
+            category_data[category][year] = value
+        reformatted_data.append(category_data)
+
+    # Salvar dados reformados em JSON
+    with open('evolucao_mac.json', 'w', encoding='utf-8') as file:
+        json.dump(reformatted_data, file, ensure_ascii=False, indent=4)
+    logger.info("Data saved to evolucao_mac.json")
+
 def setup_driver():
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')  # Run in headless mode (no browser window)
@@ -49,7 +77,7 @@ def main(municipio):
     driver = setup_driver()
     wait = WebDriverWait(driver, 30)  # Increased timeout to 30 seconds
     try:
-        driver.get("https://sismac.saude.gov.br/teto_financeiro_anual")
+        driver.get(URL_EVOLUCAO_TETO)
         logger.info('Baixando Evolução do Teto MAC...')
         # Esperar até que o link "Município" esteja clicável
         logger.info("Waiting for 'Município' link...")
@@ -89,24 +117,19 @@ def main(municipio):
             logger.info(f"Found {len(rows)} rows.")
 
         # Ajustar cabeçalhos para corresponder aos dados desejados
-        headers = [
-            'Referência', 
-            'Sem Incentivos', 
-            'Incentivos', 
-            'Teto Financeiro MAC'
-        ]
+        headers = HEADERS
         logger.debug("Adjusted headers: %s", headers)
 
         # Extrair dados da tabela
         data = []
         try:
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
+            tabela = extrair_tabela_driver(driver, "//tbody[@id='tabelaConsolidadaEvolucaoTetoMAC_data']")
+            for cols in celulas_das_linhas(tabela, apenas_data_ri=True):
                 row_data = [
-                    cols[0].text,  # Referência
-                    cols[1].text,  # Sem Incentivos
-                    cols[4].text,  # Incentivos
-                    cols[7].text   # Teto Financeiro MAC
+                    cols[0],  # Referência
+                    cols[1],  # Sem Incentivos
+                    cols[4],  # Incentivos
+                    cols[7]   # Teto Financeiro MAC
                 ]
                 data.append(row_data)
             logger.info("Table data extracted.")
@@ -119,24 +142,7 @@ def main(municipio):
 
         # Criar DataFrame do Pandas
         if headers and data:
-            df = pd.DataFrame(data, columns=headers)
-            logger.info("DataFrame created:")
-            logger.info(df)
-
-            # Reformatar os dados para o formato desejado
-            reformatted_data = []
-            for category in headers[1:]:
-                category_data = {category: {}}
-                for index, row in df.iterrows():
-                    year = row['Referência']
-                    value = row[category].replace(".", "").replace(",", ".")
-                    category_data[category][year] = value
-                reformatted_data.append(category_data)
-
-            # Salvar dados reformados em JSON
-            with open('evolucao_mac.json', 'w', encoding='utf-8') as file:
-                json.dump(reformatted_data, file, ensure_ascii=False, indent=4)
-            logger.info("Data saved to evolucao_mac.json")
+            save_to_json(data, headers)
         else:
             logger.warning("No data extracted to create DataFrame.")
 
@@ -146,10 +152,30 @@ def main(municipio):
     finally:
         driver.quit()
 
+def main_http(municipio):
+    """Mesmo resultado do main(), via requisições AJAX do PrimeFaces, sem navegador e sem esperas fixas."""
+    logger.info('Baixando Evolução do Teto MAC via HTTP...')
+    client = SismacClient(URL_EVOLUCAO_TETO).carregar()
+    client.acionar_link("Município")
+    client.selecionar_autocomplete("filtroPesquisaMunicipio", municipio)
+    linhas = client.linhas("tabelaConsolidadaEvolucaoTetoMAC", tamanho_pagina=80)
+    data = [[cols[0], cols[1], cols[4], cols[7]] for cols in linhas if len(cols) >= 8]
+    if not data:
+        raise RuntimeError(f"Nenhuma linha retornada para {municipio}.")
+    logger.info(f"Found {len(data)} rows.")
+    save_to_json(data, HEADERS)
+
 if __name__ == "__main__":
     municipio_ibge = sys.argv[1]
     municipio = obter_nome_municipio(municipio_ibge)
     if municipio != "Código IBGE não encontrado":
-        main(municipio)
+        if "--selenium" in sys.argv:
+            main(municipio)
+        else:
+            try:
+                main_http(municipio)
+            except Exception as e:
+                logger.error(f"Falha no acesso HTTP ao SISMAC ({e}). Usando o navegador...")
+                main(municipio)
     else:
         logger.error("Código IBGE não encontrado.")
\ No newline at end of file
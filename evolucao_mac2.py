@@ -1,4 +1,3 @@
-import requests
 import sys
 import time
 import json
@@ -11,6 +10,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, StaleElementReferenceException
 from datetime import datetime
 
+from catalogo_municipios import catalogo
+from extracao_tabela import celulas_das_linhas, extrair_tabela_driver, extrair_tabela_html
+from sismac import SismacClient
+
 # Configuração básica do logger
 logging.basicConfig(
     level=logging.INFO,
@@ -30,18 +33,59 @@ category_mapping = {
 }
 
 def obter_nome_municipio(codigo_ibge):
-    url = f"https://servicodados.ibge.gov.br/api/v1/localidades/municipios/{codigo_ibge}"
-    response = requests.get(url)
-        
-    if response.status_code == 200:
-        dados = response.json()
-        nome_municipio = dados['nome']
-        uf = dados['microrregiao']['mesorregiao']['UF']['sigla']
-        return f"{nome_municipio}/{uf}"
+    municipio = catalogo().por_codigo(codigo_ibge)
+
+    if municipio is not None:
+        return f"{municipio['nome']}/{municipio['uf']}"
     else:
         logger.error("Código IBGE não encontrado.")
         return "Código IBGE não encontrado"
 
+URL_TETO_DETALHADO = "https://sismac.saude.gov.br/teto_financeiro_detalhado"
+
+def ler_categorias(rows):
+    """Lê as linhas (Categoria, Valor) da tabela do teto detalhado."""
+    data = {}
+    for cols in rows:
+        if len(cols) == 2:  # Verificar se a linha tem duas colunas
+            categoria_raw = cols[0]  # Categoria (Sem Incentivos, Incentivos, Teto MAC)
+            valor_texto = cols[1].replace(".", "").replace(",", ".")  # Valor
+            if valor_texto:  # Ignorar valores vazios
+                try:
+                    valor = float(valor_texto)
+                    # Mapear a categoria caso necessário
+                    categoria = category_mapping.get(categoria_raw, categoria_raw)
+                    data[categoria] = valor
+                except ValueError:
+                    logger.warning(f"Valor inválido para {categoria_raw}: '{valor_texto}'")
+    return data
+
+def atualizar_json(data):
+    # Carregar o JSON existente
+    try:
+        with open('evolucao_mac.json', 'r', encoding='utf-8') as file:
+            json_data = json.load(file)
+    except FileNotFoundError:
+        logger.error("Arquivo evolucao_mac.json não encontrado.")
+        return
+
+    # Obter o ano atual
+    ano_atual = str(datetime.now().year)
+
+    # Atualizar o JSON com os novos dados
+    for categoria_json in json_data:
+        chave_categoria = list(categoria_json.keys())[0]  # Extrair a chave da categoria
+        if chave_categoria in data:
+            categoria_json[chave_categoria][ano_atual] = str(data[chave_categoria])
+            logger.info(f"Adicionado {ano_atual} para {chave_categoria}: {data[chave_categoria]}")
+        else:
+            logger.warning(f"Categoria '{chave_categoria}' não encontrada nos dados extraídos.")
+
+    # Salvar o JSON atualizado
+    with open('evolucao_mac.json', 'w', encoding='utf-8') as file:
+        json.dump(json_data, file, ensure_ascii=False, indent=4)
+    logger.info("JSON atualizado e salvo com sucesso.")
+
 def setup_driver():
     options = webdriver.ChromeOptions()
     options.add_argument('--headless')  # Run in headless mode (no browser window)
@@ -56,7 +100,7 @@ def main(municipio):
     driver = setup_driver()
     wait = WebDriverWait(driver, 30)
     try:
-        driver.get("https://sismac.saude.gov.br/teto_financeiro_detalhado")
+        driver.get(URL_TETO_DETALHADO)
         logger.info('Baixando Evolução do Teto MAC...')
 
         # Esperar até que o link "Município" esteja clicável
@@ -86,8 +130,8 @@ def main(municipio):
         data = {}
         try:
             # Localizar a tabela
-            table = driver.find_element(By.CSS_SELECTOR, "table[role='grid']")
-            rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
+            tabela = extrair_tabela_driver(driver, "(//table[@role='grid'])[1]")
+            rows = celulas_das_linhas(tabela)
 
             if not rows:
                 logger.warning("No rows found in the table.")
@@ -96,48 +140,13 @@ def main(municipio):
                 logger.info(f"Found {len(rows)} rows.")
 
             # Extrair os dados de cada linha
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
-                if len(cols) == 2:  # Verificar se a linha tem duas colunas
-                    categoria_raw = cols[0].text.strip()  # Categoria (Sem Incentivos, Incentivos, Teto MAC)
-                    valor_texto = cols[1].text.strip().replace(".", "").replace(",", ".")  # Valor
-                    if valor_texto:  # Ignorar valores vazios
-                        try:
-                            valor = float(valor_texto)
-                            # Mapear a categoria caso necessário
-                            categoria = category_mapping.get(categoria_raw, categoria_raw)
-                            data[categoria] = valor
-                        except ValueError:
-                            logger.warning(f"Valor inválido para {categoria_raw}: '{valor_texto}'")
+            data = ler_categorias(rows)
             logger.info("Table data extracted.")
         except Exception as e:
             logger.error(f"Erro ao extrair dados da tabela: {e}")
             return
 
-        # Carregar o JSON existente
-        try:
-            with open('evolucao_mac.json', 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
-        except FileNotFoundError:
-            logger.error("Arquivo evolucao_mac.json não encontrado.")
-            return
-
-        # Obter o ano atual
-        ano_atual = str(datetime.now().year)
-
-        # Atualizar o JSON com os novos dados
-        for categoria_json in json_data:
-            chave_categoria = list(categoria_json.keys())[0]  # Extrair a chave da categoria
-            if chave_categoria in data:
-                categoria_json[chave_categoria][ano_atual] = str(data[chave_categoria])
-                logger.info(f"Adicionado {ano_atual} para {chave_categoria}: {data[chave_categoria]}")
-            else:
-                logger.warning(f"Categoria '{chave_categoria}' não encontrada nos dados extraídos.")
-
-        # Salvar o JSON atualizado
-        with open('evolucao_mac.json', 'w', encoding='utf-8') as file:
-            json.dump(json_data, file, ensure_ascii=False, indent=4)
-        logger.info("JSON atualizado e salvo com sucesso.")
+        atualizar_json(data)
 
     except (TimeoutException, StaleElementReferenceException) as e:
         logger.error(f"An error occurred: {e}")
@@ -145,14 +154,36 @@ def main(municipio):
     finally:
         driver.quit()
 
+def main_http(municipio):
+    """Mesmo resultado do main(), via requisições AJAX do PrimeFaces, sem navegador e sem esperas fixas."""
+    logger.info('Baixando Teto MAC detalhado via HTTP...')
+    client = SismacClient(URL_TETO_DETALHADO).carregar()
+    client.acionar_link("Município")
+    atualizacoes = client.selecionar_autocomplete("filtroPesquisaMunicipio", municipio)
+    for conteudo in atualizacoes.values():
+        tabela = extrair_tabela_html(conteudo, atributos={"role": "grid"})
+        if tabela and tabela["linhas"]:
+            data = ler_categorias(celulas_das_linhas(tabela))
+            if data:
+                atualizar_json(data)
+                return
+    raise RuntimeError(f"Tabela do teto detalhado não encontrada para {municipio}.")
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        logger.error("Uso: python script.py <código_IBGE>")
+    if len(sys.argv) < 2:
+        logger.error("Uso: python script.py <código_IBGE> [--selenium]")
         sys.exit(1)
 
     municipio_ibge = sys.argv[1]
     municipio = obter_nome_municipio(municipio_ibge)
     if municipio != "Código IBGE não encontrado":
-        main(municipio)
+        if "--selenium" in sys.argv:
+            main(municipio)
+        else:
+            try:
+                main_http(municipio)
+            except Exception as e:
+                logger.error(f"Falha no acesso HTTP ao SISMAC ({e}). Usando o navegador...")
+                main(municipio)
     else:
         logger.error("Código IBGE não encontrado.")
\ No newline at end of file
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+
+import cache_llm
+
+logger = logging.getLogger(__name__)
+
+# Cota do Gemini por processo (requisições e tokens de entrada por minuto)
+LIMITE_RPM = int(os.environ.get("GEMINI_RPM", 15))
+LIMITE_TPM = int(os.environ.get("GEMINI_TPM", 1_000_000))
+CONCORRENCIA_LLM = int(os.environ.get("GEMINI_CONCORRENCIA", 8))
+TENTATIVAS_LLM = 5
+ESPERA_BASE = 2     # segundos; dobra a cada tentativa
+ESPERA_MAXIMA = 90
+TOKENS_POR_IMAGEM = 258
+CODIGOS_RETENTAVEIS = (408, 429, 500, 502, 503, 504)
+
+
+class BaldeTokens:
+    """Balde de tokens assíncrono: até `capacidade` unidades, repostas a `capacidade` por minuto."""
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self.disponivel = float(capacidade)
+        self.por_segundo = capacidade / 60
+        self.atualizado = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self.atualizado) * self.por_segundo)
+        self.atualizado = agora
+
+    async def adquirir(self, quantidade=1):
+        # Pedidos maiores que o balde esperam o balde cheio, em vez de travar para sempre
+        quantidade = min(quantidade, self.capacidade)
+        # O saldo vale para o processo todo; o lock é recriado a cada asyncio.run
+        if self._loop is not asyncio.get_running_loop():
+            self._loop = asyncio.get_running_loop()
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._repor()
+                if self.disponivel >= quantidade:
+                    self.disponivel -= quantidade
+                    return
+                await asyncio.sleep((quantidade - self.disponivel) / self.por_segundo)
+
+    def esvaziar(self):
+        """Zera o balde (após um 429, a cota do servidor já está esgotada)."""
+        self._repor()
+        self.disponivel = 0.0
+
+
+def estimar_tokens(contents):
+    """Estimativa dos tokens de entrada (~4 caracteres por token; imagens têm custo fixo)."""
+    if isinstance(contents, str):
+        return len(contents) // 4 + 1
+    if isinstance(contents, dict):
+        return TOKENS_POR_IMAGEM if "data" in contents else estimar_tokens(str(contents))
+    if isinstance(contents, (list, tuple)):
+        return sum(estimar_tokens(item) for item in contents)
+    return estimar_tokens(str(contents))
+
+
+def _codigo(erro):
+    codigo = getattr(erro, "code", None)
+    if isinstance(codigo, int):
+        return codigo
+    encontrado = re.match(r"\s*(\d{3})\b", str(erro))
+    return int(encontrado.group(1)) if encontrado else None
+
+
+def _espera_sugerida(erro):
+    """Segundos pedidos pelo servidor (Retry-After ou retry_delay da API), se houver."""
+    resposta = getattr(erro, "response", None)
+    cabecalho = getattr(resposta, "headers", None) or {}
+    valor = cabecalho.get("Retry-After") if hasattr(cabecalho, "get") else None
+    if valor and str(valor).replace(".", "", 1).isdigit():
+        return float(valor)
+    encontrado = re.search(r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)", str(erro), re.IGNORECASE)
+    if encontrado:
+        return float(encontrado.group(1) or encontrado.group(2))
+    return None
+
+
+class ExecutorLLM:
+    """
+    Executa chamadas ao Gemini em paralelo dentro da cota.
+
+    Cada chamada passa por dois baldes de tokens (requisições por minuto e
+    tokens de entrada por minuto) e por um limite de chamadas simultâneas.
+    Erros 429/5xx são repetidos com espera exponencial com jitter, respeitando
+    o tempo pedido pelo servidor (Retry-After). Respostas já guardadas no
+    cache_llm não consomem cota.
+    """
+
+    def __init__(self, rpm=LIMITE_RPM, tpm=LIMITE_TPM, concorrencia=CONCORRENCIA_LLM,
+                 tentativas=TENTATIVAS_LLM, cache=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concorrencia = concorrencia
+        self.tentativas = tentativas
+        self.cache = cache or cache_llm.cache_padrao()
+        self.requisicoes = BaldeTokens(rpm)
+        self.tokens = BaldeTokens(tpm)
+
+    async def _chamar(self, model, contents, forcar, limite, **kwargs):
+        if not forcar:
+            resposta = self.cache.buscar(model, contents, **kwargs)
+            if resposta is not None:
+                return resposta
+
+        for tentativa in range(1, self.tentativas + 1):
+            await self.requisicoes.adquirir()
+            await self.tokens.adquirir(estimar_tokens(contents))
+            try:
+                async with limite:
+                    return await asyncio.to_thread(self.cache.gerar, model, contents, forcar=True, **kwargs)
+            except Exception as e:
+                codigo = _codigo(e)
+                if codigo not in CODIGOS_RETENTAVEIS or tentativa == self.tentativas:
+                    raise
+                if codigo == 429:
+                    self.requisicoes.esvaziar()
+                espera = _espera_sugerida(e)
+                if espera is None:
+                    espera = random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+                logger.warning(f"Gemini respondeu {codigo} (tentativa {tentativa}/{self.tentativas}); "
+                               f"nova tentativa em {espera:.1f} s.")
+                await asyncio.sleep(espera)
+
+    async def _executar(self, chamadas):
+        limite = asyncio.Semaphore(self.concorrencia)
+        tarefas = [
+            self._chamar(model, contents, forcar, limite, **kwargs)
+            for model, contents, forcar, kwargs in chamadas
+        ]
+        return await asyncio.gather(*tarefas, return_exceptions=True)
+
+    def executar(self, chamadas):
+        """
+        Executa as chamadas e devolve os resultados na mesma ordem.
+
+        Args:
+            chamadas: Lista de (model, contents) ou (model, contents, {"forcar": ..., **kwargs}).
+
+        Returns:
+            Lista com um cache_llm.RespostaLLM por chamada, ou a exceção da chamada que falhou.
+        """
+        normalizadas = []
+        for chamada in chamadas:
+            model, contents, *extra = chamada
+            kwargs = dict(extra[0]) if extra else {}
+            normalizadas.append((model, contents, kwargs.pop("forcar", False), kwargs))
+        inicio = time.monotonic()
+        resultados = asyncio.run(self._executar(normalizadas))
+        logger.info(f"{len(chamadas)} chamadas ao Gemini concluídas em {time.monotonic() - inicio:.1f} s.")
+        return resultados
+
+
+_executor_padrao = None
+
+
+def executor_padrao():
+    """Executor compartilhado pelo processo (a cota é única para todas as chamadas)."""
+    global _executor_padrao
+    if _executor_padrao is None:
+        _executor_padrao = ExecutorLLM()
+    return _executor_padrao
+
+
+def gerar_varios(model, lista_contents, **kwargs):
+    """Atalho: o mesmo modelo para vários prompts, com o executor padrão."""
+    return executor_padrao().executar([(model, contents, kwargs) for contents in lista_contents])
@@ -0,0 +1,178 @@
+import json
+import logging
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# Estrutura comum de tabela usada pelos scrapers:
+# {
+#     "cabecalhos": [[texto, ...], ...],          # uma lista por linha do thead
+#     "linhas": [{"secao": "tbody" | "tfoot",
+#                 "classe": "...",
+#                 "data_ri": "..." ou None,
+#                 "celulas": [texto, ...]}, ...]
+# }
+
+
+class _ParserTabela(HTMLParser):
+    """Lê o HTML e monta a estrutura comum de uma tabela (ou de linhas soltas)."""
+
+    def __init__(self, filtro=None):
+        super().__init__(convert_charrefs=True)
+        self.filtro = filtro
+        # Sem filtro o parser aceita fragmentos com apenas <tr> (ex.: respostas AJAX)
+        self.tabela = None if filtro else {"cabecalhos": [], "linhas": []}
+        self.nivel_base = 1 if filtro else 0
+        self.profundidade = 0
+        self.concluida = False
+        self.secao = "tbody"
+        self.linha = None
+        self.celula = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "table":
+            if self.tabela is None and self.filtro(attrs):
+                self.tabela = {"cabecalhos": [], "linhas": []}
+            if self.tabela is not None and not self.concluida:
+                self.profundidade += 1
+            return
+        if not self._dentro():
+            return
+        if tag in ("thead", "tbody", "tfoot"):
+            self.secao = tag
+        elif tag == "tr":
+            self.linha = {
+                "secao": self.secao,
+                "classe": attrs.get("class") or "",
+                "data_ri": attrs.get("data-ri"),
+                "celulas": [],
+            }
+        elif tag in ("td", "th") and self.linha is not None:
+            self.celula = []
+        elif tag == "br" and self.celula is not None:
+            self.celula.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "table":
+            if self.tabela is not None and not self.concluida and self.profundidade:
+                self.profundidade -= 1
+                if self.filtro and self.profundidade == 0:
+                    self.concluida = True
+            return
+        if not self._dentro():
+            return
+        if tag in ("td", "th") and self.celula is not None:
+            self._fechar_celula()
+        elif tag == "tr" and self.linha is not None:
+            self._fechar_linha()
+        elif tag in ("thead", "tfoot"):
+            self.secao = "tbody"
+
+    def handle_data(self, data):
+        if self.celula is not None and self._dentro():
+            self.celula.append(data)
+
+    def _dentro(self):
+        return self.tabela is not None and not self.concluida and self.profundidade == self.nivel_base
+
+    def _fechar_celula(self):
+        self.linha["celulas"].append(" ".join("".join(self.celula).split()))
+        self.celula = None
+
+    def _fechar_linha(self):
+        if self.celula is not None:
+            self._fechar_celula()
+        if self.linha["secao"] == "thead":
+            self.tabela["cabecalhos"].append(self.linha["celulas"])
+        else:
+            self.tabela["linhas"].append(self.linha)
+        self.linha = None
+
+
+def extrair_tabela_html(html, classe=None, id_tabela=None, atributos=None):
+    """Extrai a primeira tabela do HTML com a classe, o id ou os atributos informados."""
+    def filtro(attrs):
+        if id_tabela is not None and attrs.get("id") != id_tabela:
+            return False
+        if classe is not None and classe not in (attrs.get("class") or "").split():
+            return False
+        if atributos and any(attrs.get(nome) != valor for nome, valor in atributos.items()):
+            return False
+        return True
+
+    parser = _ParserTabela(filtro)
+    parser.feed(html)
+    parser.close()
+    if parser.tabela is None:
+        logger.warning("Tabela não encontrada no HTML.")
+    return parser.tabela
+
+
+def extrair_linhas_html(fragmento):
+    """Extrai as linhas de um fragmento HTML que contém apenas <tr> (sem <table>)."""
+    parser = _ParserTabela()
+    parser.feed(fragmento)
+    parser.close()
+    return parser.tabela["linhas"]
+
+
+# Serializa a tabela inteira no navegador e devolve tudo em uma única chamada
+# ao WebDriver, em vez de um find_elements por linha e um .text por célula.
+_SCRIPT_EXTRAIR_TABELA = """
+var no = document.evaluate(arguments[0], document, null,
+    XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!no) { return null; }
+var tabela = no.tagName === 'TABLE' ? no : no.closest('table');
+var linhas = no.tagName === 'TABLE' ? no.rows : no.getElementsByTagName('tr');
+var resultado = {cabecalhos: [], linhas: []};
+if (no.tagName !== 'TABLE' && tabela && tabela.tHead) {
+    for (var h = 0; h < tabela.tHead.rows.length; h++) {
+        resultado.cabecalhos.push(Array.prototype.map.call(
+            tabela.tHead.rows[h].cells, function (c) { return c.innerText.trim(); }));
+    }
+}
+for (var i = 0; i < linhas.length; i++) {
+    var tr = linhas[i];
+    if (tr.closest('table') !== tabela) { continue; }
+    var celulas = Array.prototype.map.call(tr.cells, function (c) { return c.innerText.trim(); });
+    var secao = tr.parentNode.tagName.toLowerCase();
+    if (secao === 'thead') {
+        resultado.cabecalhos.push(celulas);
+    } else {
+        resultado.linhas.push({
+            secao: secao === 'tfoot' ? 'tfoot' : 'tbody',
+            classe: tr.className || '',
+            data_ri: tr.getAttribute('data-ri'),
+            celulas: celulas
+        });
+    }
+}
+return JSON.stringify(resultado);
+"""
+
+
+def extrair_tabela_driver(driver, xpath):
+    """
+    Extrai uma tabela (ou um tbody) do navegador com um único execute_script.
+
+    Retorna a mesma estrutura de extrair_tabela_html; o mapeamento de
+    cabeçalhos e a filtragem das linhas ficam por conta do chamador, em Python.
+    """
+    bruto = driver.execute_script(_SCRIPT_EXTRAIR_TABELA, xpath)
+    if bruto is None:
+        logger.warning(f"Tabela não encontrada: {xpath}")
+        return {"cabecalhos": [], "linhas": []}
+    tabela = json.loads(bruto)
+    logger.info(f"{len(tabela['linhas'])} linhas extraídas de {xpath}.")
+    return tabela
+
+
+def celulas_das_linhas(tabela, num_colunas=None, apenas_data_ri=False):
+    """Lista de células por linha, opcionalmente só linhas com o número de colunas ou com data-ri."""
+    return [
+        linha["celulas"]
+        for linha in tabela["linhas"]
+        if (num_colunas is None or len(linha["celulas"]) == num_colunas)
+        and (not apenas_data_ri or linha["data_ri"] is not None)
+    ]
@@ -0,0 +1,79 @@
+import re
+import unicodedata
+
+# Palavras por shingle e similaridade de Jaccard a partir da qual duas frases são consideradas repetidas
+TAMANHO_SHINGLE = 3
+LIMIAR_SIMILARIDADE = 0.8
+
+
+def normalizar_frase(frase):
+    """Forma comparável da frase: sem acentos, pontuação e marcações, em minúsculas e com espaços simples."""
+    decomposta = unicodedata.normalize("NFKD", frase or "")
+    sem_acentos = "".join(c for c in decomposta if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", sem_acentos.casefold()).split())
+
+
+class IndiceFrases:
+    """
+    Índice das frases já usadas em um texto, para remover repetições.
+
+    As frases entram normalizadas em um conjunto (repetição exata em O(1)) e
+    como shingles de palavras em um índice invertido: uma frase nova só é
+    comparada com as frases que têm algum shingle em comum, e é tida como
+    repetida quando a similaridade de Jaccard chega ao limiar. O custo de cada
+    consulta depende do tamanho da frase, e não do texto acumulado.
+    """
+
+    def __init__(self, limiar=LIMIAR_SIMILARIDADE, tamanho_shingle=TAMANHO_SHINGLE):
+        self.limiar = limiar
+        self.tamanho_shingle = tamanho_shingle
+        self._frases = set()
+        self._tamanhos = []       # quantidade de shingles de cada frase, pelo id
+        self._por_shingle = {}    # shingle -> ids das frases que o contêm
+
+    def __len__(self):
+        return len(self._tamanhos)
+
+    def __contains__(self, frase):
+        return normalizar_frase(frase) in self._frases
+
+    def _shingles(self, normalizada):
+        palavras = normalizada.split()
+        n = self.tamanho_shingle
+        if len(palavras) <= n:
+            return {tuple(palavras)}
+        return {tuple(palavras[i:i + n]) for i in range(len(palavras) - n + 1)}
+
+    def _repetida(self, normalizada, shingles):
+        if normalizada in self._frases:
+            return True
+        if self.limiar >= 1:
+            return False
+        comuns = {}
+        for shingle in shingles:
+            for identificador in self._por_shingle.get(shingle, ()):
+                comuns[identificador] = comuns.get(identificador, 0) + 1
+        return any(
+            quantidade / (len(shingles) + self._tamanhos[identificador] - quantidade) >= self.limiar
+            for identificador, quantidade in comuns.items()
+        )
+
+    def repetida(self, frase):
+        """Indica se a frase (ou uma quase igual) já está no índice; frases vazias contam como repetidas."""
+        normalizada = normalizar_frase(frase)
+        return not normalizada or self._repetida(normalizada, self._shingles(normalizada))
+
+    def adicionar(self, frase):
+        """Adiciona a frase se for nova; retorna False se ela já estava (ou é quase igual a uma que estava)."""
+        normalizada = normalizar_frase(frase)
+        if not normalizada:
+            return False
+        shingles = self._shingles(normalizada)
+        if self._repetida(normalizada, shingles):
+            return False
+        identificador = len(self._tamanhos)
+        self._frases.add(normalizada)
+        self._tamanhos.append(len(shingles))
+        for shingle in shingles:
+            self._por_shingle.setdefault(shingle, []).append(identificador)
+        return True
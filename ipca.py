@@ -0,0 +1,197 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import date, datetime
+
+import numpy as np
+
+import cache_http
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_IPCA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ipca_mensal.json")
+URL_IPCA = ("https://api.bcb.gov.br/dados/serie/bcdata.sgs.433/dados"
+            "?formato=json&dataInicial={inicio}&dataFinal={fim}")
+# Primeiro mês guardado (o Plano Real começa em 07/1994)
+INICIO_SERIE = "1995-01"
+# Intervalo mínimo entre consultas ao BCB quando a série já está no último mês esperado
+INTERVALO_VERIFICACAO = 24 * 3600
+
+
+def _mes_anterior(hoje=None):
+    hoje = hoje or date.today()
+    return f"{hoje.year - 1}-12" if hoje.month == 1 else f"{hoje.year}-{hoje.month - 1:02d}"
+
+
+def _proximo_mes(mes):
+    ano, numero = int(mes[:4]), int(mes[5:])
+    return f"{ano + 1}-01" if numero == 12 else f"{ano}-{numero + 1:02d}"
+
+
+class SerieIPCA:
+    """
+    Série mensal do IPCA (SGS 433, variação % no mês) guardada em JSON.
+
+    Cada sincronização consulta o BCB apenas a partir do primeiro mês que
+    ainda não está no arquivo. Sobre a série, monta o número-índice mensal
+    e o nível de preços anual usados para deflacionar valores nominais.
+    """
+
+    def __init__(self, caminho=ARQUIVO_IPCA):
+        self.caminho = caminho
+        self.dados = {"serie": 433, "atualizado_em": None, "verificado_em": 0, "valores": {}}
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as file:
+                self.dados = json.load(file)
+
+    @property
+    def ultimo_mes(self):
+        return max(self.dados["valores"], default=None)
+
+    def sincronizar(self, forcar=False):
+        """Busca no BCB os meses que faltam; retorna a quantidade de meses novos."""
+        ultimo = self.ultimo_mes
+        recente = time.time() - self.dados.get("verificado_em", 0) < INTERVALO_VERIFICACAO
+        if not forcar and ultimo is not None and (ultimo >= _mes_anterior() or recente):
+            return 0
+
+        inicio = _proximo_mes(ultimo) if ultimo else INICIO_SERIE
+        url = URL_IPCA.format(inicio=f"01/{inicio[5:]}/{inicio[:4]}", fim=date.today().strftime("%d/%m/%Y"))
+        logger.info(f"Sincronizando IPCA a partir de {inicio}...")
+        response = cache_http.get(url, fonte="bcb", forcar=forcar)
+        if response.status_code == 404:
+            # O SGS responde 404 quando não há observações no intervalo
+            novos = []
+        else:
+            response.raise_for_status()
+            novos = response.json()
+
+        for item in novos:
+            dia, mes, ano = item["data"].split("/")
+            self.dados["valores"][f"{ano}-{mes}"] = float(item["valor"])
+        self.dados["valores"] = dict(sorted(self.dados["valores"].items()))
+        self.dados["verificado_em"] = time.time()
+        self.salvar()
+        logger.info(f"IPCA: {len(novos)} meses novos (último: {self.ultimo_mes}).")
+        return len(novos)
+
+    def salvar(self):
+        self.dados["atualizado_em"] = datetime.now().isoformat(timespec="seconds")
+        diretorio = os.path.dirname(self.caminho) or "."
+        descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix=".tmp")
+        with os.fdopen(descritor, 'w', encoding='utf-8') as file:
+            json.dump(self.dados, file, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho)
+
+    def variacoes(self, inicio=None, fim=None):
+        """Meses ('AAAA-MM') e variações mensais (%) como arrays, opcionalmente recortados."""
+        meses = np.array(list(self.dados["valores"]), dtype="U7")
+        valores = np.fromiter(self.dados["valores"].values(), dtype=float, count=len(meses))
+        filtro = np.ones(len(meses), dtype=bool)
+        if inicio:
+            filtro &= meses >= inicio
+        if fim:
+            filtro &= meses <= fim
+        return meses[filtro], valores[filtro]
+
+    def indice_mensal(self):
+        """Número-índice mensal (produto acumulado de 1 + variação) com os respectivos meses."""
+        meses, valores = self.variacoes()
+        return meses, np.cumprod(1 + valores / 100)
+
+    def nivel_anual(self, anos, referencia="media"):
+        """
+        Nível de preços de cada ano, na ordem recebida.
+
+        Args:
+            anos: Anos (int ou str).
+            referencia: "media" (média dos meses do ano, para fluxos anuais como
+                repasses e produção) ou "dezembro" (índice do último mês do ano).
+
+        Anos posteriores ao último mês da série repetem o último nível conhecido.
+        """
+        meses, indice = self.indice_mensal()
+        if not len(meses):
+            raise ValueError("Série do IPCA vazia; execute a sincronização antes de deflacionar.")
+        anos_meses = meses.astype("U4").astype(int)
+        anos = np.asarray(anos, dtype=int)
+        unicos = np.unique(anos_meses)
+
+        if referencia == "media":
+            soma = np.bincount(np.searchsorted(unicos, anos_meses), weights=indice)
+            niveis = soma / np.bincount(np.searchsorted(unicos, anos_meses))
+        elif referencia == "dezembro":
+            niveis = indice[np.searchsorted(anos_meses, unicos, side="right") - 1]
+        else:
+            raise ValueError(f"Referência desconhecida: {referencia}")
+
+        if anos.min() < unicos[0]:
+            raise ValueError(f"IPCA disponível apenas a partir de {unicos[0]}.")
+        posicoes = np.minimum(np.searchsorted(unicos, anos), len(unicos) - 1)
+        if (unicos[posicoes] != anos).any():
+            logger.warning(f"IPCA sem dados para {sorted(set(anos[unicos[posicoes] != anos].tolist()))}; "
+                           f"usando o nível de {unicos[-1]}.")
+        return niveis[posicoes]
+
+    def fatores(self, anos, ano_base, referencia="media"):
+        """Fator que leva valores de cada ano a preços do ano base (1 no próprio ano base)."""
+        niveis = self.nivel_anual(np.append(np.asarray(anos, dtype=int), int(ano_base)), referencia)
+        return niveis[-1] / niveis[:-1]
+
+    def deflacionar(self, valores, anos, ano_base, referencia="media"):
+        """
+        Converte valores nominais em valores reais a preços do ano base.
+
+        Os anos correspondem ao último eixo de valores, então a mesma chamada
+        serve para uma série (n_anos), várias séries (n_series, n_anos) ou vários
+        municípios e séries (n_municipios, n_series, n_anos).
+        """
+        valores = np.asarray(valores, dtype=float)
+        return valores * self.fatores(anos, ano_base, referencia)
+
+    def deflacionar_dict(self, valores, ano_base, referencia="media"):
+        """Mesmo que deflacionar, para o formato {ano: valor} dos JSON do projeto."""
+        anos = list(valores)
+        reais = self.deflacionar([valores[ano] for ano in anos], anos, ano_base, referencia)
+        return dict(zip(anos, reais.tolist()))
+
+    def acumulado_anual(self, inicio, fim):
+        """{ano: variação acumulada no ano (%)} entre os anos informados."""
+        meses, valores = self.variacoes(f"{inicio}-01", f"{fim}-12")
+        anos = meses.astype("U4")
+        resultado = {}
+        for ano in np.unique(anos):
+            resultado[str(ano)] = float((np.prod(1 + valores[anos == ano] / 100) - 1) * 100)
+        return resultado
+
+
+_serie = None
+
+
+def serie_ipca(sincronizar=True):
+    """Instância compartilhada da série (sincronizada no primeiro uso)."""
+    global _serie
+    if _serie is None:
+        _serie = SerieIPCA()
+        if sincronizar:
+            _serie.sincronizar()
+    return _serie
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Série mensal do IPCA (BCB/SGS 433).")
+    parser.add_argument("--forcar", action="store_true", help="Consulta o BCB mesmo que a série pareça atualizada.")
+    parser.add_argument("--base", type=int, help="Mostra os fatores para levar cada ano a preços deste ano.")
+    args = parser.parse_args()
+
+    serie = SerieIPCA()
+    serie.sincronizar(forcar=args.forcar)
+    if args.base:
+        anos = list(range(int(INICIO_SERIE[:4]), int(serie.ultimo_mes[:4]) + 1))
+        for ano, fator in zip(anos, serie.fatores(anos, args.base)):
+            print(f"{ano}: {fator:.4f}")
@@ -0,0 +1,264 @@
+import logging
+
+import numpy as np
+
+from resumo_dados import INSTRUCAO_CORES, estatisticas, formatar_percentual
+
+logger = logging.getLogger(__name__)
+
+# Série de referência do evolucao_mac.json
+SERIE_TETO = "Teto Financeiro MAC"
+# Variação no período (%) abaixo da qual a série é tratada como estável
+LIMIAR_ESTABILIDADE = 5.0
+# Faixas de |r| para descrever a correlação, da mais forte para a mais fraca
+FAIXAS_CORRELACAO = ((0.8, "muito forte"), (0.6, "forte"), (0.4, "moderada"), (0.2, "fraca"))
+MAXIMO_PORTARIAS = 3
+
+TENDENCIAS = {
+    "crescimento": "uma trajetória de **crescimento**",
+    "reducao": "uma trajetória de **redução**",
+    "estabilidade": "relativa **estabilidade**",
+}
+
+# Produções analisadas pelos textos de correlação (txt_analise_mac_sia e txt_analise_mac_sih)
+PRODUCOES = {
+    "sia": {"titulo": "Produção Ambulatorial", "rotulo": "produção ambulatorial (SIA)",
+            "unidade": "procedimentos ambulatoriais", "categoria": "complexidade"},
+    "sih": {"titulo": "Produção Hospitalar", "rotulo": "produção hospitalar (SIH)",
+            "unidade": "procedimentos hospitalares", "categoria": "grupo de procedimento"},
+}
+
+
+def formatar_moeda(valor):
+    """Valor em reais no padrão brasileiro, com o $ escapado para o Streamlit (R\\$ 1.234,56)."""
+    return "R\\$ " + f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def formatar_quantidade(valor):
+    """Quantidade inteira com ponto de milhar (54.802)."""
+    return f"{valor:,.0f}".replace(",", ".")
+
+
+def tendencia(est):
+    """'crescimento', 'reducao' ou 'estabilidade' conforme a variação no período."""
+    variacao = est.get("variacao")
+    if variacao is None or abs(variacao) < LIMIAR_ESTABILIDADE:
+        return "estabilidade"
+    return "crescimento" if variacao > 0 else "reducao"
+
+
+def formatar_correlacao(r):
+    return f"{r:.2f}".replace(".", ",")
+
+
+def forca_correlacao(r):
+    """Descrição da correlação de Pearson: 'forte e positiva', 'fraca e negativa', ..."""
+    for limite, forca in FAIXAS_CORRELACAO:
+        if abs(r) >= limite:
+            return f"{forca} e {'positiva' if r > 0 else 'negativa'}"
+    return "praticamente inexistente"
+
+
+def frases_evolucao(rotulo, serie, formatar):
+    """
+    Frases sobre a evolução de uma série {ano: valor}: valores inicial e final,
+    variação e CAGR, anos de máximo e mínimo e maiores variações anuais.
+    """
+    est = estatisticas(serie)
+    if not len(est["anos"]):
+        return []
+    anos, niveis = est["anos"], est["niveis"]
+    positivos = np.flatnonzero(niveis > 0)
+    inicio = int(positivos[0]) if len(positivos) else 0
+    frases = []
+    if "variacao" in est:
+        frase = (f"{rotulo} passou de **{formatar(niveis[inicio])}** em {anos[inicio]} para "
+                 f"**{formatar(niveis[-1])}** em {anos[-1]}, {TENDENCIAS[tendencia(est)]} "
+                 f"(variação de {formatar_percentual(est['variacao'])} no período")
+        if "cagr" in est:
+            frase += f", média de {formatar_percentual(est['cagr'])} ao ano"
+        frases.append(frase + ").")
+    else:
+        frases.append(f"{rotulo} registrou **{formatar(niveis[-1])}** em {anos[-1]}.")
+
+    # Máximo e mínimo a partir do primeiro ano com valor (anos sem a série não contam como mínimo)
+    periodo = niveis[inicio:]
+    ano_maximo, maximo = anos[inicio + periodo.argmax()], periodo.max()
+    ano_minimo, minimo = anos[inicio + periodo.argmin()], periodo.min()
+    if maximo != minimo:
+        frases.append(f"O maior valor da série foi registrado em {ano_maximo} ({formatar(maximo)}) "
+                      f"e o menor em {ano_minimo} ({formatar(minimo)}).")
+
+    yoy = est.get("yoy", np.array([]))
+    if len(yoy) and np.isfinite(yoy).any():
+        alta, queda = np.nanargmax(yoy), np.nanargmin(yoy)
+        partes = []
+        if round(yoy[alta], 1) > 0:
+            partes.append(f"a maior alta anual ocorreu em {anos[alta + 1]} ({formatar_percentual(yoy[alta])})")
+        if round(yoy[queda], 1) < 0:
+            partes.append(f"a maior queda, em {anos[queda + 1]} ({formatar_percentual(yoy[queda])})")
+        if partes:
+            frases.append("; ".join(partes).capitalize() + ".")
+    return frases
+
+
+def _paragrafo(frases):
+    return " ".join(frases)
+
+
+def _serie_teto(series_mac):
+    """Teto MAC do evolucao_mac.json (ou a primeira série, se o nome não existir)."""
+    if SERIE_TETO in series_mac:
+        return series_mac[SERIE_TETO]
+    return next(iter(series_mac.values()), {})
+
+
+def _soma_anual(series):
+    """Soma das categorias por ano ({ano: total})."""
+    total = {}
+    for serie in series.values():
+        for ano, valor in serie.items():
+            total[ano] = total.get(ano, 0.0) + valor
+    return total
+
+
+def textos_mac(municipio, series_mac, portarias):
+    """
+    Análise da tendência e conclusão do txt_analise_mac, no formato da resposta do
+    modelo (a conclusão começa com '## Conclusão').
+    """
+    teto = _serie_teto(series_mac)
+    est_teto = estatisticas(teto)
+    paragrafos = [_paragrafo(frases_evolucao(f"O Teto Financeiro MAC de {municipio}", teto, formatar_moeda))]
+    for nome, serie in series_mac.items():
+        if serie is not teto and any(serie.values()):
+            paragrafos.append(_paragrafo(frases_evolucao(f"A série *{nome}*", serie, formatar_moeda)))
+
+    maiores = sorted(portarias or [], key=lambda p: -float(p.get("Valor") or 0))[:MAXIMO_PORTARIAS]
+    if maiores:
+        citadas = [f"{p['Portaria']} ({p.get('Incentivo', '-')}, {formatar_moeda(float(p['Valor']))}, "
+                   f"competência {p.get('Competência', '-')})" for p in maiores]
+        acrescimos = sum(float(p.get("Valor") or 0) for p in portarias if p.get("Tipo") == "Acréscimo")
+        frase = f"Entre as portarias que mais impactaram a evolução do teto, destacam-se {', '.join(citadas)}."
+        if acrescimos:
+            frase += f" Somados, os acréscimos listados representam **{formatar_moeda(acrescimos)}**."
+        paragrafos.append(frase)
+
+    conclusao = ["## Conclusão"]
+    if "variacao" in est_teto:
+        conclusao.append(
+            f"No período analisado, o Teto Financeiro MAC de {municipio} apresentou {TENDENCIAS[tendencia(est_teto)]}, "
+            f"alcançando **{formatar_moeda(est_teto['niveis'][-1])}** em {est_teto['anos'][-1]}. "
+            "As portarias de habilitação e incentivo foram determinantes para esse resultado, o que indica que a "
+            "ampliação de serviços no município depende da recomposição contínua do teto."
+        )
+    else:
+        conclusao.append(f"Os dados disponíveis não permitem calcular a variação do Teto Financeiro MAC de {municipio}.")
+    return {"analise": "\n\n".join(paragrafos + conclusao)}
+
+
+def textos_producao(municipio, series_mac, series_producao, producao):
+    """
+    Análise de correlação e conclusão dos textos de produção (SIA/SIH), no formato
+    das respostas do modelo ({"correlacao": ..., "conclusao": ...}).
+
+    Args:
+        series_mac: {série: {ano: valor}} do evolucao_mac.json.
+        series_producao: {categoria: {ano: quantidade}}.
+        producao: Um dos itens de PRODUCOES.
+    """
+    teto = _serie_teto(series_mac)
+    est_teto = estatisticas(teto)
+    total = _soma_anual(series_producao)
+    est_total = estatisticas(total, referencia=teto)
+    rotulo, unidade = producao["rotulo"], producao["unidade"]
+
+    # --- Evolução ---
+    evolucao = [f"### Evolução do Teto MAC e da {producao['titulo']}",
+                _paragrafo(frases_evolucao(f"O Teto Financeiro MAC de {municipio}", teto, formatar_moeda)),
+                _paragrafo(frases_evolucao(f"O total de {unidade}", total, formatar_quantidade))]
+    if len(series_producao) > 1:
+        volumes = {nome: sum(serie.values()) for nome, serie in series_producao.items()}
+        principal = max(volumes, key=volumes.get)
+        if sum(volumes.values()):
+            evolucao.append(f"A categoria de maior volume no período foi **{principal}**, com "
+                            f"{formatar_quantidade(volumes[principal])} registros "
+                            f"({volumes[principal] / sum(volumes.values()) * 100:.0f}% do total).")
+
+    # --- Correlação ---
+    correlacoes = []
+    for nome, serie in series_producao.items():
+        r = estatisticas(serie, referencia=teto).get("correlacao")
+        if r is not None:
+            correlacoes.append((nome, r))
+    correlacao = ["### Correlação e Complexidade do Sistema"]
+    r_total = est_total.get("correlacao")
+    if r_total is not None:
+        correlacao.append(f"A correlação entre o Teto MAC e o total da {rotulo} é **{forca_correlacao(r_total)}** "
+                          f"(r = {formatar_correlacao(r_total)}).")
+    if correlacoes:
+        correlacao.append("Por " + producao["categoria"] + ": " + "; ".join(
+            f"{nome}, {forca_correlacao(r)} (r = {formatar_correlacao(r)})" for nome, r in correlacoes) + ".")
+    if r_total is None or abs(r_total) < 0.6:
+        correlacao.append("A relação entre financiamento e produção não é linear: a produção responde a fatores "
+                          "como a demanda reprimida, a oferta de profissionais e a incorporação de novas tecnologias, "
+                          "o que evidencia a complexidade do sistema e a necessidade de um financiamento robusto.")
+    else:
+        correlacao.append("A produção acompanha de perto o financiamento disponível, o que indica que novos recursos "
+                          "tendem a se converter diretamente em ampliação do atendimento.")
+
+    # --- Necessidade de ampliação ---
+    necessidade = ["### Necessidade de Ampliação do Teto MAC"]
+    cagr_teto, cagr_producao = est_teto.get("cagr"), est_total.get("cagr")
+    if cagr_teto is not None and cagr_producao is not None:
+        if cagr_producao > cagr_teto:
+            necessidade.append(f"A {rotulo} cresceu em média {formatar_percentual(cagr_producao)} ao ano, acima do "
+                               f"Teto MAC ({formatar_percentual(cagr_teto)} ao ano): a demanda atendida avança mais rápido "
+                               "que o financiamento, o que justifica o ajuste do teto.")
+        else:
+            necessidade.append(f"O Teto MAC variou em média {formatar_percentual(cagr_teto)} ao ano e a {rotulo}, "
+                               f"{formatar_percentual(cagr_producao)} ao ano; sem recomposição do teto, a capacidade de "
+                               "expandir a oferta e absorver a demanda reprimida fica comprometida.")
+    else:
+        necessidade.append(f"Mesmo com as limitações dos dados disponíveis, a {rotulo} demonstra uma demanda "
+                           "contínua que precisa ser sustentada por um Teto MAC compatível.")
+
+    # --- Eficiência ---
+    eficiencia = ["### Eficiência na Gestão dos Recursos"]
+    comuns = [ano for ano in sorted(total, key=int) if total[ano] > 0 and teto.get(ano)]
+    if len(comuns) >= 2:
+        primeiro, ultimo = comuns[0], comuns[-1]
+        custo_inicial, custo_final = teto[primeiro] / total[primeiro], teto[ultimo] / total[ultimo]
+        eficiencia.append(f"O Teto MAC por registro de produção passou de {formatar_moeda(custo_inicial)} em {primeiro} "
+                          f"para {formatar_moeda(custo_final)} em {ultimo}.")
+    eficiencia.append("A gestão eficiente dos recursos, com monitoramento da produção e regulação do acesso, "
+                      "garante que cada real adicional seja convertido em atendimento à população.")
+
+    # Cada seção: subtítulo e um parágrafo com as frases
+    analise = "\n\n".join(f"{secao[0]}\n\n{_paragrafo(secao[1:])}"
+                          for secao in (evolucao, correlacao, necessidade, eficiencia))
+
+    conclusao = [f"A análise da {rotulo} de {municipio} frente ao Teto Financeiro MAC "
+                 f"mostra {TENDENCIAS[tendencia(est_teto)]} do teto e {TENDENCIAS[tendencia(est_total)]} da produção."]
+    if r_total is not None:
+        conclusao.append(f"A correlação entre ambos é {forca_correlacao(r_total)}.")
+    conclusao.append("Diante da complexidade do sistema e das variações da demanda, a recomposição do Teto MAC para o "
+                     "próximo ano é essencial para manter e ampliar a oferta de serviços de média e alta complexidade.")
+    return {"correlacao": analise, "conclusao": _paragrafo(conclusao)}
+
+
+def prompt_polimento(texto):
+    """Prompt da revisão opcional pelo modelo: reescreve o texto montado por regras sem mudar os dados."""
+    return f"""
+    Revise o texto abaixo, escrito a partir de modelos, para que fique fluido e natural em português.
+
+    Instruções:
+    - Mantenha todos os números, anos, percentuais e títulos exatamente como estão.
+    - Não acrescente dados que não estejam no texto.
+    - Mantenha o formato Markdown e use sempre R\\$ e não R$ para valores monetários.
+    - {INSTRUCAO_CORES}
+    - Responda apenas com o texto revisado.
+
+    Texto:
+    {texto}
+    """
@@ -0,0 +1,577 @@
+import argparse
+import ast
+import contextlib
+import functools
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import runpy
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from catalogo_municipios import catalogo
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_BASE = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_MUNICIPIOS = os.path.join(DIRETORIO_BASE, "municipios")
+
+# Máximo de etapas rodando ao mesmo tempo contra cada origem, somando todos os municípios
+LIMITES_HOST = {
+    "tabnet": 4,   # tabnet.datasus.gov.br
+    "sismac": 2,   # sismac.saude.gov.br
+    "ibge": 4,     # servicodados.ibge.gov.br e apisidra.ibge.gov.br
+    "bcb": 2,      # api.bcb.gov.br
+    "gemini": 2,   # generativelanguage.googleapis.com
+}
+
+
+def obter_params(json_data):
+    """Período (ano/mês inicial e final) das consultas SIA/SIH a partir do evolucao_mac.json."""
+    anos = set()
+    for item in json_data:
+        for key, value in item.items():
+            anos.update(value.keys())
+
+    start_year = min(anos)
+    end_year = str(int(max(anos)) + 1)
+    start_month = 1  # Janeiro
+    end_month = 12   # Dezembro
+
+    return [start_year, start_month, end_year, str(end_month)]
+
+
+def params_periodo(municipio):
+    with open(os.path.join(municipio["diretorio"], 'evolucao_mac.json'), 'r', encoding='utf-8') as file:
+        return [*obter_params(json.load(file)), municipio["codigo"]]
+
+
+# Etapas por município. "args" recebe o município ({"codigo", "nome", "uf", "diretorio"})
+# e devolve os argumentos do script; "entradas" e "saidas" são arquivos da pasta do
+# município e definem o grafo: cada entrada vem da última etapa anterior que a produz.
+# "validade_horas" marca as etapas que baixam dados externos: mesmo sem mudança nas
+# entradas, elas voltam a rodar quando o resultado fica mais velho que a validade.
+# "sem_llm" troca campos da etapa quando o pipeline roda com --sem-llm (textos montados por regras).
+ETAPAS = [
+    {"nome": "evolucao_mac", "validade_horas": 24, "script": "evolucao_mac.py", "hosts": ["ibge", "sismac"], "args": lambda m: [m["codigo"]],
+     "entradas": [], "saidas": ["evolucao_mac.json"]},
+    {"nome": "evolucao_mac2", "validade_horas": 24, "script": "evolucao_mac2.py", "hosts": ["ibge", "sismac"], "args": lambda m: [m["codigo"]],
+     "entradas": ["evolucao_mac.json"], "saidas": ["evolucao_mac.json"]},
+    {"nome": "MacUF", "validade_horas": 24, "script": "MacUF.py", "hosts": ["sismac"], "args": lambda m: [m["codigo"]],
+     "entradas": [], "saidas": ["MAC_UF.json"]},
+    {"nome": "analise_teto_mac", "validade_horas": 24, "script": "analise_teto_mac.py", "hosts": ["sismac"], "args": lambda m: [m["codigo"]],
+     "entradas": [], "saidas": ["tabela_analise.json"]},
+    {"nome": "BaixaSIA", "validade_horas": 24, "script": "BaixaSIA.py", "hosts": ["tabnet"], "args": params_periodo,
+     "entradas": ["evolucao_mac.json"], "saidas": ["SIA.json"]},
+    {"nome": "BaixaSIH", "validade_horas": 24, "script": "BaixaSIH.py", "hosts": ["tabnet"], "args": params_periodo,
+     "entradas": ["evolucao_mac.json"], "saidas": ["SIH.json"]},
+    {"nome": "Faixa", "validade_horas": 720, "script": "IBGE/faixa_etaria.py", "hosts": ["ibge"], "args": lambda m: [m["codigo"]],
+     "entradas": [], "saidas": ["tabela_populacao_completa.json"]},
+    {"nome": "Econo", "validade_horas": 720, "script": "IBGE/economia.py", "hosts": ["ibge", "gemini"], "args": lambda m: [m["codigo"], m["nome"]],
+     "entradas": ["tabela_populacao_completa.json"], "saidas": ["dados_economicos.json"]},
+    {"nome": "Resumo_PT", "script": "res_pt.py", "hosts": [], "args": lambda m: [],
+     "entradas": ["evolucao_mac.json", "tabela_analise.json"], "saidas": ["pt_mac_res.json"]},
+    # Os três textos (txt_analise_mac, _sih e _sia) saem de um único lote de chamadas ao Gemini
+    {"nome": "Analise Textos", "script": "txt_analise_relatorio.py", "hosts": ["gemini"], "args": lambda m: [m["nome"]],
+     "entradas": ["evolucao_mac.json", "pt_mac_res.json", "SIH.json", "SIA.json"],
+     "saidas": ["analise_mac_municipio.txt", "analise_mac_sih.txt", "analise_mac_sia.txt"],
+     "sem_llm": {"hosts": [], "args": lambda m: [m["nome"], "--sem-llm"]}},
+    {"nome": "Analise Correlações", "script": "analise_correlacao.py", "hosts": ["bcb", "gemini"], "args": lambda m: [],
+     "entradas": ["SIA.json", "SIH.json", "evolucao_mac.json"], "saidas": ["analise_correlacao.json"]},
+    {"nome": "Conclusão", "script": "conclusao.py", "hosts": ["gemini"], "args": lambda m: [],
+     "entradas": ["analise_mac_sia.txt", "analise_mac_sih.txt", "analise_mac_municipio.txt", "analise_correlacao.json", "dados_economicos.json"],
+     "saidas": ["conclusao_final.txt"]},
+]
+
+
+def etapas_sem_llm(etapas):
+    """Etapas com a variante sem LLM aplicada nas que a possuem; as demais ficam iguais."""
+    return [{**etapa, **etapa["sem_llm"]} if "sem_llm" in etapa else etapa for etapa in etapas]
+
+
+def montar_dependencias(etapas):
+    """
+    Dependências de cada etapa ({nome: {nomes}}) a partir dos arquivos de entrada e saída.
+
+    Uma entrada depende da última etapa anterior da lista que a produz; entradas
+    que nenhuma etapa selecionada produz devem existir na pasta do município.
+    """
+    dependencias = {}
+    produtor = {}
+    for etapa in etapas:
+        dependencias[etapa["nome"]] = {produtor[arquivo] for arquivo in etapa["entradas"] if arquivo in produtor}
+        for arquivo in etapa["saidas"]:
+            produtor[arquivo] = etapa["nome"]
+    return dependencias
+
+
+# Importados uma única vez em cada processo do pool aquecido
+MODULOS_PESADOS = [
+    "numpy", "pandas", "requests", "matplotlib.pyplot", "plotly.express", "dotenv",
+    "selenium.webdriver", "google.generativeai", "cache_http", "catalogo_municipios", "extracao_tabela", "tabnet", "sismac",
+]
+
+
+def iniciar_worker():
+    """Inicializador dos processos do pool: importa antes os módulos pesados das etapas."""
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    for caminho in (os.path.join(DIRETORIO_BASE, "IBGE"), DIRETORIO_BASE):
+        if caminho not in sys.path:
+            sys.path.insert(0, caminho)
+    for modulo in MODULOS_PESADOS:
+        try:
+            importlib.import_module(modulo)
+        except Exception as e:
+            logger.warning(f"Módulo {modulo} não pré-carregado: {e}")
+
+
+def _limpar_logging():
+    # Os scripts chamam logging.basicConfig, que não faz nada se já houver handlers
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+        handler.close()
+
+
+def executar_script(script, params, diretorio, caminho_log=None):
+    """
+    Roda o script como __main__ dentro do processo atual e retorna o código de saída.
+
+    Equivale a `python script params` com cwd=diretorio, mas reaproveita os
+    módulos já importados pelo processo (ver iniciar_worker).
+    """
+    argv_original, cwd_original = sys.argv, os.getcwd()
+    if os.path.dirname(script) not in sys.path:
+        sys.path.insert(0, os.path.dirname(script))
+    _limpar_logging()
+
+    codigo = 0
+    with contextlib.ExitStack() as pilha:
+        if caminho_log is not None:
+            saida = pilha.enter_context(open(caminho_log, 'w', encoding='utf-8'))
+            pilha.enter_context(contextlib.redirect_stdout(saida))
+            pilha.enter_context(contextlib.redirect_stderr(saida))
+        try:
+            sys.argv = [script, *params]
+            os.chdir(diretorio)
+            runpy.run_path(script, run_name="__main__")
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                codigo = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                codigo = 1
+        except Exception:
+            traceback.print_exc()
+            codigo = 1
+        finally:
+            sys.argv = argv_original
+            os.chdir(cwd_original)
+            _limpar_logging()
+    return codigo
+
+
+def _pronto():
+    return os.getpid()
+
+
+def criar_pool(processos):
+    """
+    Cria o pool de processos aquecidos e já dispara a inicialização de todos eles.
+
+    Usa fork para que os processos não reimportem o módulo principal (o
+    baixar_dados monta a janela Tk no nível do módulo); por isso o pool deve ser
+    criado antes de abrir janelas ou iniciar threads. Sem fork (Windows),
+    retorna None e as etapas rodam em um python por etapa.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Processos aquecidos exigem fork, indisponível nesta plataforma; cada etapa rodará em um python novo.")
+        return None
+    pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("fork"), initializer=iniciar_worker)
+    for _ in range(processos):
+        pool.submit(_pronto)
+    return pool
+
+
+ARQUIVO_MANIFESTO = ".pipeline_manifest.json"
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do conteúdo do arquivo (None se não existir)."""
+    if not os.path.exists(caminho):
+        return None
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as file:
+        for bloco in iter(lambda: file.read(1 << 20), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _modulos_importados(caminho):
+    """Nomes dos módulos importados pelo arquivo (todos os de `import a, b` e também os de dentro de funções)."""
+    with open(caminho, 'r', encoding='utf-8') as file:
+        try:
+            arvore = ast.parse(file.read(), filename=caminho)
+        except SyntaxError:
+            return []
+    modulos = []
+    for no in ast.walk(arvore):
+        if isinstance(no, ast.Import):
+            modulos += [alias.name for alias in no.names]
+        elif isinstance(no, ast.ImportFrom) and no.module and not no.level:
+            # "from pacote import modulo" também pode importar um arquivo pacote/modulo.py
+            modulos.append(no.module)
+            modulos += [f"{no.module}.{alias.name}" for alias in no.names]
+    return modulos
+
+
+def _caminho_local(modulo, diretorios):
+    """Arquivo .py do módulo em um dos diretórios do projeto (None se for de terceiros)."""
+    relativo = modulo.replace(".", os.sep)
+    for diretorio in diretorios:
+        for caminho in (os.path.join(diretorio, f"{relativo}.py"), os.path.join(diretorio, relativo, "__init__.py")):
+            if os.path.isfile(caminho):
+                return os.path.abspath(caminho)
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def hash_codigo(script):
+    """
+    Hash do script e de todos os módulos locais que ele alcança por imports (tabnet, sismac, ...).
+
+    Os imports são seguidos transitivamente (txt_analise_relatorio -> txt_analise_mac ->
+    narrativa -> resumo_dados), procurando os módulos na pasta de cada arquivo e na raiz
+    do projeto, como os scripts fazem ao rodar.
+    """
+    script = os.path.abspath(script)
+    visitados = {script}
+    pendentes = [script]
+    while pendentes:
+        caminho = pendentes.pop()
+        diretorios = (os.path.dirname(caminho), DIRETORIO_BASE)
+        for modulo in _modulos_importados(caminho):
+            local = _caminho_local(modulo, diretorios)
+            if local is not None and local not in visitados:
+                visitados.add(local)
+                pendentes.append(local)
+    sha = hashlib.sha256()
+    for caminho in sorted(visitados):
+        sha.update(os.path.relpath(caminho, DIRETORIO_BASE).encode())
+        sha.update(hash_arquivo(caminho).encode())
+    return sha.hexdigest()
+
+
+class Manifesto:
+    """
+    Registro, por município, do que cada etapa usou na última execução bem-sucedida.
+
+    Guarda em .pipeline_manifest.json o hash das entradas, os parâmetros, o hash
+    do código e o hash das saídas, como um make: a etapa só volta a rodar quando
+    algo disso mudou, quando uma saída sumiu ou foi alterada, ou quando venceu
+    a validade dos dados externos.
+    """
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self.caminho = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+        self.etapas = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, 'r', encoding='utf-8') as file:
+                    self.etapas = json.load(file)
+            except json.JSONDecodeError:
+                logger.warning(f"Manifesto inválido em {self.caminho}; todas as etapas serão executadas.")
+
+    def assinatura(self, etapa, script, params):
+        return {
+            "entradas": {arquivo: hash_arquivo(os.path.join(self.diretorio, arquivo)) for arquivo in etapa["entradas"]},
+            "params": params,
+            "codigo": hash_codigo(script),
+        }
+
+    def atualizada(self, etapa, assinatura):
+        """Indica se a etapa pode ser pulada."""
+        registro = self.etapas.get(etapa["nome"])
+        if registro is None or registro["params"] != assinatura["params"] or registro["codigo"] != assinatura["codigo"]:
+            return False
+        validade = etapa.get("validade_horas")
+        if validade is not None and time.time() - registro["executada_em"] > validade * 3600:
+            return False
+        for arquivo in etapa["saidas"]:
+            if not self._saida_intacta(etapa["nome"], arquivo, registro["saidas"].get(arquivo)):
+                return False
+        for arquivo, hash_atual in assinatura["entradas"].items():
+            # Arquivo que a própria etapa reescreve (evolucao_mac2): compara com o que ela deixou
+            esperado = registro["saidas"].get(arquivo) if arquivo in etapa["saidas"] else registro["entradas"].get(arquivo)
+            if hash_atual != esperado:
+                return False
+        return True
+
+    def _saida_intacta(self, nome, arquivo, esperado):
+        """
+        Indica se a saída no disco é a que a etapa deixou.
+
+        Uma saída compartilhada (evolucao_mac.json, reescrito pelo evolucao_mac2)
+        também está intacta quando foi reescrita por uma etapa seguinte que partiu
+        exatamente dela: segue a cadeia até o último registro que a escreveu.
+        """
+        atual = hash_arquivo(os.path.join(self.diretorio, arquivo))
+        visitadas = {nome}
+        while atual != esperado:
+            for outro, registro in self.etapas.items():
+                if (outro not in visitadas and registro["entradas"].get(arquivo) == esperado
+                        and arquivo in registro["saidas"]):
+                    visitadas.add(outro)
+                    esperado = registro["saidas"][arquivo]
+                    break
+            else:
+                return False
+        return esperado is not None
+
+    def registrar(self, etapa, assinatura):
+        registro = dict(assinatura)
+        registro["saidas"] = {arquivo: hash_arquivo(os.path.join(self.diretorio, arquivo)) for arquivo in etapa["saidas"]}
+        registro["executada_em"] = time.time()
+        with self._lock:
+            self.etapas[etapa["nome"]] = registro
+            with open(self.caminho, 'w', encoding='utf-8') as file:
+                json.dump(self.etapas, file, ensure_ascii=False, indent=4)
+
+
+def listar_municipios(uf):
+    """Municípios da UF como [(código IBGE, nome)], pelo catálogo local."""
+    return [(municipio['ibge'], municipio['nome']) for municipio in catalogo().por_uf(uf)]
+
+
+def obter_municipio(codigo_ibge):
+    """Nome e UF de um município pelo código IBGE."""
+    municipio = catalogo().por_codigo(codigo_ibge)
+    if municipio is None:
+        raise KeyError(f"Código IBGE {codigo_ibge} não encontrado no catálogo de municípios.")
+    return municipio['nome'], municipio['uf']
+
+
+class Pipeline:
+    """
+    Executa as etapas de vários municípios em paralelo.
+
+    Cada município roda em sua própria pasta (municipios/<ibge>/) e suas etapas
+    seguem o grafo de entradas e saídas de ETAPAS; o paralelismo é limitado por
+    origem (LIMITES_HOST), para não sobrecarregar TabNet, SISMAC, IBGE e Gemini.
+    """
+
+    def __init__(self, etapas=None, limites_host=None, status_queue=None, pool=None, forcar=False):
+        self.etapas = etapas or ETAPAS
+        # Sem forcar, etapas com entradas, parâmetros e código inalterados são puladas (ver Manifesto)
+        self.forcar = forcar
+        # Com um pool (criar_pool), as etapas rodam nos processos aquecidos em vez de um python por etapa
+        self.pool = pool
+        self.semaforos = {host: threading.BoundedSemaphore(limite) for host, limite in (limites_host or LIMITES_HOST).items()}
+        self.status_queue = status_queue
+        self.status = {}
+        self._lock = threading.Lock()
+
+    def _informar(self, municipio, etapa, status):
+        with self._lock:
+            self.status[(municipio["codigo"], etapa["nome"])] = status
+        if self.status_queue is not None:
+            self.status_queue.put((etapa["nome"], status))
+
+    def _rodar_script(self, script, params, diretorio, caminho_log):
+        """Código de saída do script, rodado no pool aquecido ou em um python novo."""
+        pool = self.pool
+        if pool is not None:
+            try:
+                return pool.submit(executar_script, script, params, diretorio, caminho_log).result()
+            except BrokenProcessPool as e:
+                # Processo do pool encerrado (ex.: falta de memória); o pool não se recupera e,
+                # criado com fork, não pode ser recriado com a janela e as threads já abertas
+                logger.error(f"Pool de processos aquecidos interrompido ({e}); as etapas passam a rodar em um python novo.")
+                self.pool = None
+        with open(caminho_log, 'w', encoding='utf-8') as saida:
+            return subprocess.run([sys.executable, script, *params], cwd=diretorio, stdout=saida, stderr=subprocess.STDOUT).returncode
+
+    def executar_etapa(self, etapa, municipio):
+        """Roda o script da etapa na pasta do município, respeitando os limites das origens."""
+        script = os.path.join(DIRETORIO_BASE, etapa["script"])
+        try:
+            params = [str(param) for param in etapa["args"](municipio)]
+        except (OSError, ValueError) as e:
+            logger.error(f"[{municipio['codigo']}] {etapa['nome']}: parâmetros indisponíveis ({e}).")
+            self._informar(municipio, etapa, "Erro")
+            return False
+
+        manifesto = municipio["manifesto"]
+        assinatura = manifesto.assinatura(etapa, script, params)
+        if not self.forcar and manifesto.atualizada(etapa, assinatura):
+            logger.info(f"[{municipio['codigo']}] {etapa['nome']} atualizada; execução pulada.")
+            self._informar(municipio, etapa, "Concluído")
+            return True
+
+        # Semáforos sempre na mesma ordem, para que duas etapas nunca esperem uma pela outra
+        hosts = sorted(host for host in etapa["hosts"] if host in self.semaforos)
+        for host in hosts:
+            self.semaforos[host].acquire()
+        try:
+            logger.info(f"[{municipio['codigo']}] Executando {etapa['nome']} com parâmetros: {params}")
+            self._informar(municipio, etapa, "Executando...")
+            inicio = time.monotonic()
+            caminho_log = os.path.join(municipio["diretorio"], "logs", f"{etapa['nome']}.log")
+            codigo = self._rodar_script(script, params, municipio["diretorio"], caminho_log)
+        except Exception as e:
+            logger.error(f"[{municipio['codigo']}] {etapa['nome']}: erro ao executar o script ({e}).")
+            self._informar(municipio, etapa, "Erro")
+            return False
+        finally:
+            for host in reversed(hosts):
+                self.semaforos[host].release()
+
+        duracao = time.monotonic() - inicio
+        if codigo != 0:
+            logger.error(f"[{municipio['codigo']}] {etapa['nome']} falhou (código {codigo}) em {duracao:.1f}s.")
+            self._informar(municipio, etapa, "Erro")
+            return False
+        if not self._saidas_ausentes(etapa, municipio):
+            manifesto.registrar(etapa, assinatura)
+        logger.info(f"[{municipio['codigo']}] {etapa['nome']} concluído em {duracao:.1f}s.")
+        self._informar(municipio, etapa, "Concluído")
+        return True
+
+    def preparar_municipio(self, codigo_ibge, nome, uf, diretorio=None):
+        municipio = {
+            "codigo": codigo_ibge,
+            "nome": nome,
+            "uf": uf,
+            "diretorio": diretorio or os.path.join(DIRETORIO_MUNICIPIOS, codigo_ibge[:6]),
+        }
+        os.makedirs(os.path.join(municipio["diretorio"], "logs"), exist_ok=True)
+        municipio["manifesto"] = Manifesto(municipio["diretorio"])
+        return municipio
+
+    def _saidas_ausentes(self, etapa, municipio):
+        return [arquivo for arquivo in etapa["saidas"] if not os.path.exists(os.path.join(municipio["diretorio"], arquivo))]
+
+    def executar_lote(self, municipios, max_workers=16):
+        """
+        Processa vários municípios em paralelo, seguindo o grafo de dependências das etapas.
+
+        Cada etapa começa assim que as etapas que produzem suas entradas terminam,
+        de modo que ramos independentes (SISMAC, TabNet, IBGE) rodam ao mesmo tempo.
+        Uma etapa com erro faz com que as etapas que dependem dela sejam puladas.
+
+        Args:
+            municipios: Lista de (código IBGE, nome, UF), com a pasta do município como
+                quarto item opcional (padrão: municipios/<ibge>/).
+            max_workers: Etapas executadas ao mesmo tempo, somando todos os municípios.
+
+        Returns:
+            Dicionário {código IBGE: [etapas que falharam ou foram puladas]}.
+        """
+        dependencias = montar_dependencias(self.etapas)
+        estados = {}
+        for municipio in municipios:
+            municipio = self.preparar_municipio(*municipio)
+            logger.info(f"Iniciando {municipio['nome']}/{municipio['uf']} ({municipio['codigo']}) em {municipio['diretorio']}")
+            estados[municipio["codigo"]] = {"municipio": municipio, "aguardando": list(self.etapas), "concluidas": set(), "falhas": []}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etapa") as executor:
+            em_execucao = {}
+
+            def submeter_prontas(estado):
+                for etapa in list(estado["aguardando"]):
+                    deps = dependencias[etapa["nome"]]
+                    if deps & set(estado["falhas"]):
+                        estado["aguardando"].remove(etapa)
+                        estado["falhas"].append(etapa["nome"])
+                        logger.warning(f"[{estado['municipio']['codigo']}] {etapa['nome']} pulada: dependência com erro.")
+                        self._informar(estado["municipio"], etapa, "Erro")
+                    elif deps <= estado["concluidas"]:
+                        estado["aguardando"].remove(etapa)
+                        futuro = executor.submit(self.executar_etapa, etapa, estado["municipio"])
+                        em_execucao[futuro] = (estado, etapa)
+
+            for estado in estados.values():
+                submeter_prontas(estado)
+
+            while em_execucao:
+                prontos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    estado, etapa = em_execucao.pop(futuro)
+                    try:
+                        sucesso = futuro.result()
+                    except Exception as e:
+                        logger.error(f"[{estado['municipio']['codigo']}] {etapa['nome']}: {e}")
+                        sucesso = False
+                    ausentes = self._saidas_ausentes(etapa, estado["municipio"]) if sucesso else []
+                    if ausentes:
+                        logger.error(f"[{estado['municipio']['codigo']}] {etapa['nome']} não gerou {', '.join(ausentes)}.")
+                        self._informar(estado["municipio"], etapa, "Erro")
+                        sucesso = False
+                    if sucesso:
+                        estado["concluidas"].add(etapa["nome"])
+                    else:
+                        estado["falhas"].append(etapa["nome"])
+                    submeter_prontas(estado)
+
+        resultado = {}
+        for codigo, estado in estados.items():
+            resultado[codigo] = estado["falhas"]
+            if estado["falhas"]:
+                logger.error(f"[{codigo}] Etapas com erro: {', '.join(estado['falhas'])}")
+            else:
+                logger.info(f"[{codigo}] Todas as etapas concluídas.")
+        return resultado
+
+    def executar(self, codigo_ibge, nome, uf, diretorio=None, max_workers=16):
+        """Processa um único município (ver executar_lote) e retorna as etapas que falharam ou foram puladas."""
+        return self.executar_lote([(codigo_ibge, nome, uf, diretorio)], max_workers=max_workers)[codigo_ibge]
+
+
+if __name__ == "__main__":
+    # Configuração do logger só na execução direta, já que o baixar_dados importa este módulo
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('pipeline.log'),
+            logging.StreamHandler()
+        ]
+    )
+    parser = argparse.ArgumentParser(description="Executa as etapas do relatório do Teto MAC para vários municípios.")
+    parser.add_argument("municipios", nargs="*", help="Códigos IBGE dos municípios")
+    parser.add_argument("--uf", help="Processa todos os municípios da UF (ex.: PE)")
+    parser.add_argument("--workers", type=int, default=16, help="Etapas executadas ao mesmo tempo (padrão: 16)")
+    parser.add_argument("--etapas", nargs="+", help="Executa apenas as etapas informadas")
+    parser.add_argument("--forcar", action="store_true", help="Executa todas as etapas, mesmo as que estão atualizadas")
+    parser.add_argument("--sem-llm", action="store_true", help="Gera os textos de análise por regras, sem chamar o Gemini")
+    parser.add_argument("--aquecidos", type=int, default=0, help="Roda as etapas em N processos pré-aquecidos em vez de um python por etapa")
+    args = parser.parse_args()
+    pool = criar_pool(args.aquecidos) if args.aquecidos else None
+
+    if args.uf:
+        municipios = [(codigo, nome, args.uf.upper()) for codigo, nome in listar_municipios(args.uf.upper())]
+    else:
+        municipios = [(codigo, *obter_municipio(codigo)) for codigo in args.municipios]
+    if not municipios:
+        parser.error("informe os códigos IBGE ou --uf")
+
+    etapas = [etapa for etapa in ETAPAS if not args.etapas or etapa["nome"] in args.etapas]
+    if args.sem_llm:
+        etapas = etapas_sem_llm(etapas)
+    logger.info(f"{len(municipios)} municípios, {len(etapas)} etapas, até {args.workers} em paralelo.")
+    resultado = Pipeline(etapas, pool=pool, forcar=args.forcar).executar_lote(municipios, max_workers=args.workers)
+    if pool is not None:
+        pool.shutdown()
+    com_erro = [codigo for codigo, falhas in resultado.items() if falhas]
+    logger.info(f"{len(resultado) - len(com_erro)} municípios concluídos, {len(com_erro)} com erro.")
+    sys.exit(1 if com_erro else 0)
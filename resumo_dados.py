@@ -0,0 +1,258 @@
+import json
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Orçamento padrão (em tokens estimados) dos dados inseridos em um prompt
+ORCAMENTO_TOKENS = 1500
+
+# Instrução de destaques do Streamlit, enviada uma única vez por prompt
+INSTRUCAO_CORES = (
+    "Use destaques e cores com a sintaxe do Streamlit: :cor[texto] e :cor-background[texto], "
+    "com cor entre blue, green, orange, red, violet, gray ou primary (ex.: :orange[texto], :blue-background[texto])."
+)
+
+
+def estimar_tokens(texto):
+    """Estimativa de tokens (~4 caracteres por token)."""
+    return len(texto) // 4 + 1
+
+
+def numero_decimal(valor):
+    """'1261568.54' (ponto decimal), 98.0 ou '-' como float."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).strip()
+    return 0.0 if texto in ("", "-") else float(texto)
+
+
+def numero_tabnet(valor):
+    """'54.802' (ponto de milhar, como no TabNet) ou '1.234,56' como float; números passam direto."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = re.sub(r"[^\d,-]", "", str(valor))
+    return 0.0 if texto in ("", "-") else float(texto.replace(",", "."))
+
+
+def series_evolucao_mac(evolucao_mac):
+    """evolucao_mac.json ([{nome: {ano: valor}}]) como {nome: {ano: float}}."""
+    series = {}
+    for entrada in evolucao_mac or []:
+        for nome, valores in entrada.items():
+            series[nome] = {ano: numero_decimal(valor) for ano, valor in valores.items() if ano.isdigit()}
+    return series
+
+
+def series_tabela(linhas, coluna_categoria, conversor=numero_tabnet):
+    """Linhas no formato do TabNet ({categoria, ano..., Total}) como {categoria: {ano: float}}."""
+    series = {}
+    for linha in linhas or []:
+        if not isinstance(linha, dict) or not linha.get(coluna_categoria):
+            continue
+        series[linha[coluna_categoria]] = {
+            ano: conversor(valor) for ano, valor in linha.items() if ano.isdigit()
+        }
+    return series
+
+
+def _mantissa(valor):
+    return f"{valor:.3g}" if abs(valor) < 1000 else f"{valor:.0f}"
+
+
+def formatar_compacto(valor):
+    """
+    Número curto no padrão brasileiro; abaixo de 10 mil, o valor inteiro.
+
+    >>> formatar_compacto(2164473.85)
+    '2,16 mi'
+    >>> formatar_compacto(54802)
+    '54,8 mil'
+    >>> formatar_compacto(41806.32)
+    '41,8 mil'
+    >>> formatar_compacto(999600)
+    '1 mi'
+    >>> formatar_compacto(9999)
+    '9999'
+    >>> formatar_compacto(98.5)
+    '98,50'
+    """
+    if valor is None or np.isnan(valor):
+        return "-"
+    # A escala é escolhida pelo valor já arredondado (999.600 -> '1 mi', e não '1e+03 mil')
+    for divisor, sufixo in ((1e9, " bi"), (1e6, " mi")):
+        texto = _mantissa(valor / divisor)
+        if abs(float(texto)) >= 1:
+            return texto.replace(".", ",") + sufixo
+    if abs(valor) >= 1e4:
+        return _mantissa(valor / 1e3).replace(".", ",") + " mil"
+    if float(valor).is_integer():
+        return f"{int(valor)}"
+    return f"{valor:.2f}".replace(".", ",")
+
+
+def formatar_percentual(valor):
+    """Variação percentual com sinal no padrão brasileiro (+12,3%); "-" se indefinida."""
+    if valor is None or not np.isfinite(valor):
+        return "-"
+    valor = round(valor, 1)
+    return "0,0%" if valor == 0 else f"{valor:+.1f}%".replace(".", ",")
+
+
+def estatisticas(serie, referencia=None):
+    """
+    Indicadores de uma série {ano: valor}.
+
+    Retorna anos e níveis (arrays), variação ano a ano (%), variação no período (%),
+    CAGR (%), anos e valores de mínimo e máximo e, se houver série de referência,
+    a correlação de Pearson com ela nos anos em comum.
+    """
+    anos = np.array(sorted(serie, key=int))
+    niveis = np.array([serie[ano] for ano in anos], dtype=float)
+    resultado = {"anos": anos, "niveis": niveis}
+    if not len(anos):
+        return resultado
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        anteriores = niveis[:-1]
+        resultado["yoy"] = np.where(anteriores != 0, (niveis[1:] / anteriores - 1) * 100, np.nan)
+
+    # Do primeiro ano com valor até o último ano da série
+    positivos = np.flatnonzero(niveis > 0)
+    if len(positivos) and positivos[0] < len(anos) - 1:
+        inicio = positivos[0]
+        periodo = int(anos[-1]) - int(anos[inicio])
+        resultado["variacao"] = (niveis[-1] / niveis[inicio] - 1) * 100
+        if niveis[-1] > 0:
+            resultado["cagr"] = ((niveis[-1] / niveis[inicio]) ** (1 / periodo) - 1) * 100
+    resultado["minimo"] = (anos[niveis.argmin()], niveis.min())
+    resultado["maximo"] = (anos[niveis.argmax()], niveis.max())
+
+    if referencia:
+        comuns = [ano for ano in anos if ano in referencia]
+        if len(comuns) >= 3:
+            x = np.array([referencia[ano] for ano in comuns], dtype=float)
+            y = np.array([serie[ano] for ano in comuns], dtype=float)
+            if x.std() > 0 and y.std() > 0:
+                resultado["correlacao"] = float(np.corrcoef(x, y)[0, 1])
+    return resultado
+
+
+def _tabela_secao(titulo, series, referencia, nivel, maximo_series=None):
+    """
+    Tabela Markdown de uma seção, no nível de detalhe pedido.
+
+    nivel 3: níveis de todos os anos e variação ano a ano; 2: só os níveis;
+    1: apenas indicadores (primeiro e último ano, variação, CAGR, mínimo, máximo, correlação).
+    """
+    estatisticas_series = {nome: estatisticas(serie, referencia) for nome, serie in series.items()}
+    nomes = list(series)
+    omitidas = 0
+    if maximo_series is not None and len(nomes) > maximo_series:
+        # Mantém as séries de maior volume no período
+        nomes = sorted(nomes, key=lambda n: -np.nansum(estatisticas_series[n]["niveis"]))[:maximo_series]
+        omitidas = len(series) - len(nomes)
+        nomes = [nome for nome in series if nome in nomes]
+
+    anos = sorted({ano for nome in nomes for ano in series[nome]}, key=int)
+    colunas = ["Série"]
+    if nivel >= 2:
+        colunas += anos
+    else:
+        colunas += ["Início", "Fim"]
+    colunas += ["Var. período", "CAGR", "Mín (ano)", "Máx (ano)"]
+    if referencia:
+        colunas.append("Corr. Teto")
+
+    linhas = [f"**{titulo}**", "| " + " | ".join(colunas) + " |", "|" + "---|" * len(colunas)]
+    for nome in nomes:
+        est = estatisticas_series[nome]
+        celulas = [nome]
+        if nivel >= 2:
+            celulas += [formatar_compacto(series[nome].get(ano, np.nan)) for ano in anos]
+        else:
+            celulas += [
+                f"{formatar_compacto(est['niveis'][0])} ({est['anos'][0]})" if len(est["anos"]) else "-",
+                f"{formatar_compacto(est['niveis'][-1])} ({est['anos'][-1]})" if len(est["anos"]) else "-",
+            ]
+        celulas += [formatar_percentual(est.get("variacao")), formatar_percentual(est.get("cagr"))]
+        for chave in ("minimo", "maximo"):
+            celulas.append(f"{formatar_compacto(est[chave][1])} ({est[chave][0]})" if chave in est else "-")
+        if referencia:
+            correlacao = est.get("correlacao")
+            celulas.append("-" if correlacao is None else f"{correlacao:.2f}".replace(".", ","))
+        linhas.append("| " + " | ".join(celulas) + " |")
+
+        if nivel >= 3 and len(est["anos"]) > 1:
+            yoy = dict(zip(est["anos"][1:], est["yoy"]))
+            linhas.append("| ↳ var. anual | - | " + " | ".join(formatar_percentual(yoy.get(ano)) for ano in anos[1:])
+                          + " |" + " |" * (len(colunas) - len(anos) - 1))
+    if omitidas:
+        linhas.append(f"(+{omitidas} séries menores omitidas)")
+    return "\n".join(linhas)
+
+
+def montar_resumo(secoes, referencia=None, orcamento_tokens=ORCAMENTO_TOKENS):
+    """
+    Resumo estatístico compacto de várias seções para uso em prompts.
+
+    Args:
+        secoes: {título: {série: {ano: valor}}}.
+        referencia: Série {ano: valor} usada nas correlações (ex.: o Teto MAC).
+        orcamento_tokens: Tamanho máximo estimado do texto; o detalhe é reduzido
+            (variação anual, depois níveis anuais, depois séries menores) até caber.
+    """
+    maximo_series = None
+    while True:
+        for nivel in (3, 2, 1):
+            texto = "\n\n".join(
+                _tabela_secao(titulo, series, referencia, nivel, maximo_series)
+                for titulo, series in secoes.items() if series
+            )
+            if estimar_tokens(texto) <= orcamento_tokens:
+                return texto
+        maior = max(len(series) for series in secoes.values())
+        maximo_series = maior - 1 if maximo_series is None else maximo_series - 1
+        if maximo_series < 1:
+            logger.warning(f"Resumo excede o orçamento de {orcamento_tokens} tokens mesmo no menor detalhe.")
+            return texto
+
+
+def compactar_texto(texto, orcamento_tokens=ORCAMENTO_TOKENS):
+    """
+    Reduz um texto já gerado (Markdown do Streamlit ou HTML) ao essencial.
+
+    Remove marcações de cor e tags, e, se ainda exceder o orçamento, mantém
+    os títulos e a primeira frase de cada parágrafo antes de truncar.
+    """
+    texto = re.sub(r":[a-z\-]+\[([^\]]*)\]", r"\1", texto or "")
+    texto = re.sub(r"<[^>]+>", " ", texto)
+    paragrafos = [" ".join(p.split()) for p in re.split(r"\n\s*\n|\n(?=#)", texto) if p.strip()]
+    compacto = "\n".join(paragrafos)
+    if estimar_tokens(compacto) <= orcamento_tokens:
+        return compacto
+    compacto = "\n".join(p if p.startswith("#") else re.split(r"(?<=[.!?])\s", p, maxsplit=1)[0] for p in paragrafos)
+    if estimar_tokens(compacto) > orcamento_tokens:
+        compacto = compacto[:orcamento_tokens * 4].rsplit(" ", 1)[0] + " [...]"
+    return compacto
+
+
+def compactar_dados(dados, orcamento_tokens=ORCAMENTO_TOKENS):
+    """JSON compacto de dados arbitrários, com textos longos (análises anteriores) resumidos."""
+    def reduzir(valor):
+        if isinstance(valor, dict):
+            return {chave: reduzir(item) for chave, item in valor.items()}
+        if isinstance(valor, list):
+            return [reduzir(item) for item in valor]
+        if isinstance(valor, float):
+            return round(valor, 2)
+        if isinstance(valor, str) and len(valor) > 400:
+            return compactar_texto(valor, orcamento_tokens // 4)
+        return valor
+
+    texto = json.dumps(reduzir(dados), ensure_ascii=False, separators=(",", ":"))
+    if estimar_tokens(texto) > orcamento_tokens:
+        texto = texto[:orcamento_tokens * 4] + " [...]"
+    return texto
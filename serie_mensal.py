@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+from datetime import datetime
+
+from tabnet import cabecalhos_tabela, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Coluna do TabNet com uma coluna por competência de processamento
+COLUNA_MENSAL = "Ano/mês processamento"
+# Competências mais recentes que ainda podem ser reprocessadas pelo DATASUS
+JANELA_REVISAO_MESES = 3
+
+MESES = {"jan": 1, "fev": 2, "mar": 3, "abr": 4, "mai": 5, "jun": 6,
+         "jul": 7, "ago": 8, "set": 9, "out": 10, "nov": 11, "dez": 12}
+
+
+def mes_da_coluna(texto):
+    """Converte o cabeçalho '2024/Jan', 'Jan/2024' ou '2024/01' em '2024-01' (None se não for mês)."""
+    texto = normalizar_texto(texto)
+    ano = re.search(r"\b(\d{4})\b", texto)
+    if not ano:
+        return None
+    resto = (texto[:ano.start()] + " " + texto[ano.end():]).strip(" /-")
+    if resto.isdigit() and 1 <= int(resto) <= 12:
+        return f"{ano.group(1)}-{int(resto):02d}"
+    mes = MESES.get(resto[:3])
+    return f"{ano.group(1)}-{mes:02d}" if mes else None
+
+
+def mes_do_arquivo(nome):
+    """Competência de um .dbf do TabNet (ex.: 'qape2401.dbf' -> '2024-01')."""
+    encontrado = re.search(r"(\d{2})(\d{2})\.dbf$", nome, re.IGNORECASE)
+    if not encontrado:
+        return None
+    return f"20{encontrado.group(1)}-{encontrado.group(2)}"
+
+
+def valor_tabnet(texto):
+    """Converte '1.234' em 1234 e '1.234,56' em 1234.56; '-' (zero no TabNet) vira 0."""
+    texto = re.sub(r"[^\d,.-]", "", texto or "")
+    if texto in ("", "-"):
+        return 0
+    numero = float(texto.replace(".", "").replace(",", "."))
+    return int(numero) if numero.is_integer() else numero
+
+
+def formatar_br(valor):
+    """Formata como o TabNet: inteiros com ponto de milhar e decimais com vírgula."""
+    if float(valor).is_integer():
+        return f"{int(valor):,}".replace(",", ".")
+    return f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def ler_tabela_mensal(tabela):
+    """Lê uma consulta com Ano/mês na Coluna como {categoria: {'AAAA-MM': valor}}."""
+    headers = cabecalhos_tabela(tabela)
+    meses = [mes_da_coluna(h) for h in headers]
+    valores = {}
+    for linha in tabela["linhas"]:
+        cells = linha["celulas"]
+        if len(cells) != len(headers) or not cells or "TOTAL" in cells[0].upper():
+            continue
+        valores[cells[0]] = {mes: valor_tabnet(cell) for mes, cell in zip(meses[1:], cells[1:]) if mes}
+    return valores
+
+
+class SerieMensal:
+    """
+    Série mensal de um município guardada em JSON.
+
+    Guarda um valor por categoria e competência e a lista de competências já
+    sincronizadas (inclusive as que vieram zeradas), para que cada execução
+    consulte no TabNet apenas os meses que faltam ou que ainda podem mudar.
+    """
+
+    def __init__(self, caminho, fonte, municipio_ibge):
+        self.caminho = caminho
+        self.dados = {"fonte": fonte, "municipio": municipio_ibge, "atualizado_em": None, "meses": [], "valores": {}}
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as file:
+                self.dados = json.load(file)
+            if self.dados.get("municipio") != municipio_ibge:
+                raise ValueError(f"{caminho} pertence ao município {self.dados.get('municipio')}, não a {municipio_ibge}.")
+
+    def arquivos_pendentes(self, arquivos, janela_revisao=JANELA_REVISAO_MESES):
+        """Arquivos cujas competências não foram sincronizadas ou estão na janela de revisão."""
+        meses = sorted({mes_do_arquivo(a) for a in arquivos} - {None})
+        recentes = set(meses[-janela_revisao:]) if janela_revisao else set()
+        pendentes = (set(meses) - set(self.dados["meses"])) | recentes
+        return [a for a in arquivos if mes_do_arquivo(a) in pendentes]
+
+    def mesclar(self, valores, arquivos):
+        """Substitui as competências consultadas pelos valores recebidos."""
+        meses = {mes_do_arquivo(a) for a in arquivos} - {None}
+        for serie in self.dados["valores"].values():
+            for mes in meses:
+                serie.pop(mes, None)
+        for categoria, serie in valores.items():
+            destino = self.dados["valores"].setdefault(categoria, {})
+            destino.update({mes: valor for mes, valor in serie.items() if mes in meses})
+        self.dados["meses"] = sorted(set(self.dados["meses"]) | meses)
+        logger.info(f"{len(meses)} competências atualizadas em {self.caminho}.")
+
+    def salvar(self):
+        self.dados["atualizado_em"] = datetime.now().isoformat(timespec="seconds")
+        with open(self.caminho, 'w', encoding='utf-8') as file:
+            json.dump(self.dados, file, ensure_ascii=False, indent=4)
+
+    def linhas_anuais(self, nome_categoria, start_year, start_month, end_year, end_month, categorias=None, converter=None):
+        """
+        Soma os meses do período por ano, no mesmo formato da consulta com 'Ano processamento'.
+
+        Como no TabNet, anos zerados em todas as categorias e categorias zeradas
+        no período são omitidos, e valores zerados aparecem como '-'.
+        """
+        inicio = f"{start_year}-{start_month:02d}"
+        fim = f"{end_year}-{end_month:02d}"
+        converter = converter or (lambda valor: valor)
+
+        anuais = {}
+        for categoria, serie in self.dados["valores"].items():
+            if categorias is not None and categoria not in categorias:
+                continue
+            por_ano = {}
+            for mes, valor in serie.items():
+                if inicio <= mes <= fim:
+                    por_ano[mes[:4]] = round(por_ano.get(mes[:4], 0) + valor, 2)
+            anuais[categoria] = por_ano
+
+        anos = sorted({ano for por_ano in anuais.values() for ano, valor in por_ano.items() if valor})
+        ordem = categorias if categorias is not None else sorted(anuais)
+        linhas = []
+        for categoria in ordem:
+            por_ano = anuais.get(categoria, {})
+            total = round(sum(por_ano.values()), 2)
+            if not total:
+                continue
+            row_data = {nome_categoria: categoria}
+            for ano in anos:
+                valor = por_ano.get(ano, 0)
+                row_data[ano] = converter(valor) if valor else "-"
+            row_data["Total"] = converter(total)
+            linhas.append(row_data)
+        return linhas
@@ -0,0 +1,317 @@
+import json
+import logging
+import re
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+
+from extracao_tabela import extrair_linhas_html, extrair_tabela_html
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_SISMAC = 120
+NOMES_VIEWSTATE = ("javax.faces.ViewState", "jakarta.faces.ViewState")
+
+
+def valor_brl(texto):
+    """Converte '1.234.567,89' em 1234567.89 (None se vazio ou inválido)."""
+    texto = (texto or "").strip().replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+class _ParserPagina(HTMLParser):
+    """Lê formulários (com seus campos), links e itens de autocomplete de uma página JSF."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.forms = {}
+        self.links = []
+        self.itens = []
+        self.form_atual = None
+        self.link_atual = None
+        self.select_atual = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self.form_atual = attrs.get("id") or attrs.get("name")
+            self.forms[self.form_atual] = {"action": attrs.get("action"), "campos": []}
+        elif tag == "input" and self.form_atual is not None and attrs.get("name"):
+            tipo = (attrs.get("type") or "text").lower()
+            if tipo in ("submit", "button", "image", "reset"):
+                return
+            if tipo in ("checkbox", "radio") and "checked" not in attrs:
+                return
+            self.forms[self.form_atual]["campos"].append((attrs["name"], attrs.get("value") or ""))
+        elif tag == "select" and self.form_atual is not None:
+            self.select_atual = {"name": attrs.get("name"), "valor": None}
+        elif tag == "option" and self.select_atual is not None:
+            if self.select_atual["valor"] is None or "selected" in attrs:
+                self.select_atual["valor"] = attrs.get("value", "")
+        elif tag == "a":
+            self.link_atual = {"id": attrs.get("id"), "href": attrs.get("href"), "onclick": attrs.get("onclick") or "", "texto": []}
+        elif tag == "li" and "data-item-value" in attrs:
+            self.itens.append((attrs["data-item-value"], attrs.get("data-item-label") or ""))
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self.form_atual = None
+        elif tag == "select" and self.select_atual is not None:
+            if self.select_atual["name"] and self.select_atual["valor"] is not None:
+                self.forms[self.form_atual]["campos"].append((self.select_atual["name"], self.select_atual["valor"]))
+            self.select_atual = None
+        elif tag == "a" and self.link_atual is not None:
+            self.link_atual["texto"] = " ".join("".join(self.link_atual["texto"]).split())
+            self.links.append(self.link_atual)
+            self.link_atual = None
+
+    def handle_data(self, data):
+        if self.link_atual is not None:
+            self.link_atual["texto"].append(data)
+
+
+def _ler_pagina(html):
+    parser = _ParserPagina()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+class SismacClient:
+    """
+    Cliente HTTP das páginas PrimeFaces/JSF do SISMAC.
+
+    Mantém a sessão e o ViewState e envia as mesmas requisições parciais
+    (partial/ajax) que o navegador enviaria ao digitar no filtro, escolher
+    o município no autocomplete ou paginar uma datatable.
+    """
+
+    def __init__(self, url, session=None):
+        self.url = url
+        self.session = session or requests.Session()
+        self.session.headers.setdefault("User-Agent", "Mozilla/5.0")
+        self.pagina = None
+        self.viewstate = None
+        self.form_id = None
+        self.action = url
+        # Parâmetros de callback da última resposta parcial (ex.: totalRecords da datatable)
+        self.argumentos = {}
+        self.total_registros = {}
+
+    def carregar(self):
+        """Abre a página e guarda o formulário principal e o ViewState."""
+        logger.info(f"Carregando página do SISMAC: {self.url}")
+        response = self.session.get(self.url, timeout=TIMEOUT_SISMAC)
+        response.raise_for_status()
+        self.pagina = _ler_pagina(response.text)
+        for form_id, form in self.pagina.forms.items():
+            for nome, valor in form["campos"]:
+                if nome in NOMES_VIEWSTATE:
+                    self.form_id = form_id
+                    self.viewstate = (nome, valor)
+                    self.action = urljoin(self.url, form["action"] or self.url)
+                    break
+            if self.viewstate:
+                break
+        if self.viewstate is None:
+            raise RuntimeError(f"ViewState não encontrado em {self.url}.")
+        return self
+
+    def _campos_formulario(self):
+        campos = [(n, v) for n, v in self.pagina.forms[self.form_id]["campos"] if n not in NOMES_VIEWSTATE]
+        return campos + [self.viewstate]
+
+    def ajax(self, source, execute=None, render=None, parametros=None, evento=None):
+        """
+        Envia uma requisição parcial JSF e retorna {id do componente: conteúdo atualizado}.
+
+        Args:
+            source: Id do componente que dispara a requisição.
+            execute: Ids processados no servidor (padrão: o próprio source).
+            render: Ids a serem renderizados na resposta (padrão: o próprio source).
+            parametros: Parâmetros adicionais (sobrescrevem os campos do formulário).
+            evento: Nome do evento de comportamento (ex.: "itemSelect", "page", "filter").
+        """
+        if self.viewstate is None:
+            self.carregar()
+        parametros = dict(parametros or {})
+        base = {
+            "javax.faces.partial.ajax": "true",
+            "javax.faces.source": source,
+            "javax.faces.partial.execute": execute or source,
+            "javax.faces.partial.render": render or source,
+        }
+        if evento:
+            base["javax.faces.behavior.event"] = evento
+            base["javax.faces.partial.event"] = evento
+        base.update(parametros)
+        dados = [(n, v) for n, v in self._campos_formulario() if n not in base]
+        dados.extend(base.items())
+
+        response = self.session.post(
+            self.action,
+            data=dados,
+            headers={"Faces-Request": "partial/ajax", "X-Requested-With": "XMLHttpRequest", "Referer": self.url},
+            timeout=TIMEOUT_SISMAC,
+        )
+        response.raise_for_status()
+        return self._ler_resposta_parcial(response.text)
+
+    def _ler_resposta_parcial(self, xml):
+        raiz = ET.fromstring(xml.encode("utf-8") if isinstance(xml, str) else xml)
+        erro = raiz.find(".//error")
+        if erro is not None:
+            mensagem = erro.findtext("error-message") or erro.findtext("error-name") or "erro desconhecido"
+            raise RuntimeError(f"Erro na requisição JSF: {mensagem}")
+        if raiz.find(".//redirect") is not None:
+            raise RuntimeError("Sessão do SISMAC expirada (redirect na resposta parcial).")
+
+        self.argumentos = {}
+        for extensao in raiz.iter("extension"):
+            if extensao.get("type") == "args" and extensao.text:
+                try:
+                    self.argumentos.update(json.loads(extensao.text))
+                except ValueError:
+                    logger.warning(f"Parâmetros de callback inválidos na resposta parcial: {extensao.text[:200]}")
+
+        atualizacoes = {}
+        for update in raiz.iter("update"):
+            id_componente = update.get("id") or ""
+            conteudo = update.text or ""
+            if any(nome in id_componente for nome in NOMES_VIEWSTATE):
+                self.viewstate = (self.viewstate[0], conteudo)
+            else:
+                atualizacoes[id_componente] = conteudo
+        return atualizacoes
+
+    def acionar_link(self, texto):
+        """Aciona um link/commandLink pelo texto visível, como um clique no navegador."""
+        for link in self.pagina.links:
+            if link["texto"] != texto:
+                continue
+            chamada = re.search(r"PrimeFaces\.ab\(\{(.*?)\}\)", link["onclick"])
+            if chamada:
+                opcoes = dict(re.findall(r'(\w+):\s*"([^"]*)"', chamada.group(1)))
+                source = opcoes.get("s") or link["id"]
+                return self.ajax(source, execute=opcoes.get("p", "@all"), render=opcoes.get("u", "@form"), parametros={source: source})
+            if link["href"] and not link["href"].startswith("#"):
+                self.url = urljoin(self.url, link["href"])
+                self.carregar()
+                return {}
+            return {}
+        raise KeyError(f"Link '{texto}' não encontrado na página.")
+
+    def autocompletar(self, componente, texto):
+        """Consulta as sugestões do p:autoComplete e retorna [(valor, rótulo)]."""
+        atualizacoes = self.ajax(componente, parametros={
+            f"{componente}_query": texto,
+            f"{componente}_input": texto,
+        })
+        itens = []
+        for conteudo in atualizacoes.values():
+            itens.extend(_ler_pagina(conteudo).itens)
+        return itens
+
+    def selecionar_autocomplete(self, componente, texto, render="@form"):
+        """Escolhe a primeira sugestão do autocomplete para o texto (o ENTER no navegador)."""
+        itens = self.autocompletar(componente, texto)
+        if not itens:
+            raise KeyError(f"Nenhuma sugestão para '{texto}' em {componente}.")
+        valor, rotulo = itens[0]
+        logger.info(f"Selecionando '{rotulo or valor}' em {componente}.")
+        atualizacoes = self.ajax(componente, render=render, evento="itemSelect", parametros={
+            f"{componente}_input": rotulo or texto,
+            f"{componente}_hinput": valor,
+            f"{componente}_itemSelect": valor,
+        })
+        # O valor escolhido passa a fazer parte do formulário nas próximas requisições
+        campos = self.pagina.forms[self.form_id]["campos"]
+        campos[:] = [(n, v) for n, v in campos if n not in (f"{componente}_input", f"{componente}_hinput")]
+        campos.extend([(f"{componente}_input", rotulo or texto), (f"{componente}_hinput", valor)])
+        return atualizacoes
+
+    def paginar(self, tabela, first=0, rows=1000, filtros=None):
+        """
+        Busca uma página da datatable (mesmo request do paginador/filtro do PrimeFaces).
+
+        Args:
+            tabela: Id da datatable (ex.: "tetoFinanceiroBrasil").
+            first: Índice da primeira linha.
+            rows: Quantidade de linhas da página.
+            filtros: {id da coluna: valor} para os filtros de coluna.
+
+        Returns:
+            Lista de linhas no formato de extracao_tabela (apenas linhas com data-ri).
+        """
+        parametros = {
+            tabela: tabela,
+            f"{tabela}_pagination": "true",
+            f"{tabela}_first": str(first),
+            f"{tabela}_rows": str(rows),
+            f"{tabela}_skipChildren": "true",
+            f"{tabela}_encodeFeature": "true",
+        }
+        for coluna, valor in (filtros or {}).items():
+            parametros[f"{tabela}:{coluna}:filter"] = valor
+        if filtros:
+            parametros[f"{tabela}_filtering"] = "true"
+        atualizacoes = self.ajax(tabela, parametros=parametros)
+        if "totalRecords" in self.argumentos:
+            self.total_registros[tabela] = int(self.argumentos["totalRecords"])
+        fragmento = atualizacoes.get(tabela, "")
+        linhas = extrair_linhas_html(fragmento)
+        if not linhas and "<table" in fragmento:
+            linhas = (extrair_tabela_html(fragmento) or {"linhas": []})["linhas"]
+        return [linha for linha in linhas if linha["data_ri"] is not None]
+
+    def linhas(self, tabela, tamanho_pagina=1000, filtros=None, num_colunas=None):
+        """
+        Percorre todas as páginas da datatable e retorna as células de cada linha.
+
+        O servidor pode limitar o rows abaixo de `tamanho_pagina`, então a leitura
+        avança pelas linhas efetivamente recebidas e só termina em uma página vazia
+        ou ao alcançar o totalRecords informado pela datatable. Levanta RuntimeError
+        se as linhas lidas não baterem com esse total.
+        """
+        resultado = []
+        first = 0
+        self.total_registros.pop(tabela, None)
+        while True:
+            pagina = self.paginar(tabela, first=first, rows=tamanho_pagina, filtros=filtros)
+            if pagina and str(pagina[0]["data_ri"]).isdigit() and int(pagina[0]["data_ri"]) != first:
+                raise RuntimeError(f"{tabela}: página iniciada na linha {pagina[0]['data_ri']}, esperada {first}.")
+            resultado.extend(
+                linha["celulas"] for linha in pagina
+                if num_colunas is None or len(linha["celulas"]) == num_colunas
+            )
+            first += len(pagina)
+            total = self.total_registros.get(tabela)
+            logger.info(f"{tabela}: {first} linhas lidas" + (f" de {total}." if total is not None else "."))
+            if not pagina or (total is not None and first >= total):
+                break
+        if total is not None and first != total:
+            raise RuntimeError(f"{tabela}: {first} linhas lidas, mas a datatable informa {total}.")
+        return resultado
+
+    def ler_tabela(self, tabela, colunas, tipos=None, tamanho_pagina=1000, filtros=None):
+        """
+        Lê a datatable inteira como dicionários tipados.
+
+        Args:
+            colunas: Nomes das colunas, na ordem das células.
+            tipos: {nome da coluna: função de conversão} (ex.: {"Valor": valor_brl}).
+        """
+        tipos = tipos or {}
+        registros = []
+        for celulas in self.linhas(tabela, tamanho_pagina, filtros, num_colunas=len(colunas)):
+            registro = {}
+            for coluna, texto in zip(colunas, celulas):
+                converter = tipos.get(coluna)
+                registro[coluna] = converter(texto) if converter else texto
+            registros.append(registro)
+        return registros
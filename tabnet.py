@@ -0,0 +1,304 @@
+import logging
+import re
+import unicodedata
+from html.parser import HTMLParser
+from urllib.parse import urlencode, urljoin
+
+import requests
+
+from extracao_tabela import extrair_tabela_html
+
+logger = logging.getLogger(__name__)
+
+# O TabNet trabalha em ISO-8859-1 tanto nas páginas quanto no corpo do POST
+ENCODING_TABNET = "latin-1"
+TIMEOUT_TABNET = 120
+
+
+def normalizar_texto(texto):
+    """Remove acentos, sublinhados e espaços extras para comparar rótulos do TabNet."""
+    texto = unicodedata.normalize("NFKD", texto)
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.replace("_", " ").lower().split())
+
+
+class _ParserFormulario(HTMLParser):
+    """Lê o formulário do .def (selects, inputs e action) como um navegador faria."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.action = None
+        self.selects = []
+        self.inputs = []
+        self.select_atual = None
+        self.opcao_atual = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form" and self.action is None:
+            self.action = attrs.get("action")
+        elif tag == "select":
+            self.select_atual = {
+                "name": attrs.get("name"),
+                "id": attrs.get("id"),
+                "multiple": "multiple" in attrs,
+                "opcoes": [],
+            }
+        elif tag == "option" and self.select_atual is not None:
+            self._fechar_opcao()
+            self.opcao_atual = {
+                "value": attrs.get("value"),
+                "texto": [],
+                "selected": "selected" in attrs,
+            }
+        elif tag == "input":
+            self.inputs.append({
+                "type": (attrs.get("type") or "text").lower(),
+                "name": attrs.get("name"),
+                "value": attrs.get("value") or "",
+                "checked": "checked" in attrs,
+            })
+
+    def handle_endtag(self, tag):
+        if tag == "option":
+            self._fechar_opcao()
+        elif tag == "select" and self.select_atual is not None:
+            self._fechar_opcao()
+            self.selects.append(self.select_atual)
+            self.select_atual = None
+
+    def handle_data(self, data):
+        if self.opcao_atual is not None:
+            self.opcao_atual["texto"].append(data)
+
+    def _fechar_opcao(self):
+        if self.opcao_atual is None:
+            return
+        opcao = self.opcao_atual
+        opcao["texto"] = " ".join("".join(opcao["texto"]).split())
+        if opcao["value"] is None:
+            opcao["value"] = opcao["texto"]
+        self.select_atual["opcoes"].append(opcao)
+        self.opcao_atual = None
+
+
+class FormularioTabNet:
+    """Formulário de um .def do TabNet (Linha, Coluna, Incremento, Arquivos e seleções)."""
+
+    def __init__(self, url_def, html):
+        parser = _ParserFormulario()
+        parser.feed(html)
+        parser.close()
+        self.url_def = url_def
+        self.action = urljoin(url_def, parser.action or "")
+        self.selects = {s["name"]: s for s in parser.selects if s["name"]}
+        self.inputs = [i for i in parser.inputs if i["name"]]
+
+    def select_por_id(self, id_select):
+        for select in self.selects.values():
+            if select["id"] == id_select:
+                return select
+        raise KeyError(f"Campo '{id_select}' não encontrado no formulário do TabNet.")
+
+    def select_de_selecao(self, rotulo):
+        """Localiza o select de seleção (SMunicípio, SComplexidade...) pelo rótulo."""
+        alvo = normalizar_texto(rotulo)
+        for nome, select in self.selects.items():
+            if nome.startswith("S") and normalizar_texto(nome[1:]) == alvo:
+                return select
+        raise KeyError(f"Seleção '{rotulo}' não encontrada no formulário do TabNet.")
+
+    def valor_por_texto(self, id_select, texto):
+        """Valor da opção cujo texto visível é igual ao informado (como select_by_visible_text)."""
+        alvo = normalizar_texto(texto)
+        for opcao in self.select_por_id(id_select)["opcoes"]:
+            if normalizar_texto(opcao["texto"]) == alvo:
+                return opcao["value"]
+        raise KeyError(f"Opção '{texto}' não encontrada no campo '{id_select}'.")
+
+    def arquivos_disponiveis(self):
+        return [opcao["value"] for opcao in self.select_por_id("A")["opcoes"]]
+
+    def opcoes_selecao(self, rotulo):
+        """Opções (valor, texto) de uma seleção, sem a opção 'Todas as categorias'."""
+        return [
+            (opcao["value"], opcao["texto"])
+            for opcao in self.select_de_selecao(rotulo)["opcoes"]
+            if opcao["value"] != "TODAS_AS_CATEGORIAS__"
+        ]
+
+    def opcao_municipio(self, municipio_ibge):
+        """Valor da opção de município cujo texto contém o código IBGE (6 dígitos)."""
+        for opcao in self.select_de_selecao("Município")["opcoes"]:
+            if municipio_ibge in opcao["texto"]:
+                return opcao["value"]
+        return None
+
+    def campos_padrao(self):
+        """Campos enviados por um navegador sem nenhuma interação com o formulário."""
+        campos = []
+        for entrada in self.inputs:
+            if entrada["type"] in ("submit", "button", "image", "reset"):
+                continue
+            if entrada["type"] in ("checkbox", "radio") and not entrada["checked"]:
+                continue
+            campos.append((entrada["name"], entrada["value"]))
+        for nome, select in self.selects.items():
+            selecionadas = [o["value"] for o in select["opcoes"] if o["selected"]]
+            if not selecionadas and not select["multiple"] and select["opcoes"]:
+                selecionadas = [select["opcoes"][0]["value"]]
+            campos.extend((nome, valor) for valor in selecionadas)
+        return campos
+
+
+def selecionar_arquivos(disponiveis, start_year, start_month, end_year, end_month):
+    """Escolhe os .dbf do período, com a mesma regra usada no dropdown 'Arquivos'."""
+    selecionados = []
+    for year in range(start_year, end_year + 1):
+        start = start_month if year == start_year else 1
+        end = end_month if year == end_year else 12
+        year_suffix = str(year)[-2:]
+        available_options = [value for value in disponiveis if year_suffix in value]
+        prefixes_for_year = sorted(set(value[:4] for value in available_options))
+        for prefix in prefixes_for_year:
+            for month in range(start, end + 1):
+                value = f'{prefix}{year_suffix}{month:02d}.dbf'
+                if value in available_options:
+                    selecionados.append(value)
+    return selecionados
+
+
+class TabNetClient:
+    """Cliente HTTP do TabNet: lê o .def e envia a consulta direto ao tabcgi.exe."""
+
+    def __init__(self, url_def, session=None):
+        self.url_def = url_def
+        self.session = session or requests.Session()
+        self._formulario = None
+
+    def formulario(self):
+        if self._formulario is None:
+            logger.info(f"Carregando formulário do TabNet: {self.url_def}")
+            response = self.session.get(self.url_def, timeout=TIMEOUT_TABNET)
+            response.raise_for_status()
+            response.encoding = ENCODING_TABNET
+            self._formulario = FormularioTabNet(self.url_def, response.text)
+        return self._formulario
+
+    def consultar(self, linha, coluna, arquivos, incremento=None, selecoes=None):
+        """
+        Executa uma consulta no tabcgi.exe e retorna a tabela 'tabdados'.
+
+        Args:
+            linha: Texto visível da opção do campo Linha (ex.: "Complexidade").
+            coluna: Texto visível da opção do campo Coluna (ex.: "Ano processamento").
+            arquivos: Lista de .dbf do campo Arquivos.
+            incremento: Texto visível do Incremento; se None, usa o padrão do .def.
+            selecoes: Dicionário {rótulo da seleção: [valores das opções]}.
+
+        Returns:
+            A tabela no formato de extracao_tabela, ou None se não houver tabela.
+        """
+        formulario = self.formulario()
+        valores = {
+            formulario.select_por_id("L")["name"]: [formulario.valor_por_texto("L", linha)],
+            formulario.select_por_id("C")["name"]: [formulario.valor_por_texto("C", coluna)],
+            formulario.select_por_id("A")["name"]: list(arquivos),
+        }
+        if incremento is not None:
+            valores[formulario.select_por_id("I")["name"]] = [formulario.valor_por_texto("I", incremento)]
+        for rotulo, opcoes in (selecoes or {}).items():
+            valores[formulario.select_de_selecao(rotulo)["name"]] = list(opcoes)
+
+        campos = [(nome, valor) for nome, valor in formulario.campos_padrao() if nome not in valores]
+        for nome, lista in valores.items():
+            campos.extend((nome, valor) for valor in lista)
+        campos.append(("mostre", "Mostra"))
+
+        corpo = urlencode(campos, encoding=ENCODING_TABNET)
+        logger.info(f"Consultando TabNet: {linha} x {coluna} ({len(arquivos)} arquivos)")
+        response = self.session.post(
+            formulario.action,
+            data=corpo,
+            headers={"Content-Type": "application/x-www-form-urlencoded", "Referer": self.url_def},
+            timeout=TIMEOUT_TABNET,
+        )
+        response.raise_for_status()
+        response.encoding = ENCODING_TABNET
+        tabela = extrair_tabela_html(response.text, classe="tabdados")
+        if tabela is None and re.search(r"nenhum registro", response.text, re.IGNORECASE):
+            logger.warning("TabNet não encontrou registros para a consulta.")
+        return tabela
+
+
+def cabecalhos_tabela(tabela):
+    """Última linha do thead, que é a que nomeia as colunas de dados."""
+    return tabela["cabecalhos"][-1] if tabela and tabela["cabecalhos"] else []
+
+
+def consultar_uf_por_municipio(client, rotulo_categoria, categorias, coluna, arquivos, incremento=None):
+    """
+    Consulta a UF inteira com Município na Linha, uma vez por categoria.
+
+    O TabNet só cruza duas dimensões por consulta; a terceira (Complexidade,
+    Grupo procedimento...) vira uma seleção, com uma consulta por categoria.
+
+    Args:
+        client: TabNetClient do .def da UF.
+        rotulo_categoria: Rótulo da seleção usada como categoria (ex.: "Complexidade").
+        categorias: Textos das categorias desejadas; se None, usa todas as opções da seleção.
+        coluna: Texto visível do campo Coluna (ex.: "Ano processamento").
+        arquivos: Lista de .dbf do campo Arquivos.
+        incremento: Texto visível do Incremento; se None, usa o padrão do .def.
+
+    Returns:
+        Dicionário {ibge (6 dígitos): {categoria: {coluna: texto}}}.
+    """
+    opcoes = client.formulario().opcoes_selecao(rotulo_categoria)
+    if categorias is not None:
+        alvos = {normalizar_texto(c): c for c in categorias}
+        opcoes = [(valor, alvos[normalizar_texto(texto)]) for valor, texto in opcoes if normalizar_texto(texto) in alvos]
+
+    por_municipio = {}
+    for valor, categoria in opcoes:
+        tabela = client.consultar("Município", coluna, arquivos, incremento=incremento, selecoes={rotulo_categoria: [valor]})
+        if tabela is None:
+            logger.info(f"Nenhum dado para {rotulo_categoria} '{categoria}'.")
+            continue
+        headers = cabecalhos_tabela(tabela)
+        for linha in tabela["linhas"]:
+            cells = linha["celulas"]
+            if len(cells) != len(headers) or not cells:
+                continue
+            codigo = cells[0].split(" ", 1)[0]
+            if not (codigo.isdigit() and len(codigo) == 6):
+                continue  # Total, 'Município ignorado' etc.
+            por_municipio.setdefault(codigo, {})[categoria] = dict(zip(headers[1:], cells[1:]))
+    logger.info(f"{len(por_municipio)} municípios encontrados na UF.")
+    return por_municipio
+
+
+def montar_linhas_municipio(categorias, nome_categoria, converter=None):
+    """
+    Monta as linhas de um município no mesmo formato da consulta individual.
+
+    Como na consulta por município, categorias zeradas e colunas sem nenhum
+    valor ('-') para o município são omitidas.
+    """
+    colunas = []
+    for valores in categorias.values():
+        for coluna in valores:
+            if coluna not in colunas:
+                colunas.append(coluna)
+    colunas = [c for c in colunas if any(valores.get(c, "-") != "-" for valores in categorias.values())]
+
+    linhas = []
+    for categoria, valores in categorias.items():
+        if all(valores.get(c, "-") == "-" for c in colunas):
+            continue
+        row_data = {nome_categoria: categoria}
+        for coluna in colunas:
+            texto = valores.get(coluna, "-")
+            row_data[coluna] = converter(texto) if converter else texto
+        linhas.append(row_data)
+    return linhas
@@ -6,6 +6,10 @@ import google.generativeai as genai
 import logging
 import sys
 
+from executor_llm import gerar_varios
+import narrativa
+from resumo_dados import INSTRUCAO_CORES, montar_resumo, series_evolucao_mac
+
 # Configuração do logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -25,18 +29,21 @@ def ler_dados_json(caminho):
         logging.error(f"Erro: Formato JSON inválido em '{caminho}'")
         return None
 
-# Lê os arquivos JSON (certifique-se de que os nomes dos arquivos estão corretos)
-evolucao_mac = ler_dados_json('evolucao_mac.json')
-pt_mac_res = ler_dados_json('pt_mac_res.json')
+# Arquivos usados e arquivo gerado por este script
+ARQUIVOS_ENTRADA = ('evolucao_mac.json', 'pt_mac_res.json')
+ARQUIVO_SAIDA = 'analise_mac_municipio.txt'
 
-# Verifica se os dados foram carregados corretamente
-if evolucao_mac is None or pt_mac_res is None:
-    logging.error("Erro ao carregar os arquivos JSON. Encerrando a execução.")
-    exit()
+def carregar_dados():
+    """Lê evolucao_mac.json e pt_mac_res.json; retorna None se algum não puder ser lido."""
+    evolucao_mac, pt_mac_res = (ler_dados_json(caminho) for caminho in ARQUIVOS_ENTRADA)
 
-# --- Configuração do Modelo Gemini ---
-genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+    # Verifica se os dados foram carregados corretamente
+    if evolucao_mac is None or pt_mac_res is None:
+        logging.error("Erro ao carregar os arquivos JSON.")
+        return None
+    return {"evolucao_mac": evolucao_mac, "pt_mac_res": pt_mac_res}
 
+# --- Configuração do Modelo Gemini ---
 generation_config = {
   "temperature": 0.2,
   "top_p": 0.95,
@@ -97,7 +104,11 @@ As portarias listadas abaixo tiveram impacto significativo na evolução do Teto
 """
     return markdown_completo
 
-def main(municipio):
+def montar_prompts(municipio, dados):
+    """Prompts do script ({nome: prompt}); independentes entre si, podem ser enviados juntos."""
+    # Resumo estatístico dos dados, no lugar do JSON completo
+    resumo_dados = montar_resumo({"Evolução do Teto MAC (R$)": series_evolucao_mac(dados["evolucao_mac"])})
+
     # --- Prompt para Análise Completa (MODIFICADO para Markdown) ---
     prompt_analise_completa = f"""
     # Análise da Evolução do Teto Financeiro MAC e Portarias para {municipio}
@@ -123,26 +134,24 @@ def main(municipio):
     - **A conclusão deve, obrigatoriamente, iniciar com '## Conclusão'**.
     - **Utilize formatação Markdown para melhorar a legibilidade do texto (negrito, itálico, etc.).**
     - **Quando for se referir a valores monetários, use sempre R\\$ e não R$ para evitar erros de formatação.**
-    - **Use destaques e cores: Colored text and background colors for text, using the syntax :color[text to be colored] and :color-background[text to be colored], respectively. color must be replaced with any of the following supported colors: blue, green, orange, red, violet, gray/grey, rainbow, or primary. For example, you can use :orange[your text here] or :blue-background[your text here]. If you use "primary" for color, Streamlit will use the default primary accent color unless you set the theme.primaryColor configuration option.***
+    - **{INSTRUCAO_CORES}**
 
     ## Dados:
 
-    **Evolução do Teto MAC:**
-    ```json
-    {json.dumps(evolucao_mac, ensure_ascii=False)}
+    {resumo_dados}
 
     Gere a análise da tendência e a conclusão, em Markdown, com parágrafos numerados e justificada, conforme as instruções acima. Certifique-se de que a conclusão inicie com '## Conclusão'.
     """
 
-    # --- Execução da Análise ---
-    logging.info("Iniciando a análise com o Gemini 1.5 pro...")
-
-    response = model.generate_content(prompt_analise_completa)
+    return {"analise": prompt_analise_completa}
 
-    logging.info("Análise concluída.")
+def montar_textos(municipio, dados):
+    """Mesmos textos de montar_prompts, montados por regras a partir das estatísticas (sem LLM)."""
+    return narrativa.textos_mac(municipio, series_evolucao_mac(dados["evolucao_mac"]), dados["pt_mac_res"])
 
-    # --- Limpeza da Resposta ---
-    analise_tendencia_conclusao = response.text
+def salvar_analise(municipio, dados, respostas):
+    """Monta o Markdown a partir das respostas ({nome do prompt: texto}) e grava ARQUIVO_SAIDA."""
+    analise_tendencia_conclusao = respostas["analise"]
 
     # --- Dividir a resposta em análise da tendência e conclusão ---
     if "## Conclusão" in analise_tendencia_conclusao:
@@ -167,16 +176,34 @@ def main(municipio):
                 analise_tendencia += f"<p style='text-align: justify;'>{paragrafo.strip()}</p>"  # Adiciona o estilo aqui
 
     # --- Gerar a tabela Markdown ---
-    tabela_markdown = gerar_tabela_markdown(pt_mac_res)
+    tabela_markdown = gerar_tabela_markdown(dados["pt_mac_res"])
 
     # --- Gerar o Markdown completo da análise ---
     markdown_completo = gerar_markdown_analise(municipio, tabela_markdown,  analise_tendencia_texto, conclusao)
 
     # --- Salvar o Resultado em um Arquivo TXT ---
-    nome_arquivo_saida = 'analise_mac_municipio.txt'
-    with open(nome_arquivo_saida, 'w', encoding='utf-8') as f:
+    with open(ARQUIVO_SAIDA, 'w', encoding='utf-8') as f:
         f.write(markdown_completo)
 
+def main(municipio):
+    dados = carregar_dados()
+    if dados is None:
+        logging.error("Encerrando a execução.")
+        exit()
+
+    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+
+    # --- Execução da Análise ---
+    logging.info("Iniciando a análise com o Gemini 1.5 pro...")
+    prompts = montar_prompts(municipio, dados)
+    respostas = dict(zip(prompts, gerar_varios(model, list(prompts.values()))))
+    for resposta in respostas.values():
+        if isinstance(resposta, Exception):
+            raise resposta
+    logging.info("Análise concluída.")
+
+    salvar_analise(municipio, dados, {nome: resposta.text for nome, resposta in respostas.items()})
+
 if __name__ == "__main__":
     municipio = sys.argv[1]
     main(municipio)
\ No newline at end of file
@@ -5,6 +5,10 @@ import google.generativeai as genai
 import logging
 import sys
 
+from executor_llm import gerar_varios
+import narrativa
+from resumo_dados import INSTRUCAO_CORES, montar_resumo, series_evolucao_mac, series_tabela
+
 # Configuração do logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,23 +37,21 @@ def ler_dados_json(caminho):
         logging.error(e)
         return None
 
-# Lê os arquivos JSON
-evolucao_mac = ler_dados_json('evolucao_mac.json')
-sia = ler_dados_json('SIA.json')
-
-# Verifica se os dados foram carregados corretamente
-if evolucao_mac is None or sia is None:
-    logging.error("Erro ao carregar os arquivos JSON. Encerrando a execução.")
-    exit()
+# Arquivos usados e arquivo gerado por este script
+ARQUIVOS_ENTRADA = ('evolucao_mac.json', 'SIA.json')
+ARQUIVO_SAIDA = 'analise_mac_sia.txt'
 
-# --- Configuração do Modelo Gemini ---
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if GOOGLE_API_KEY is None:
-    logging.error("Variável de ambiente GOOGLE_API_KEY não encontrada. Certifique-se de que o arquivo .env está configurado corretamente.")
-    exit()
+def carregar_dados():
+    """Lê evolucao_mac.json e SIA.json; retorna None se algum não puder ser lido."""
+    evolucao_mac, sia = (ler_dados_json(caminho) for caminho in ARQUIVOS_ENTRADA)
 
-genai.configure(api_key=GOOGLE_API_KEY)
+    # Verifica se os dados foram carregados corretamente
+    if evolucao_mac is None or sia is None:
+        logging.error("Erro ao carregar os arquivos JSON.")
+        return None
+    return {"evolucao_mac": evolucao_mac, "sia": sia}
 
+# --- Configuração do Modelo Gemini ---
 generation_config = {
   "temperature": 0.2,
   "top_p": 0.95,
@@ -77,7 +79,18 @@ def gerar_markdown_analise(municipio, analise_correlacao, conclusao):
 """
     return markdown_completo
 
-def main(municipio):
+def montar_prompts(municipio, dados):
+    """Prompts do script ({nome: prompt}); independentes entre si, podem ser enviados juntos."""
+    # Resumo estatístico dos dados, calculado uma vez e usado nos dois prompts
+    series_mac = series_evolucao_mac(dados["evolucao_mac"])
+    resumo_dados = montar_resumo(
+        {
+            "Evolução do Teto MAC (R$)": series_mac,
+            "Produção Ambulatorial (SIA), quantidade aprovada": series_tabela(dados["sia"], "Complexidade"),
+        },
+        referencia=series_mac.get("Teto Financeiro MAC"),
+    )
+
     # --- Prompt para Análise de Correlação (Modificado para Ambulatorial - SIA) ---
     prompt_analise_correlacao = f"""
     ## Análise de Correlação entre Produção Ambulatorial (SIA) e Teto Financeiro MAC para {municipio}
@@ -102,17 +115,11 @@ def main(municipio):
     - **Cite números e dados específicos da análise para embasar os argumentos. Mencione a variação percentual do Teto MAC e da produção ambulatorial em determinados períodos.**
     - **Explore os fatores que contribuem para a complexidade do sistema de saúde, como o envelhecimento da população, o aumento da prevalência de doenças crônicas e a incorporação de novas tecnologias.**
     - **Mencione a importância da eficiência na gestão dos recursos, como forma de otimizar o uso do financiamento disponível.**
-    - :red[**Use destaques e cores:**] :blue[Colored text and background colors for text, using the syntax :color[text to be colored] and :color-background[text to be colored], respectively.] :green[color must be replaced with any of the following supported colors: blue, green, orange, red, violet, gray/grey, rainbow, or primary.] :violet[For example, you can use :orange[your text here] or :blue-background[your text here].] :gray[If you use "primary" for color, Streamlit will use the default primary accent color unless you set the theme.primaryColor configuration option.]
+    - **{INSTRUCAO_CORES}**
 
     ## Dados:
 
-    **Evolução do Teto MAC:**
-    ```json
-    {json.dumps(evolucao_mac, ensure_ascii=False)}
-
-    Produção Ambulatorial (SIA):
-
-    {json.dumps(sia, ensure_ascii=False)}
+    {resumo_dados}
 
     Gere a análise, em Markdown, com parágrafos e justificada, conforme as instruções acima.
     """
@@ -138,51 +145,61 @@ def main(municipio):
     - **Cite números e dados específicos da análise para embasar os argumentos. Mencione a variação percentual do Teto MAC e da produção ambulatorial em determinados períodos.**
     - **Explore os fatores que contribuem para a complexidade do sistema de saúde, como o envelhecimento da população, o aumento da prevalência de doenças crônicas e a incorporação de novas tecnologias.**
     - **Mencione a importância da eficiência na gestão dos recursos, como forma de otimizar o uso do financiamento disponível.**
-    - :red[**Use destaques e cores:**] :blue[Colored text and background colors for text, using the syntax :color[text to be colored] and :color-background[text to be colored], respectively.] :green[color must be replaced with any of the following supported colors: blue, green, orange, red, violet, gray/grey, rainbow, or primary.] :violet[For example, you can use :orange[your text here] or :blue-background[your text here].] :gray[If you use "primary" for color, Streamlit will use the default primary accent color unless you set the theme.primaryColor configuration option.]
+    - **{INSTRUCAO_CORES}**
 
 
     Reforce a necessidade de aumento do Teto MAC e justifique a solicitação de ajuste para o próximo ano.
 
-    :red[Use destaques e cores:] :blue[Colored text and background colors for text, using the syntax :color[text to be colored] and :color-background[text to be colored], respectively.] :green[color must be replaced with any of the following supported colors: blue, green, orange, red, violet, gray/grey, rainbow, or primary.] :violet[For example, you can use :orange[your text here] or :blue-background[your text here].] :gray[If you use "primary" for color, Streamlit will use the default primary accent color unless you set the theme.primaryColor configuration option.]
     Dados:
-    Evolução do Teto MAC:
-
-    {json.dumps(evolucao_mac, ensure_ascii=False)}
-
-    Produção Ambulatorial (SIA):
-
-    {json.dumps(sia, ensure_ascii=False)}
+    {resumo_dados}
 
     Gere a conclusão, em Markdown, com parágrafos e justificada, conforme as instruções acima.
     """
     
-    # --- Execução da Análise de Correlação ---
-    logging.info("Iniciando a análise de correlação com o Gemini 1.5 flash...")
-    response_correlacao = model.generate_content(prompt_analise_correlacao)
-    analise_correlacao_texto = response_correlacao.text
-    logging.info("Análise de correlação concluída.")
+    return {"correlacao": prompt_analise_correlacao, "conclusao": prompt_conclusao}
 
-    # --- Execução da Conclusão ---
-    logging.info("Iniciando a geração da conclusão com o Gemini 1.5 flash...")
-    response_conclusao = model.generate_content(prompt_conclusao)
-    conclusao_texto = response_conclusao.text
-    logging.info("Conclusão gerada.")
+def montar_textos(municipio, dados):
+    """Mesmos textos de montar_prompts, montados por regras a partir das estatísticas (sem LLM)."""
+    return narrativa.textos_producao(municipio, series_evolucao_mac(dados["evolucao_mac"]),
+                                     series_tabela(dados["sia"], "Complexidade"), narrativa.PRODUCOES["sia"])
 
-    # --- Formatação da Análise de Correlação (Markdown) ---
-    analise_correlacao = analise_correlacao_texto
-
-    # --- Formatação da Conclusão (Markdown) ---
-    conclusao = conclusao_texto
+def salvar_analise(municipio, dados, respostas):
+    """Monta o Markdown a partir das respostas ({nome do prompt: texto}) e grava ARQUIVO_SAIDA."""
+    # --- Formatação da Análise de Correlação e da Conclusão (Markdown) ---
+    analise_correlacao = respostas["correlacao"]
+    conclusao = respostas["conclusao"]
 
     # --- Gerar o Markdown completo da análise ---
     markdown_completo = gerar_markdown_analise(municipio, analise_correlacao, conclusao)
 
     # --- Salvar o Resultado em um Arquivo Markdown ---
-    nome_arquivo_saida = 'analise_mac_sia.txt'
-    with open(nome_arquivo_saida, 'w', encoding='utf-8') as f:
+    with open(ARQUIVO_SAIDA, 'w', encoding='utf-8') as f:
         f.write(markdown_completo)
 
-    logging.info(f"Análise salva em {nome_arquivo_saida}")
+    logging.info(f"Análise salva em {ARQUIVO_SAIDA}")
+
+def main(municipio):
+    dados = carregar_dados()
+    if dados is None:
+        logging.error("Encerrando a execução.")
+        exit()
+
+    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+    if GOOGLE_API_KEY is None:
+        logging.error("Variável de ambiente GOOGLE_API_KEY não encontrada. Certifique-se de que o arquivo .env está configurado corretamente.")
+        exit()
+    genai.configure(api_key=GOOGLE_API_KEY)
+
+    # --- Execução da Análise de Correlação e da Conclusão, em paralelo ---
+    logging.info("Iniciando a análise de correlação e a conclusão com o Gemini 1.5 flash...")
+    prompts = montar_prompts(municipio, dados)
+    respostas = dict(zip(prompts, gerar_varios(model, list(prompts.values()))))
+    for resposta in respostas.values():
+        if isinstance(resposta, Exception):
+            raise resposta
+    logging.info("Análise de correlação e conclusão geradas.")
+
+    salvar_analise(municipio, dados, {nome: resposta.text for nome, resposta in respostas.items()})
 
 if __name__ == "__main__":
     municipio = sys.argv[1]
@@ -0,0 +1,95 @@
+import argparse
+import os
+import logging
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+
+from executor_llm import executor_padrao
+import narrativa
+import txt_analise_mac
+import txt_analise_mac_sia
+import txt_analise_mac_sih
+
+# Configuração do logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Carrega as variáveis de ambiente do arquivo .env
+load_dotenv()
+
+# Scripts de texto do relatório, cada um com seu modelo e arquivo de saída
+SCRIPTS_TEXTO = [txt_analise_mac, txt_analise_mac_sih, txt_analise_mac_sia]
+
+
+def gerar_relatorio(municipio, scripts=SCRIPTS_TEXTO, sem_llm=False, polir=False):
+    """
+    Gera os textos de análise dos scripts informados com um único lote de chamadas.
+
+    Os prompts de todos os scripts são montados antes e enviados juntos ao
+    executor_llm (mesma cota e mesmo limite de concorrência), cada um com o
+    modelo do seu script; em seguida cada script grava o seu arquivo.
+    Um script cujos dados não puderam ser lidos ou cuja chamada falhou não
+    impede os demais.
+
+    Args:
+        sem_llm: Monta os textos por regras (narrativa), sem chamar o modelo.
+        polir: Com sem_llm, envia os textos montados ao modelo apenas para revisão do texto.
+
+    Returns:
+        Lista dos arquivos que não foram gerados.
+    """
+    chamadas = []
+    carregados = []
+    falhas = []
+    for script in scripts:
+        dados = script.carregar_dados()
+        if dados is None:
+            falhas.append(script.ARQUIVO_SAIDA)
+            continue
+        if not sem_llm:
+            prompts = script.montar_prompts(municipio, dados)
+        elif polir:
+            prompts = {nome: narrativa.prompt_polimento(texto) for nome, texto in script.montar_textos(municipio, dados).items()}
+        else:
+            script.salvar_analise(municipio, dados, script.montar_textos(municipio, dados))
+            continue
+        carregados.append((script, dados, list(prompts)))
+        chamadas += [(script.model, prompt) for prompt in prompts.values()]
+
+    if not chamadas:
+        return falhas
+    logging.info(f"Gerando {len(chamadas)} textos com o Gemini...")
+    resultados = iter(executor_padrao().executar(chamadas))
+    for script, dados, nomes in carregados:
+        respostas = {nome: next(resultados) for nome in nomes}
+        erros = [resposta for resposta in respostas.values() if isinstance(resposta, Exception)]
+        if erros:
+            logging.error(f"Erro ao gerar {script.ARQUIVO_SAIDA}: {erros[0]}")
+            falhas.append(script.ARQUIVO_SAIDA)
+            continue
+        script.salvar_analise(municipio, dados, {nome: resposta.text for nome, resposta in respostas.items()})
+    return falhas
+
+
+def main(municipio, sem_llm=False, polir=False):
+    if not sem_llm or polir:
+        GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+        if GOOGLE_API_KEY is None:
+            logging.error("Variável de ambiente GOOGLE_API_KEY não encontrada. Certifique-se de que o arquivo .env está configurado corretamente.")
+            exit(1)
+        genai.configure(api_key=GOOGLE_API_KEY)
+
+    falhas = gerar_relatorio(municipio, sem_llm=sem_llm, polir=polir)
+    if falhas:
+        logging.error(f"Arquivos não gerados: {', '.join(falhas)}")
+        exit(1)
+    logging.info("Textos de análise gerados.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera os textos de análise do Teto MAC, SIA e SIH de um município.")
+    parser.add_argument("municipio", help="Nome do município")
+    parser.add_argument("--sem-llm", action="store_true", help="Monta os textos por regras, sem chamar o Gemini (execuções em lote)")
+    parser.add_argument("--polir", action="store_true", help="Com --sem-llm, usa o Gemini só para revisar a redação dos textos")
+    args = parser.parse_args()
+    main(args.municipio, sem_llm=args.sem_llm, polir=args.polir)